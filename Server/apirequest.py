@@ -23,19 +23,57 @@ https://github.com/mpetroff/kindle-weather-display
 """
 try:
     # Python 3
-    from urllib.request import urlopen
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import urljoin, urlsplit
 except ImportError:
     # Python 2
-    from urllib2 import urlopen
-from xml.dom.minidom import parseString
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urlparse import urljoin, urlsplit
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict, namedtuple
+from email.utils import mktime_tz, parsedate_tz
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+
+import atomicfile
+import instrument
+
+# JSON decoder found by _get_json_loads, or None until the first decode.
+_json_loads = None
+
+# Root of every API URL.  May be pointed at a stand-in server (see stubapi).
+API_ROOT = 'http://api.wunderground.com/api/'
+
+# Wunderground API key.  If None, the key is read from API_KEY_PATH.
+API_KEY = None
+
+# File the API key is read from when API_KEY is None.
+API_KEY_PATH = './api.key'
+
+# (path, key) last read from an API key file, so it is read only once.
+_api_key_file = None
 
 def _get_apikey():
     """Gets Wunderground API from api.key file.
-    
+
+    The file is read on the first call and the key is reused afterwards
+    (until API_KEY_PATH changes).
+
     Returns:
         Wunderground API key from api.key file in same directory.
     """
-    return open('./api.key').read()
+    global _api_key_file
+    if API_KEY is not None:
+        return API_KEY
+    if _api_key_file is None or _api_key_file[0] != API_KEY_PATH:
+        with open(API_KEY_PATH) as key_file:
+            _api_key_file = (API_KEY_PATH, key_file.read().strip())
+    return _api_key_file[1]
 
 def _get_url(requested_feature, request_query, response_format='xml', request_params=''):
     """Forms an URL using an API key, the type of request, and location desired.
@@ -59,10 +97,708 @@ def _get_url(requested_feature, request_query, response_format='xml', request_pa
     Returns:
         HTTP URL for the desired location and type of request.
     """
-    url = 'http://api.wunderground.com/api/'
+    url = API_ROOT
     url += _get_apikey() + '/' + requested_feature + '/q/' + request_query + '.' + response_format + request_params
     return url
 
+class HTTPError(Exception):
+    """Raised when the API answers a request with an error status.
+
+    Attributes:
+        status: HTTP status code of the response.
+        url: URL that was requested.
+    """
+    def __init__(self, status, url):
+        Exception.__init__(self, 'HTTP ' + str(status) + ' for ' + url)
+        self.status = status
+        self.url = url
+
+class HTTPClient(object):
+    """Sends HTTP GET requests over pooled keep-alive connections.
+
+    Connections are kept open between requests and pooled per host, so a
+    refresh of many locations pays for one TCP handshake per pooled
+    connection instead of one per request.  Responses are requested gzip
+    compressed and decompressed transparently.  The client is safe to share
+    between threads.
+
+    Attributes:
+        max_connections: Maximum number of open connections per host.
+        timeout: Socket timeout (seconds) for connecting and reading.
+        retries: Number of times a failed request is retried.
+        backoff: Delay (seconds) before the first retry; doubled for each
+            further retry.
+    """
+    # Statuses worth retrying; any other error status is raised immediately.
+    RETRY_STATUSES = (500, 502, 503, 504)
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+    MAX_REDIRECTS = 5
+
+    def __init__(self, max_connections=4, timeout=10.0, retries=2, backoff=0.5):
+        """Creates a new instance of the HTTPClient class.
+
+        Args:
+            max_connections: Maximum number of open connections per host.
+            timeout: Socket timeout (seconds) for connecting and reading.
+            retries: Number of times a failed request is retried.
+            backoff: Delay (seconds) before the first retry.
+
+        Returns:
+            A new instance of the HTTPClient class.
+        """
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        # (scheme, netloc) -> list of idle connections
+        self._idle = dict()
+        # (scheme, netloc) -> semaphore bounding open connections
+        self._slots = dict()
+
+    def get(self, url, headers=None):
+        """Sends a GET request and returns the response body.
+
+        Args:
+            url: HTTP URL to request.
+            headers: dict of additional request headers (optional).
+
+        Returns:
+            Response body as bytes, decompressed if it was sent gzipped.
+
+        Raises:
+            HTTPError: The server answered with an error status.
+        """
+        status, response_headers, body = self._follow_redirects(url, headers, None)
+        return body
+
+    def download(self, url, file_obj, headers=None, chunk_size=64 * 1024):
+        """Sends a GET request and streams a 200 response body to a file.
+
+        The body is copied in chunks of at most chunk_size bytes, so it is
+        never held in memory whole.  A failed attempt is retried only if
+        file_obj can be rewound to where writing started.
+
+        Args:
+            url: HTTP URL to request.
+            file_obj: Binary file object to write the response body to.
+            headers: dict of additional request headers (optional), e.g.
+                If-None-Match for a conditional request.
+            chunk_size: Maximum number of bytes read and written at a time.
+
+        Returns:
+            (status, response_headers, bytes_transferred) where
+            response_headers has lower-case names and bytes_transferred is
+            the number of body bytes received (0 for 304 Not Modified).
+
+        Raises:
+            HTTPError: The server answered with an error status.
+        """
+        return self._follow_redirects(url, headers, _Sink(file_obj, chunk_size))
+
+    def _follow_redirects(self, url, headers, sink):
+        for redirect in range(self.MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request_with_retries(url, headers, sink)
+            if status in self.REDIRECT_STATUSES and 'location' in response_headers:
+                url = urljoin(url, response_headers['location'])
+                continue
+            if status >= 400:
+                raise HTTPError(status, url)
+            return status, response_headers, body
+        raise HTTPError(status, url)
+
+    def close(self):
+        """Closes every idle pooled connection."""
+        with self._lock:
+            idle = self._idle
+            self._idle = dict()
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _request_with_retries(self, url, headers, sink):
+        """Sends a request, retrying connection failures and 5xx statuses."""
+        attempt = 0
+        while True:
+            try:
+                status, response_headers, body = self._request(url, headers, sink)
+            except (socket.error, HTTPException):
+                if attempt >= self.retries or (sink is not None and not sink.rewind()):
+                    raise
+            else:
+                if status not in self.RETRY_STATUSES or attempt >= self.retries:
+                    return status, response_headers, body
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def _request(self, url, headers, sink=None):
+        """Sends a single request over a pooled connection.
+
+        If a sink is given, the body of a 200 response is streamed to it and
+        any other body is discarded; the number of bytes received is then
+        returned in place of the body.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = {'Accept-Encoding': 'gzip'}
+        if headers:
+            request_headers.update(headers)
+
+        slots = self._get_slots(key)
+        slots.acquire()
+        connection = None
+        try:
+            connection, reused = self._checkout(key)
+            with instrument.stage('request'):
+                try:
+                    response = self._send(connection, path, request_headers)
+                except (socket.error, HTTPException):
+                    connection.close()
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection; retry once
+                    # on a fresh connection.
+                    connection = self._connect(key)
+                    response = self._send(connection, path, request_headers)
+            response_headers = dict((name.lower(), value) for name, value in response.getheaders())
+            gzipped = response_headers.get('content-encoding') == 'gzip'
+            with instrument.stage('read') as measured:
+                if sink is not None and response.status == 200:
+                    body = sink.copy(response, gzipped)
+                elif sink is not None:
+                    body = len(response.read())
+                else:
+                    body = response.read()
+                measured.add_bytes(body if isinstance(body, int) else len(body))
+            if response.will_close:
+                connection.close()
+            else:
+                self._checkin(key, connection)
+            connection = None
+        finally:
+            # A connection is only reused once its response has been read
+            # through; after any failure it is closed.
+            if connection is not None:
+                connection.close()
+            slots.release()
+
+        if gzipped and not isinstance(body, int):
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        return response.status, response_headers, body
+
+    def _send(self, connection, path, headers):
+        connection.request('GET', path, headers=headers)
+        return connection.getresponse()
+
+    def _get_slots(self, key):
+        with self._lock:
+            slots = self._slots.get(key)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.max_connections)
+                self._slots[key] = slots
+            return slots
+
+    def _checkout(self, key):
+        """Gets an idle connection for a host, or opens a new one."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, list()).append(connection)
+
+    def _connect(self, key):
+        scheme, netloc = key
+        connection_class = HTTPSConnection if scheme == 'https' else HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+class _Sink(object):
+    """Copies a streamed response body to a file, for HTTPClient.download."""
+    def __init__(self, file_obj, chunk_size):
+        self.file_obj = file_obj
+        self.chunk_size = chunk_size
+        self.written = 0
+        try:
+            self.start = file_obj.tell()
+        except (AttributeError, IOError, OSError):
+            self.start = None
+
+    def copy(self, response, gzipped):
+        """Copies the response body in chunks; returns bytes received."""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        received = 0
+        while True:
+            chunk = response.read(self.chunk_size)
+            if not chunk:
+                break
+            received += len(chunk)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            self._write(chunk)
+        if decompressor is not None:
+            self._write(decompressor.flush())
+        return received
+
+    def rewind(self):
+        """Discards what a failed attempt wrote; False if that is impossible."""
+        if self.written == 0:
+            return True
+        if self.start is None:
+            return False
+        self.file_obj.seek(self.start)
+        self.file_obj.truncate()
+        self.written = 0
+        return True
+
+    def _write(self, data):
+        if data:
+            self.file_obj.write(data)
+            self.written += len(data)
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """Gets the HTTPClient shared by the module-level request functions.
+
+    Returns:
+        The shared HTTPClient, created on first use.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
+
+def set_default_client(client):
+    """Replaces the HTTPClient shared by the module-level request functions.
+
+    Args:
+        client: HTTPClient to use for subsequent requests.
+
+    Returns:
+        None.
+    """
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+# Base class for abstract classes under both Python 2 and 3
+_ABC = ABCMeta('_ABC', (object,), {})
+
+class _Flight(object):
+    """A fetch in progress that other callers for the same key wait on."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.body = None
+        self.error = None
+
+class ResponseCache(_ABC):
+    """Caches API responses with per-feature TTLs and LRU eviction.
+
+    Entries are keyed on the normalized inputs of _get_url (see cache_key).
+    An entry is fresh for the TTL of its feature; the least recently used
+    entries are evicted once the cache holds more than max_entries entries
+    or max_bytes bytes of response bodies.  Callers asking for a key that
+    is already being fetched wait for that fetch rather than sending their
+    own request.  This class keeps the index; subclasses store the bodies
+    by implementing _read, _write and _delete.  The lock only guards the
+    index, so reading or writing one body never waits on another.
+
+    Attributes:
+        ttl: Seconds a response stays fresh when its feature has no TTL in
+            feature_ttls.
+        feature_ttls: dict mapping API features (forecast, animatedradar)
+            to TTLs in seconds.
+        max_entries: Maximum number of cached responses.
+        max_bytes: Maximum total size of cached response bodies.
+        stats: dict of 'hits', 'misses', 'evictions', 'expirations' and
+            'coalesced' (callers that waited on another caller's fetch).
+    """
+    def __init__(self, ttl=300, feature_ttls=None, max_entries=1024, max_bytes=64 * 1024 * 1024,
+                 clock=time.time):
+        """Creates a new instance of the ResponseCache class.
+
+        Args:
+            ttl: Default TTL in seconds.
+            feature_ttls: dict mapping API features to TTLs in seconds.
+            max_entries: Maximum number of cached responses.
+            max_bytes: Maximum total size of cached response bodies.
+            clock: Function returning the current time in seconds.
+
+        Returns:
+            A new instance of the ResponseCache class.
+        """
+        self.ttl = ttl
+        self.feature_ttls = dict(feature_ttls or {})
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'coalesced': 0}
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (stored time, size), least recently used first
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._inflight = dict()
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def size(self):
+        """Total size in bytes of the cached response bodies."""
+        return self._bytes
+
+    def get(self, key):
+        """Gets a fresh cached response.
+
+        Args:
+            key: Cache key (see cache_key).
+
+        Returns:
+            The cached response body, or None if there is no fresh entry.
+        """
+        body = self._lookup(key)
+        if body is None:
+            with self._lock:
+                self.stats['misses'] += 1
+        return body
+
+    def put(self, key, body):
+        """Caches a response, evicting least recently used entries to fit.
+
+        Args:
+            key: Cache key (see cache_key).
+            body: Response body (bytes).
+
+        Returns:
+            None.
+        """
+        self._store(key, body)
+
+    def get_or_fetch(self, key, fetch):
+        """Gets a fresh cached response, fetching and caching it on a miss.
+
+        Concurrent callers for the same key share a single fetch.
+
+        Args:
+            key: Cache key (see cache_key).
+            fetch: Function returning the response body.
+
+        Returns:
+            The response body.
+        """
+        body = self._lookup(key)
+        if body is not None:
+            return body
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.body
+
+        try:
+            flight.body = fetch()
+        except Exception as error:
+            flight.error = error
+            raise
+        else:
+            self._store(key, flight.body)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+        return flight.body
+
+    def clear(self):
+        """Removes every cached response."""
+        with self._lock:
+            keys = list(self._index)
+            for key in keys:
+                self._forget(key)
+        for key in keys:
+            self._delete(key)
+
+    def ttl_for(self, requested_feature):
+        """Gets the TTL in seconds for an API feature."""
+        return self.feature_ttls.get(requested_feature, self.ttl)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            expired = self._clock() - entry[0] >= self.ttl_for(key[0])
+            if expired:
+                self._forget(key)
+                self.stats['expirations'] += 1
+        if expired:
+            self._delete(key)
+            return None
+        body = self._read(key)
+        with self._lock:
+            if body is None:
+                # the stored body went missing (e.g. removed from disk)
+                if self._index.get(key) == entry:
+                    self._forget(key)
+                return None
+            if key in self._index:
+                self._index[key] = self._index.pop(key)
+            self.stats['hits'] += 1
+        return body
+
+    def _store(self, key, body):
+        if len(body) > self.max_bytes:
+            with self._lock:
+                stale = self._index.get(key) is not None
+                if stale:
+                    self._forget(key)
+            if stale:
+                self._delete(key)
+            return
+        # Write the body before indexing it, so readers never find an
+        # indexed entry whose body is still being written.
+        stored = self._clock()
+        self._write(key, stored, body)
+        evicted = list()
+        with self._lock:
+            if key in self._index:
+                self._forget(key)
+            self._add(key, stored, len(body))
+            while len(self._index) > self.max_entries or self._bytes > self.max_bytes:
+                evicted.append(next(iter(self._index)))
+                self._forget(evicted[-1])
+                self.stats['evictions'] += 1
+        for key in evicted:
+            self._delete(key)
+
+    def _add(self, key, stored, size):
+        self._index[key] = (stored, size)
+        self._bytes += size
+
+    def _forget(self, key):
+        self._bytes -= self._index.pop(key)[1]
+
+    @abstractmethod
+    def _read(self, key):
+        """Reads a stored body, returning None if it is missing."""
+
+    @abstractmethod
+    def _write(self, key, stored, body):
+        """Stores a body, replacing any stored for the same key."""
+
+    @abstractmethod
+    def _delete(self, key):
+        """Deletes a stored body if there is one."""
+
+class MemoryCache(ResponseCache):
+    """A ResponseCache that keeps response bodies in memory."""
+    def __init__(self, *args, **kwargs):
+        ResponseCache.__init__(self, *args, **kwargs)
+        self._bodies = dict()
+
+    def _read(self, key):
+        return self._bodies.get(key)
+
+    def _write(self, key, stored, body):
+        self._bodies[key] = body
+
+    def _delete(self, key):
+        self._bodies.pop(key, None)
+
+class DiskCache(ResponseCache):
+    """A ResponseCache that keeps response bodies in files in a directory.
+
+    Each response is stored in its own file with a one-line JSON header
+    holding its key and the time it was stored, so a restarted process
+    reloads the index from the directory and reuses entries that are still
+    fresh.
+
+    Attributes:
+        directory: Directory holding the cached responses.
+    """
+    SUFFIX = '.response'
+
+    def __init__(self, directory, *args, **kwargs):
+        """Creates a new instance of the DiskCache class.
+
+        Args:
+            directory: Directory holding the cached responses (created if
+                it does not exist).
+            Other arguments are as for ResponseCache.
+
+        Returns:
+            A new instance of the DiskCache class.
+        """
+        ResponseCache.__init__(self, *args, **kwargs)
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load_index()
+
+    def _path(self, key):
+        name = hashlib.sha1(json.dumps(list(key)).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + self.SUFFIX)
+
+    def _load_index(self):
+        entries = list()
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as cached:
+                    header = json.loads(cached.readline().decode('utf-8'))
+                    size = os.fstat(cached.fileno()).st_size - cached.tell()
+            except (IOError, OSError, ValueError):
+                continue
+            entries.append((header['stored'], tuple(header['key']), size))
+        evicted = list()
+        with self._lock:
+            for stored, key, size in sorted(entries):
+                self._add(key, stored, size)
+            while len(self._index) > self.max_entries or self._bytes > self.max_bytes:
+                evicted.append(next(iter(self._index)))
+                self._forget(evicted[-1])
+                self.stats['evictions'] += 1
+        for key in evicted:
+            self._delete(key)
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as cached:
+                cached.readline()
+                return cached.read()
+        except (IOError, OSError):
+            return None
+
+    def _write(self, key, stored, body):
+        header = json.dumps({'key': list(key), 'stored': stored}).encode('utf-8')
+        with atomicfile.AtomicWriter(self._path(key)) as writer:
+            writer.file.write(header + b'\n')
+            writer.file.write(body)
+
+    def _delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+def cache_key(requested_feature, request_query, response_format='xml', request_params=''):
+    """Forms the response cache key for a request.
+
+    The inputs of _get_url are normalized so equivalent requests share an
+    entry: surrounding whitespace is stripped from the query and the
+    request parameters are sorted.
+
+    Args:
+        requested_feature: Type of API request (forecast, animatedradar).
+        request_query: Geographical location for which to request.
+        response_format: File format for request response (xml, gif, etc.).
+        request_params: Additional parameters for radar API requests.
+
+    Returns:
+        A hashable cache key whose first item is the requested feature.
+    """
+    params = '&'.join(sorted(param for param in request_params.lstrip('?').split('&') if param))
+    return (requested_feature, request_query.strip(), response_format, params)
+
+_cache = None
+
+def get_cache():
+    """Gets the ResponseCache used by the module-level request functions.
+
+    Returns:
+        The ResponseCache, or None if responses are not cached.
+    """
+    return _cache
+
+def set_cache(cache):
+    """Sets the ResponseCache used by the module-level request functions.
+
+    Args:
+        cache: ResponseCache to use, or None to stop caching.
+
+    Returns:
+        None.
+    """
+    global _cache
+    _cache = cache
+
+_coalescer = None
+
+def get_coalescer():
+    """Gets the QueryCoalescer used by the module-level request functions.
+
+    Returns:
+        The spatial.QueryCoalescer, or None if queries are sent as given.
+    """
+    return _coalescer
+
+def set_coalescer(coalescer):
+    """Sets the QueryCoalescer used by the module-level request functions.
+
+    Latitude/longitude queries are then snapped to shared grid cells before
+    the URL and cache key are formed, so with a ResponseCache set (see
+    set_cache) one fetch serves every location in a cell.
+
+    Args:
+        coalescer: spatial.QueryCoalescer to use, or None to send queries
+            as given.
+
+    Returns:
+        None.
+    """
+    global _coalescer
+    _coalescer = coalescer
+
+def raw_request(requested_feature, request_query, response_format='xml', request_params='', client=None):
+    """Sends an HTTP request to the API and returns the unparsed response.
+
+    Args:
+        requested_feature: Type of API request to send (forecast, 10 day forecast).
+        request_query: Geographical location for which to request.
+            See xml_request for acceptable forms.
+        response_format: File format for request response (xml, gif, etc.).
+        request_params: Additional parameters for radar API requests (optional).
+        client: HTTPClient to send the request with (defaults to the shared
+            client, see get_default_client).
+
+    Returns:
+        HTTP response body as bytes.
+    """
+    with instrument.stage('fetch', request_query):
+        coalescer = _coalescer
+        if coalescer is not None:
+            request_query = coalescer.canonical(requested_feature, request_query)
+        # Get URL
+        with instrument.stage('url'):
+            url = _get_url(requested_feature, request_query, response_format, request_params)
+        if client is None:
+            client = get_default_client()
+        cache = _cache
+        if cache is None:
+            # Send HTTP request and read response
+            return client.get(url)
+        key = cache_key(requested_feature, request_query, response_format, request_params)
+        return cache.get_or_fetch(key, lambda: client.get(url))
+
 def xml_request(requested_feature, request_query):
     """Sends an HTTP request for XML for the desired location and request type
 
@@ -82,14 +818,64 @@ def xml_request(requested_feature, request_query):
     Returns:
         HTTP response as parsed XML.
     """
-    # Get URL
-    url = _get_url(requested_feature, request_query)
-    # Send HTTP request
-    http_request = urlopen(url)
-    # Read response
-    http_response = http_request.read()
+    from xml.dom.minidom import parseString
+
     # Return parsed XML
-    return parseString(http_response)
+    return parseString(raw_request(requested_feature, request_query))
+
+def _get_json_loads():
+    """Gets the loads function of the fastest JSON library installed.
+
+    The libraries are probed on the first call rather than at import, so
+    that importing apirequest for XML or radar requests stays cheap.
+
+    Returns:
+        The loads function of orjson, ujson, simplejson or json.
+    """
+    global _json_loads
+    if _json_loads is None:
+        try:
+            from orjson import loads
+        except ImportError:
+            try:
+                from ujson import loads
+            except ImportError:
+                try:
+                    from simplejson import loads
+                except ImportError:
+                    loads = json.loads
+        _json_loads = loads
+    return _json_loads
+
+def decode_json(response):
+    """Decodes a JSON API response with the fastest JSON library installed.
+
+    orjson, ujson and simplejson are used in that order of preference when
+    installed, falling back to the standard library's json module.
+
+    Args:
+        response: JSON response body (bytes).
+
+    Returns:
+        The decoded response.
+    """
+    return _get_json_loads()(response)
+
+def json_request(requested_feature, request_query):
+    """Sends an HTTP request for JSON for the desired location and request type
+
+    JSON responses are smaller than XML and cheaper to decode than building
+    a DOM tree.
+
+    Args:
+        requested_feature: Type of API request to send (forecast, 10 day forecast).
+        request_query: Geographical location for which to request.
+            See xml_request for acceptable forms.
+
+    Returns:
+        HTTP response as decoded JSON.
+    """
+    return decode_json(raw_request(requested_feature, request_query, 'json'))
 
 def radar_request(request_query, animated=True, response_format='gif', request_params=''):
     """Sends an HTTP request for a radar image from the API
@@ -113,12 +899,105 @@ def radar_request(request_query, animated=True, response_format='gif', request_p
     Returns:
         A radar image.
     """
-    # Get URL
     requested_feature = 'animatedradar' if animated else 'radar'
-    url = _get_url(requested_feature, request_query, response_format, request_params)
-    # Send HTTP request
-    http_request = urlopen(url)
-    # Read response
-    http_response = http_request.read()
     # Return the image
-    return http_response
+    return raw_request(requested_feature, request_query, response_format, request_params)
+
+RadarDownload = namedtuple('RadarDownload', 'modified bytes_transferred')
+RadarDownload.__doc__ = """Outcome of radar_download.
+
+Attributes:
+    modified: False if the server reported the image unchanged (304), in
+        which case the destination was left untouched.
+    bytes_transferred: Number of response body bytes received.
+"""
+
+# Absolute destination path -> (url, etag, last_modified, (mtime, size)) of
+# the last image this process downloaded there, least recently used first.
+# The (mtime, size) identify the file written, so a file replaced by anyone
+# else is downloaded unconditionally.
+_radar_validators = OrderedDict()
+_radar_validators_lock = threading.Lock()
+_RADAR_VALIDATOR_ENTRIES = 1024
+
+def radar_download(request_query, destination, animated=True, response_format='gif', request_params='',
+                   chunk_size=64 * 1024, client=None):
+    """Streams a radar image from the API to a file.
+
+    The image is written in chunks of at most chunk_size bytes rather than
+    read into memory whole.  When destination is a path, the image is
+    written to a temporary file that then replaces the destination.  If
+    this process downloaded the file at destination (one of the last
+    _RADAR_VALIDATOR_ENTRIES destinations) and it has not been replaced
+    since, the request is conditional (If-None-Match/If-Modified-Since) on
+    it, so an unchanged image is not downloaded again.
+    Radar downloads bypass the response cache (see set_cache).
+
+    Args:
+        request_query: Geographical location for which to request.
+            See radar_request for acceptable forms.
+        destination: Path to write the image to, or a binary file object.
+        animated: Whether to request an animated image.
+        response_format: Image format to request (gif, png, swf).
+        request_params: Additional parameters for radar API requests (optional).
+            See: http://www.wunderground.com/weather/api/d/docs?d=layers/radar&MR=1
+        chunk_size: Maximum number of bytes read and written at a time.
+        client: HTTPClient to send the request with (defaults to the shared
+            client, see get_default_client).
+
+    Returns:
+        A RadarDownload reporting whether the image changed and how many
+        bytes were transferred.
+    """
+    with instrument.stage('radar', request_query):
+        requested_feature = 'animatedradar' if animated else 'radar'
+        coalescer = _coalescer
+        if coalescer is not None:
+            request_query = coalescer.canonical(requested_feature, request_query)
+        with instrument.stage('url'):
+            url = _get_url(requested_feature, request_query, response_format, request_params)
+        if client is None:
+            client = get_default_client()
+        if hasattr(destination, 'write'):
+            status, response_headers, transferred = client.download(url, destination, chunk_size=chunk_size)
+            return RadarDownload(True, transferred)
+
+        path = os.path.abspath(destination)
+        headers = dict()
+        with _radar_validators_lock:
+            validators = _radar_validators.pop(path, None)
+            if validators is not None:
+                _radar_validators[path] = validators
+        if validators is not None and validators[0] == url and validators[3] == _file_version(path):
+            if validators[1]:
+                headers['If-None-Match'] = validators[1]
+            if validators[2]:
+                headers['If-Modified-Since'] = validators[2]
+
+        with atomicfile.AtomicWriter(path) as writer:
+            status, response_headers, transferred = client.download(url, writer.file, headers, chunk_size)
+            if status == 304:
+                writer.discard()
+                return RadarDownload(False, transferred)
+
+        last_modified = response_headers.get('last-modified')
+        if last_modified:
+            parsed = parsedate_tz(last_modified)
+            if parsed is not None:
+                modified_time = mktime_tz(parsed)
+                os.utime(path, (modified_time, modified_time))
+        validators = (url, response_headers.get('etag'), last_modified, _file_version(path))
+        with _radar_validators_lock:
+            _radar_validators.pop(path, None)
+            _radar_validators[path] = validators
+            while len(_radar_validators) > _RADAR_VALIDATOR_ENTRIES:
+                _radar_validators.popitem(last=False)
+        return RadarDownload(True, transferred)
+
+def _file_version(path):
+    """Gets (mtime, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
@@ -0,0 +1,174 @@
+"""Fetches forecasts and radar images for many locations concurrently.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+
+Inspiration as well as coding strategies are borrowed heavily from
+Matthew Petroff's Kindle Weather Display project.
+
+http://mpetroff.net/2012/09/kindle-weather-display/
+https://github.com/mpetroff/kindle-weather-display
+"""
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import apirequest
+import forecastdata
+
+FetchResult = namedtuple('FetchResult', 'query value error seconds')
+FetchResult.__doc__ = """Outcome of fetching one location.
+
+Attributes:
+    query: The request query the result is for.
+    value: The fetched Forecast object or radar image, or None on failure.
+    error: The exception raised while fetching, or None on success.
+    seconds: Wall time spent fetching (and parsing) the location.
+"""
+
+async def fetch_forecasts(request_queries, concurrency=16, parser='dom', client=None,
+                          requested_feature='forecast'):
+    """Fetches forecasts for many locations, yielding each as it completes.
+
+    Up to `concurrency` requests are in flight at once.  A location that
+    fails is yielded with its error and does not stop the rest of the batch.
+
+    Args:
+        request_queries: Geographical locations for which to request
+            (see forecastdata.Forecast for acceptable forms).
+        concurrency: Maximum number of requests in flight at once.
+        parser: Name of the forecastdata response parser to use.
+        client: apirequest.HTTPClient to send requests with.  By default a
+            client pooling up to `concurrency` connections is created for
+            the batch and closed afterwards.
+        requested_feature: Forecast feature to request ('forecast' or
+            'forecast10day').
+
+    Yields:
+        FetchResult objects whose values are Forecast objects, in
+        completion order.
+
+    Raises:
+        ValueError: parser is not the name of a forecastdata parser.
+    """
+    # checked before any job is submitted, so a bad name fails once
+    forecastdata._get_parser(parser)
+
+    def fetch(request_query, client):
+        response = apirequest.raw_request(requested_feature, request_query,
+                                          forecastdata.PARSER_FORMATS[parser], client=client)
+        return forecastdata.Forecast.from_response(response, parser)
+
+    async for result in _fetch_all(request_queries, fetch, concurrency, client):
+        yield result
+
+async def fetch_radars(request_queries, concurrency=16, animated=True, response_format='gif',
+                       request_params='', client=None):
+    """Fetches radar images for many locations, yielding each as it completes.
+
+    Up to `concurrency` requests are in flight at once.  A location that
+    fails is yielded with its error and does not stop the rest of the batch.
+
+    Args:
+        request_queries: Geographical locations for which to request
+            (see apirequest.radar_request for acceptable forms).
+        concurrency: Maximum number of requests in flight at once.
+        animated: Whether to request animated images.
+        response_format: Image format to request (gif, png, swf).
+        request_params: Additional parameters for radar API requests (optional).
+        client: apirequest.HTTPClient to send requests with (see
+            fetch_forecasts).
+
+    Yields:
+        FetchResult objects whose values are radar images, in completion
+        order.
+    """
+    requested_feature = 'animatedradar' if animated else 'radar'
+
+    def fetch(request_query, client):
+        return apirequest.raw_request(requested_feature, request_query, response_format,
+                                      request_params, client=client)
+
+    async for result in _fetch_all(request_queries, fetch, concurrency, client):
+        yield result
+
+def fetch_all_forecasts(request_queries, concurrency=16, parser='dom', client=None,
+                        requested_feature='forecast'):
+    """Fetches forecasts for many locations from synchronous code.
+
+    Args:
+        request_queries: Geographical locations for which to request.
+        concurrency: Maximum number of requests in flight at once.
+        parser: Name of the forecastdata response parser to use.
+        client: apirequest.HTTPClient to send requests with (see
+            fetch_forecasts).
+        requested_feature: Forecast feature to request ('forecast' or
+            'forecast10day').
+
+    Returns:
+        list of FetchResult objects, in completion order.
+
+    Raises:
+        ValueError: parser is not the name of a forecastdata parser.
+    """
+    forecastdata._get_parser(parser)
+
+    async def collect():
+        return [result async for result in fetch_forecasts(request_queries, concurrency, parser, client,
+                                                           requested_feature)]
+    return asyncio.run(collect())
+
+async def _fetch_all(request_queries, fetch, concurrency, client):
+    """Runs blocking fetches on a bounded thread pool, yielding as they complete.
+
+    Args:
+        request_queries: Queries to fetch.
+        fetch: Function of (request_query, client) returning the fetched value.
+        concurrency: Maximum number of fetches running at once.
+        client: apirequest.HTTPClient, or None to create one for the batch.
+
+    Yields:
+        FetchResult objects, in completion order.
+    """
+    loop = asyncio.get_running_loop()
+    own_client = client is None
+    if own_client:
+        client = apirequest.HTTPClient(max_connections=concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def timed_fetch(request_query):
+        # Timed on the worker thread so queueing behind the concurrency
+        # limit is not counted.
+        start = time.time()
+        try:
+            value = fetch(request_query, client)
+        except Exception as error:
+            return FetchResult(request_query, None, error, time.time() - start)
+        return FetchResult(request_query, value, None, time.time() - start)
+
+    async def run(request_query):
+        return await loop.run_in_executor(executor, timed_fetch, request_query)
+
+    tasks = [asyncio.ensure_future(run(request_query)) for request_query in request_queries]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False)
+        if own_client:
+            client.close()
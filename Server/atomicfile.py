@@ -0,0 +1,152 @@
+"""Writes files so that readers never see them partially written.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+
+Inspiration as well as coding strategies are borrowed heavily from
+Matthew Petroff's Kindle Weather Display project.
+
+http://mpetroff.net/2012/09/kindle-weather-display/
+https://github.com/mpetroff/kindle-weather-display
+"""
+import os
+import shutil
+import tempfile
+import threading
+
+def replace(source, destination):
+    """Renames a file over an existing one (os.replace where available).
+
+    Args:
+        source: Path of the file to rename.
+        destination: Path it replaces.
+
+    Returns:
+        None.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        # Python 2 cannot rename over an existing file on Windows
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+class AtomicWriter(object):
+    """Writes a file through a temporary file that then replaces it.
+
+    Used as a context manager: the temporary file is in the same directory
+    as the file it replaces, and replaces it when the block exits without
+    an exception, unless discard was called.  Otherwise it is removed.  The
+    new file keeps the permissions of the file it replaces (0644 for a new
+    file).
+
+    Attributes:
+        path: Path of the file to write.
+        file: The temporary file (binary), open inside the block.
+    """
+    def __init__(self, path, suffix=''):
+        """Creates a new instance of the AtomicWriter class.
+
+        Args:
+            path: Path of the file to write.
+            suffix: Suffix of the temporary file's name (e.g. '.svg'), for
+                tools watching the directory for a file type.
+
+        Returns:
+            A new instance of the AtomicWriter class.
+        """
+        self.path = path
+        self.file = None
+        self._suffix = suffix
+        self._temp_path = None
+        self._discarded = False
+
+    def __enter__(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, self._temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=self._suffix)
+        self.file = os.fdopen(handle, 'wb')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.file.close()
+            if exc_type is None and not self._discarded:
+                # mkstemp creates the file readable by its owner only
+                try:
+                    mode = os.stat(self.path).st_mode & 0o777
+                except OSError:
+                    mode = 0o644
+                os.chmod(self._temp_path, mode)
+                replace(self._temp_path, self.path)
+                return False
+        except BaseException:
+            _remove(self._temp_path)
+            raise
+        _remove(self._temp_path)
+        return False
+
+    def discard(self):
+        """Leaves the file untouched when the block exits."""
+        self._discarded = True
+
+def write(path, data, suffix=''):
+    """Writes a file so that readers never see it partially written.
+
+    Args:
+        path: Path of the file to write.
+        data: Text to write (encoded as UTF-8), or bytes.
+        suffix: Suffix of the temporary file's name.
+
+    Returns:
+        Number of bytes written.
+    """
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    with AtomicWriter(path, suffix) as writer:
+        writer.file.write(data)
+    return len(data)
+
+def link(source, path):
+    """Replaces a file with a hard link to (or else a copy of) another file.
+
+    Args:
+        source: Path of the file to link.
+        path: Path of the file to replace.
+
+    Returns:
+        None.
+    """
+    if os.path.exists(path) and os.path.samefile(source, path):
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_path = os.path.join(directory, '.tmp-%d-%d-%s' % (
+        os.getpid(), threading.current_thread().ident, os.path.basename(path)))
+    try:
+        os.link(source, temp_path)
+    except (AttributeError, OSError):
+        # no hard links across filesystems (or on this platform)
+        shutil.copyfile(source, temp_path)
+    try:
+        replace(temp_path, path)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,55 @@
+"""Helpers shared by the PyWeather benchmarks.
+
+Benchmarks are run from the Server directory, e.g.:
+
+    python benchmarks/bench_render.py
+
+The recorded API responses in fixtures/ (forecast.xml, forecast.json and
+radar.gif) let every benchmark run offline.
+"""
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, 'fixtures')
+SERVER_DIR = os.path.dirname(BENCHMARK_DIR)
+
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+import forecastdata
+
+def fixture_path(name):
+    """Gets the absolute path of a recorded fixture.
+
+    Args:
+        name: File name of the fixture (e.g. forecast.xml).
+
+    Returns:
+        Absolute path of the fixture.
+    """
+    return os.path.join(FIXTURE_DIR, name)
+
+def read_fixture(name):
+    """Reads a recorded fixture as bytes.
+
+    Args:
+        name: File name of the fixture (e.g. forecast.xml).
+
+    Returns:
+        The fixture's contents.
+    """
+    with open(fixture_path(name), 'rb') as fixture:
+        return fixture.read()
+
+def load_forecast(name='forecast.xml', parser='dom'):
+    """Builds a Forecast object from a recorded API response.
+
+    Args:
+        name: File name of the recorded forecast response.
+        parser: Name of the forecastdata response parser to use.
+
+    Returns:
+        A Forecast object populated from the fixture.
+    """
+    return forecastdata.Forecast.from_response(read_fixture(name), parser)
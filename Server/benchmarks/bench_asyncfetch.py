@@ -0,0 +1,41 @@
+"""Compares serial forecast fetches with asyncfetch batches.
+
+The local stub API server adds a fixed delay to every response to stand in
+for network latency, and fails one location to show the batch carries on.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_asyncfetch.py [locations] [delay_ms] [concurrency]
+"""
+import sys
+import time
+
+import _fixtures
+import apirequest
+import asyncfetch
+import forecastdata
+import stubapi
+
+def main(locations=50, delay_ms=50, concurrency=25):
+    queries = ['%d' % (63100 + i) for i in range(locations)]
+    responses = {'forecast': _fixtures.read_fixture('forecast.xml')}
+    with stubapi.StubAPIServer(responses, delay=delay_ms / 1000.0) as stub:
+        start = time.time()
+        for query in queries:
+            forecastdata.Forecast(query)
+        serial = time.time() - start
+        print('serial      %7.3f s for %d locations' % (serial, locations))
+
+        stub.failures = 1
+        start = time.time()
+        client = apirequest.HTTPClient(max_connections=concurrency, retries=0)
+        results = asyncfetch.fetch_all_forecasts(queries, concurrency, client=client)
+        client.close()
+        batch = time.time() - start
+        failed = [result for result in results if result.error is not None]
+        print('asyncfetch  %7.3f s for %d locations (concurrency %d, %d failed)  %5.1fx' % (
+            batch, locations, concurrency, len(failed), serial / batch))
+        print('slowest request %.3f s' % max(result.seconds for result in results))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,39 @@
+"""Measures svgmanip.write_forecasts throughput from 1 to N processes.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_batchrender.py [jobs] [max_processes]
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import _fixtures
+import svgmanip
+
+def main(jobs=2000, max_processes=None):
+    max_processes = max_processes or multiprocessing.cpu_count()
+    forecast = _fixtures.load_forecast()
+    output_dir = tempfile.mkdtemp(prefix='pyweather-bench-')
+    try:
+        work = [(forecast, os.path.join(output_dir, '%d.svg' % i)) for i in range(jobs)]
+        processes = 1
+        baseline = None
+        while True:
+            start = time.time()
+            results = list(svgmanip.write_forecasts(work, processes))
+            elapsed = time.time() - start
+            assert all(result.error is None for result in results)
+            baseline = baseline or elapsed
+            print('%2d processes  %7.0f renders/s  %5.2fx' % (processes, jobs / elapsed, baseline / elapsed))
+            if processes >= max_processes:
+                break
+            processes = min(processes * 2, max_processes)
+    finally:
+        shutil.rmtree(output_dir)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,48 @@
+"""Compares per-request urlopen connections with the pooled HTTPClient.
+
+Serves the recorded forecast from a local stub API server that counts TCP
+connections, then fetches it repeatedly with urlopen and with the
+keep-alive HTTPClient (serially and from several threads).
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_client.py [requests]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+import _fixtures
+import apirequest
+import stubapi
+
+def _run(stub, name, fetch, requests, threads=1):
+    stub.counters.update(connections=0, requests=0)
+    start = time.time()
+    with ThreadPoolExecutor(threads) as pool:
+        bodies = list(pool.map(lambda i: fetch(), range(requests)))
+    elapsed = time.time() - start
+    assert all(body == bodies[0] for body in bodies)
+    print('%-28s %7.2f ms/request  %4d connections for %d requests' % (
+        name, elapsed * 1e3 / requests, stub.counters['connections'], requests))
+
+def main(requests=200):
+    forecast = _fixtures.read_fixture('forecast.xml')
+    with stubapi.StubAPIServer({'forecast': forecast}) as stub:
+        url = apirequest._get_url('forecast', 'MO/St_Louis')
+        _run(stub, 'urlopen', lambda: urlopen(url).read(), requests)
+
+        client = apirequest.HTTPClient(max_connections=4)
+        _run(stub, 'HTTPClient', lambda: client.get(url), requests)
+        _run(stub, 'HTTPClient (8 threads)', lambda: client.get(url), requests, threads=8)
+        client.close()
+
+        # Retries: the first two requests fail with 503 and are retried.
+        stub.failures = 2
+        client = apirequest.HTTPClient(retries=2, backoff=0.01)
+        assert client.get(url) == forecast
+        client.close()
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
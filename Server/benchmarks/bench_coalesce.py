@@ -0,0 +1,52 @@
+"""Measures API requests saved by snapping nearby lat/long queries together.
+
+Customers are scattered within a few kilometres of a handful of city
+centers.  Their forecasts are fetched through a response cache from the
+local stub API server, first as given and then through a QueryCoalescer.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_coalesce.py [locations] [precision] [delay_ms]
+"""
+import random
+import sys
+import time
+
+import _fixtures
+import apirequest
+import forecastdata
+import spatial
+import stubapi
+
+CENTERS = [(38.627, -90.199), (39.099, -94.578), (41.878, -87.630), (44.977, -93.265)]
+
+def _run(stub, queries, coalescer):
+    apirequest.set_cache(apirequest.MemoryCache(ttl=3600))
+    apirequest.set_coalescer(coalescer)
+    stub.counters.update(requests=0)
+    try:
+        start = time.time()
+        for query in queries:
+            forecastdata.Forecast(query, 'stream')
+        return time.time() - start, stub.counters['requests']
+    finally:
+        apirequest.set_cache(None)
+        apirequest.set_coalescer(None)
+
+def main(locations=1000, precision=5, delay_ms=20):
+    rng = random.Random(0)
+    queries = list()
+    for i in range(locations):
+        latitude, longitude = rng.choice(CENTERS)
+        queries.append('%.6f,%.6f' % (latitude + rng.uniform(-0.05, 0.05), longitude + rng.uniform(-0.05, 0.05)))
+    responses = {'forecast': _fixtures.read_fixture('forecast.xml')}
+    with stubapi.StubAPIServer(responses, delay=delay_ms / 1000.0) as stub:
+        plain, plain_requests = _run(stub, queries, None)
+        print('as given        %7.3f s  %5d API requests' % (plain, plain_requests))
+        coalescer = spatial.QueryCoalescer(precision)
+        snapped, snapped_requests = _run(stub, queries, coalescer)
+        print('precision %d     %7.3f s  %5d API requests  fan-in %.1f  %5.1fx' % (
+            precision, snapped, snapped_requests, coalescer.fan_in, plain / snapped))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
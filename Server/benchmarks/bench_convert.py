@@ -0,0 +1,50 @@
+"""Micro-benchmarks converting 1M-element columns with convert.
+
+Compares a Python loop of scalar conversions with whole-column conversion
+of an array.array, a memoryview and (when NumPy is installed) a NumPy
+array.  Without NumPy, array.array and memoryview columns are converted
+one element at a time inside convert, so the gap is small; with NumPy they
+are converted in a single vectorized operation.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_convert.py [elements]
+"""
+import random
+import sys
+import timeit
+from array import array
+
+import _fixtures
+import convert
+
+CONVERTERS = (
+    ('Temperature.f_to_c', convert.Temperature.f_to_c),
+    ('Speed.mph_to_kph', convert.Speed.mph_to_kph),
+    ('Precipitation.in_to_mm', convert.Precipitation.in_to_mm),
+    ('Pressure.inhg_to_hpa', convert.Pressure.inhg_to_hpa),
+)
+
+def _time(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+def main(elements=1000000):
+    column = array('d', (random.uniform(-20, 110) for i in range(elements)))
+    inputs = [('scalar loop', None), ('array.array', column), ('memoryview', memoryview(column))]
+    numpy = convert._get_numpy()
+    if numpy:
+        inputs.append(('numpy', numpy.asarray(column)))
+    else:
+        print('(NumPy not installed; columns use the per-element fallback)')
+    print('%d elements' % elements)
+    for name, converter in CONVERTERS:
+        print(name)
+        for kind, values in inputs:
+            if values is None:
+                seconds = _time(lambda: [converter(value) for value in column])
+            else:
+                seconds = _time(lambda: converter(values))
+            print('  %-12s %8.1f ms' % (kind, seconds * 1e3))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
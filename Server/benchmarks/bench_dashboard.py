@@ -0,0 +1,41 @@
+"""Times rendering dashboard.svg for growing numbers of locations.
+
+Each location shows the recorded 10 day forecast (fixtures/forecast10day.xml).
+The time and peak memory per location should stay flat as locations are
+added, since a render is a single pass over the compiled template.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_dashboard.py [sizes]
+
+e.g. python benchmarks/bench_dashboard.py 10,100,1000
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import _fixtures
+import svgmanip
+
+DASHBOARD_PATH = os.path.join(_fixtures.SERVER_DIR, 'dashboard.svg')
+
+def main(sizes='10,100,1000'):
+    forecast = _fixtures.load_forecast('forecast10day.xml')
+    template = svgmanip.load_dashboard_template(DASHBOARD_PATH)
+    template.render([forecast])
+    for size in [int(size) for size in sizes.split(',')]:
+        forecasts = [forecast] * size
+        names = ['Location %d' % i for i in range(size)]
+        start = time.time()
+        svg = template.render(forecasts, names)
+        seconds = time.time() - start
+        tracemalloc.start()
+        template.render(forecasts, names)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('%6d locations  %8.3f s  %7.3f ms/location  %7.1f KiB peak/location  %9d bytes'
+              % (size, seconds, seconds * 1e3 / size, peak / 1024.0 / size, len(svg)))
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,40 @@
+"""Compares XML and JSON forecast responses on recorded fixtures.
+
+Reports the payload size (raw and gzipped, as sent by HTTPClient) and the
+end-to-end time from response bytes to a Forecast object for each parser.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_formats.py [iterations]
+"""
+import sys
+import timeit
+import zlib
+
+import _fixtures
+import apirequest
+import forecastdata
+
+FIXTURES = {'xml': 'forecast.xml', 'json': 'forecast.json'}
+
+def _attributes(forecast):
+    return [[getattr(day, name) for name in day.__slots__] for day in forecast.ForecastDays]
+
+def main(iterations=500):
+    print('JSON decoder: %s' % apirequest._get_json_loads().__module__)
+    responses = dict((response_format, _fixtures.read_fixture(name)) for response_format, name in FIXTURES.items())
+    for response_format in sorted(responses):
+        response = responses[response_format]
+        compressed = zlib.compress(response, 6)
+        print('%-5s %6d bytes  %6d bytes gzipped' % (response_format, len(response), len(compressed)))
+
+    expected = _attributes(forecastdata.Forecast.from_response(responses['xml'], 'dom'))
+    for parser in sorted(forecastdata.PARSERS):
+        response = responses[forecastdata.PARSER_FORMATS[parser]]
+        assert _attributes(forecastdata.Forecast.from_response(response, parser)) == expected, parser
+        seconds = min(timeit.repeat(lambda: forecastdata.Forecast.from_response(response, parser),
+                                    number=iterations, repeat=3)) / iterations
+        print('%-6s (%s) %9.1f us/response' % (parser, forecastdata.PARSER_FORMATS[parser], seconds * 1e6))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
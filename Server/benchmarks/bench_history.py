@@ -0,0 +1,52 @@
+"""Measures ForecastHistory bulk inserts and indexed reads.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_history.py [rows] [database]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+import _fixtures
+import history
+
+def main(rows=1000000, database=None):
+    forecast = _fixtures.load_forecast()
+    days = len(forecast.ForecastDays)
+    locations = ['%05d' % (63000 + i) for i in range(1000)]
+    fetches = rows // days
+    cleanup = database is None
+    if cleanup:
+        handle, database = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+    try:
+        store = history.ForecastHistory(database, batch_size=20000)
+        start = time.time()
+        store.add_many((locations[i % len(locations)], forecast, 1430000000.0 + i * 60)
+                       for i in range(fetches))
+        elapsed = time.time() - start
+        print('inserted %d rows in %.1f s (%.0f rows/s)' % (fetches * days, elapsed, fetches * days / elapsed))
+
+        forecast_date = forecast.ForecastDays[2].forecast_date
+        queries = (
+            ('latest(location)', lambda: store.latest(random.choice(locations))),
+            ('for_date(date, location, 10)',
+             lambda: store.for_date(forecast_date, random.choice(locations), 10)),
+            ('for_date(date, last=10)', lambda: store.for_date(forecast_date, last=10)),
+        )
+        for name, query in queries:
+            seconds = min(timeit.repeat(query, number=1000, repeat=3)) / 1000
+            print('  %-30s %7.1f us' % (name, seconds * 1e6))
+        store.close()
+    finally:
+        if cleanup:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(database + suffix):
+                    os.remove(database + suffix)
+
+if __name__ == '__main__':
+    main(*[int(arg) if arg.isdigit() else arg for arg in sys.argv[1:]])
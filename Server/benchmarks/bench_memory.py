@@ -0,0 +1,78 @@
+"""Measures the memory held by forecasts for many locations.
+
+Compares ForecastDays stored the way they were before __slots__ (a
+per-instance __dict__ with pop, period and humidity left as strings), the
+__slots__ ForecastDay, and a columnar ForecastTable.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_memory.py [forecasts]
+"""
+import sys
+from datetime import datetime
+import time
+import tracemalloc
+
+import _fixtures
+import forecastdata
+
+class DictForecastDay(object):
+    """A ForecastDay as it was stored before __slots__."""
+    def __init__(self, fields):
+        self.forecast_date = datetime.fromtimestamp(int(fields['epoch']))
+        for name in forecastdata.ForecastDay.__slots__[1:]:
+            setattr(self, name, fields[name])
+        for name in ('day_pop', 'night_pop', 'high_F', 'low_F', 'minwind_mph', 'maxwind_mph'):
+            setattr(self, name, int(fields[name]))
+        for name in ('qpf_allday_in', 'qpf_day_in', 'qpf_night_in', 'minwind_degrees', 'maxwind_degrees'):
+            setattr(self, name, float(fields[name]))
+
+def _fields(day, location):
+    """Builds from_fields input for a day, varied per location."""
+    fields = dict((name, str(getattr(day, name))) for name in forecastdata.ForecastDay.__slots__)
+    fields['epoch'] = str(int(time.mktime(day.forecast_date.timetuple())))
+    fields['high_F'] = str(day.high_F + location % 7)
+    fields['low_F'] = str(day.low_F - location % 5)
+    fields['humidity'] = str(40 + location % 50)
+    return fields
+
+def _measure(build):
+    tracemalloc.start()
+    try:
+        result = build()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+def main(forecasts=10000):
+    template = _fixtures.load_forecast()
+    fields = [[_fields(day, location) for day in template.ForecastDays]
+              for location in range(forecasts)]
+
+    def build(day_class):
+        result = list()
+        for location_fields in fields:
+            forecast = forecastdata.Forecast.__new__(forecastdata.Forecast)
+            forecast.ForecastDays = [day_class(day) for day in location_fields]
+            result.append(forecast)
+        return result
+
+    dict_bytes, _ = _measure(lambda: build(DictForecastDay))
+    slots_bytes, slotted = _measure(lambda: build(forecastdata.ForecastDay.from_fields))
+
+    def build_table():
+        table = forecastdata.ForecastTable()
+        for location, forecast in enumerate(slotted):
+            table.append(location, forecast)
+        return table
+
+    table_bytes, table = _measure(build_table)
+    print('%d forecasts (%d days)' % (forecasts, len(table)))
+    for name, size in (('__dict__ ForecastDay', dict_bytes),
+                       ('__slots__ ForecastDay', slots_bytes),
+                       ('ForecastTable', table_bytes)):
+        print('  %-22s %8.1f MiB  %6d bytes/forecast' % (name, size / 1048576.0, size // forecasts))
+    print('  (ForecastTable columns alone: %.1f MiB)' % (table.nbytes() / 1048576.0))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,48 @@
+"""Benchmarks the forecastdata XML response parsers on recorded API responses.
+
+Reports the per-response parse time and the peak memory allocated while
+parsing for each parser in forecastdata.PARSERS.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_parse.py [iterations]
+"""
+import sys
+import timeit
+import tracemalloc
+
+import _fixtures
+import forecastdata
+
+FIXTURES = ('forecast.xml',)
+
+def _attributes(forecast):
+    return [[getattr(day, name) for name in day.__slots__] for day in forecast.ForecastDays]
+
+def peak_memory(parser, response):
+    """Measures the peak memory allocated while parsing one response."""
+    tracemalloc.start()
+    try:
+        forecastdata.Forecast.from_response(response, parser)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main(iterations=500):
+    for name in FIXTURES:
+        response = _fixtures.read_fixture(name)
+        expected = _attributes(forecastdata.Forecast.from_response(response, 'dom'))
+        print('%s (%d bytes)' % (name, len(response)))
+        for parser in sorted(forecastdata.PARSERS):
+            if forecastdata.PARSER_FORMATS[parser] != 'xml':
+                continue
+            forecast = forecastdata.Forecast.from_response(response, parser)
+            assert _attributes(forecast) == expected, parser
+            seconds = min(timeit.repeat(
+                lambda: forecastdata.Forecast.from_response(response, parser),
+                number=iterations, repeat=3)) / iterations
+            print('  %-8s %9.1f us/response  %8.1f KiB peak' % (
+                parser, seconds * 1e6, peak_memory(parser, response) / 1024.0))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
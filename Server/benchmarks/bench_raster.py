@@ -0,0 +1,43 @@
+"""Measures rendering a forecast to a grayscale PNG in-process.
+
+Requires cairosvg.  Reports the first render (which rasterizes and caches
+the icon glyphs), later renders, PNG encoding at 8 and 4 bits, and finding
+the changed rectangle between two forecasts.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_raster.py [renders]
+"""
+import sys
+import time
+
+import _fixtures
+import raster
+
+def main(renders=20):
+    if not raster._get_cairosvg():
+        print('cairosvg is not installed')
+        return
+    forecast = _fixtures.load_forecast()
+    start = time.time()
+    image = raster.render_forecast_image(forecast)
+    print('first render (caches glyphs)  %8.1f ms' % ((time.time() - start) * 1e3))
+    start = time.time()
+    for i in range(renders):
+        image = raster.render_forecast_image(forecast)
+    print('render                        %8.1f ms' % ((time.time() - start) * 1e3 / renders))
+    for bit_depth in (8, 4):
+        start = time.time()
+        for i in range(renders):
+            png = raster.encode_png(image, bit_depth)
+        print('encode %d-bit PNG              %8.1f ms  %7d bytes' % (
+            bit_depth, (time.time() - start) * 1e3 / renders, len(png)))
+    forecast.ForecastDays[0].high_F += 1
+    changed = raster.render_forecast_image(forecast)
+    start = time.time()
+    for i in range(renders):
+        rect = raster.changed_rect(image, changed)
+    print('changed_rect                  %8.1f ms  %s' % ((time.time() - start) * 1e3 / renders, rect))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,36 @@
+"""Benchmarks the compiled SVG template against chained str.replace calls.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_render.py [iterations]
+"""
+import codecs
+import sys
+import timeit
+
+import _fixtures
+import svgmanip
+
+def render_replace(forecast_obj):
+    """Renders the way write_forecast did before templates were compiled."""
+    output = codecs.open(svgmanip.TEMPLATE_PATH, 'r', encoding='utf-8').read()
+    for day in forecast_obj.ForecastDays:
+        output = svgmanip.write_forecastday(output, day)
+    return output
+
+def main(iterations=200):
+    forecast = _fixtures.load_forecast()
+    assert render_replace(forecast) == svgmanip.render_forecast(forecast)
+
+    results = [
+        ('str.replace chain', lambda: render_replace(forecast)),
+        ('compiled template', lambda: svgmanip.render_forecast(forecast)),
+    ]
+    baseline = None
+    for name, func in results:
+        seconds = min(timeit.repeat(func, number=iterations, repeat=3)) / iterations
+        baseline = baseline or seconds
+        print('%-20s %9.1f us/render  %5.1fx' % (name, seconds * 1e6, baseline / seconds))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,45 @@
+"""Compares svgmanip.write_forecast with and without a RenderCache.
+
+Locations are drawn from a smaller set of distinct forecasts, as when many
+locations share a forecast grid point.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_rendercache.py [locations] [distinct_forecasts]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import _fixtures
+import svgmanip
+
+def main(locations=5000, distinct=500):
+    forecasts = list()
+    for i in range(distinct):
+        forecast = _fixtures.load_forecast()
+        forecast.ForecastDays[0].high_F = i
+        forecasts.append(forecast)
+    output_dir = tempfile.mkdtemp(prefix='pyweather-bench-')
+    try:
+        work = [(forecasts[i % distinct], os.path.join(output_dir, '%d.svg' % i)) for i in range(locations)]
+        start = time.time()
+        for forecast, output_path in work:
+            svgmanip.write_forecast(forecast, output_path)
+        uncached = time.time() - start
+        print('no cache     %7.0f writes/s' % (locations / uncached))
+
+        cache = svgmanip.RenderCache(os.path.join(output_dir, 'cache'))
+        start = time.time()
+        for forecast, output_path in work:
+            svgmanip.write_forecast(forecast, output_path, cache=cache)
+        cached = time.time() - start
+        print('RenderCache  %7.0f writes/s  %5.2fx  hit rate %.1f%%'
+              % (locations / cached, uncached / cached, cache.hit_rate * 100))
+    finally:
+        shutil.rmtree(output_dir)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
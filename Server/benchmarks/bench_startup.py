@@ -0,0 +1,87 @@
+"""Measures the startup cost of server.py runs with -X importtime.
+
+Each case runs server.py in a fresh interpreter against a local stub API
+serving the recorded fixtures, and reports the median wall time and the
+time spent importing modules (the cumulative import time of the top level
+imports reported by -X importtime).
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import _fixtures
+import stubapi
+
+SERVER_PATH = os.path.join(_fixtures.SERVER_DIR, 'server.py')
+TEMPLATE_PATH = os.path.join(_fixtures.SERVER_DIR, 'template.svg')
+
+CASES = [
+    ('interpreter', ['-c', 'pass']),
+    ('help', [SERVER_PATH, '--help']),
+    ('radar', [SERVER_PATH, '--no-forecast']),
+    ('forecast', [SERVER_PATH, '--no-radar']),
+    ('forecast+radar', [SERVER_PATH]),
+]
+
+def _import_times(stderr):
+    """Reads the top level imports' cumulative times from -X importtime output.
+
+    Returns:
+        list of (microseconds, module name), slowest first.
+    """
+    imports = list()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        if name.strip() and not name[1:].startswith(' '):
+            imports.append((int(fields[1]), name.strip()))
+    return sorted(imports, reverse=True)
+
+def main(runs=10):
+    work_dir = tempfile.mkdtemp(prefix='pyweather-startup-')
+    responses = {'forecast': _fixtures.read_fixture('forecast.xml'),
+                 'animatedradar': _fixtures.read_fixture('radar.gif')}
+    try:
+        key_path = os.path.join(work_dir, 'api.key')
+        with open(key_path, 'w') as key_file:
+            key_file.write('0123456789abcdef\n')
+        with stubapi.StubAPIServer(responses) as server:
+            options = ['--api-root', server.url, '--api-key-file', key_path, '--template', TEMPLATE_PATH]
+            for name, args in CASES:
+                if args[0] == SERVER_PATH and name != 'help':
+                    args = args + options
+                walls = list()
+                imports = list()
+                for run in range(runs):
+                    start = time.time()
+                    process = subprocess.Popen([sys.executable, '-X', 'importtime'] + args, cwd=work_dir,
+                                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                               universal_newlines=True)
+                    stdout, stderr = process.communicate()
+                    walls.append(time.time() - start)
+                    if process.returncode:
+                        raise RuntimeError('%s failed:\n%s' % (name, stderr))
+                    imports.append(_import_times(stderr))
+                walls.sort()
+                totals = sorted(sum(microseconds for microseconds, module in run) for run in imports)
+                print('%-15s %7.1f ms wall  %7.1f ms importing' % (
+                    name, walls[len(walls) // 2] * 1e3, totals[len(totals) // 2] / 1e3))
+            print('slowest imports of %s:' % name)
+            for microseconds, module in imports[-1][:8]:
+                print('  %7.1f ms  %s' % (microseconds / 1e3, module))
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
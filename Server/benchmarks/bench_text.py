@@ -0,0 +1,44 @@
+"""Times cleaning and wrapping forecast texts, with and without the text cache.
+
+Every location's day and night texts are drawn from the recorded forecast's
+descriptions, as the API's descriptions come from a small vocabulary.
+
+Usage (from the Server directory):
+
+    python benchmarks/bench_text.py [locations]
+"""
+import sys
+import time
+
+import _fixtures
+import svgmanip
+
+def main(locations=10000):
+    forecast = _fixtures.load_forecast()
+    texts = list()
+    for day in forecast.ForecastDays:
+        texts.append((day.day_text, svgmanip.DAY_TEXT))
+        texts.append((day.night_text, svgmanip.NIGHT_TEXT))
+    work = [texts[i % len(texts)] for i in range(locations * len(texts))]
+
+    entries = svgmanip._TEXT_CACHE_ENTRIES
+    svgmanip._TEXT_CACHE_ENTRIES = 0
+    try:
+        start = time.time()
+        for text, box in work:
+            svgmanip._clean_text(text, box)
+        uncached = time.time() - start
+    finally:
+        svgmanip._TEXT_CACHE_ENTRIES = entries
+    print('uncached  %9.0f texts/s' % (len(work) / uncached))
+
+    svgmanip._text_cache.clear()
+    start = time.time()
+    for text, box in work:
+        svgmanip._clean_text(text, box)
+    cached = time.time() - start
+    print('cached    %9.0f texts/s  %5.2fx  (%d distinct texts)'
+          % (len(work) / cached, uncached / cached, len(svgmanip._text_cache)))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,193 @@
+"""Runs the benchmark suite against the stub API and records JSON results.
+
+Every case is served the recorded fixtures (fixtures/forecast.xml and
+fixtures/radar.gif) by a local stub API server, so no API key or network
+access is needed.  Each case runs at 1, 100 and 10000 locations:
+
+    xml_request        apirequest.xml_request('forecast', query)
+    forecast           forecastdata.Forecast(query)
+    write_forecastday  svgmanip.write_forecastday for each day of a forecast
+    server_flow        what server.py does: Forecast, write_forecast and
+                       radar_download
+
+Each case is run once untimed to warm up, then sizes below 1000 locations
+are repeated and the fastest run is kept.
+Results are written as JSON along with the commit they were measured at, so
+runs on different commits can be compared:
+
+Usage (from the Server directory):
+
+    python benchmarks/suite.py [--sizes 1,100,10000] [--repeat 5] [--output results.json]
+    python benchmarks/suite.py --compare baseline.json results.json [--threshold 0.1]
+"""
+import argparse
+import codecs
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import _fixtures
+import apirequest
+import forecastdata
+import stubapi
+import svgmanip
+
+# Radar parameters used by server.py
+RADAR_PARAMS = '?width=800&height=400&newmaps=1&num=15&delay=25&timelabel=1&timelabel.y=10'
+
+TEMPLATE_PATH = os.path.join(_fixtures.SERVER_DIR, 'template.svg')
+
+def _queries(size):
+    return ['%05d' % (10000 + i) for i in range(size)]
+
+def bench_xml_request(size, work_dir):
+    for query in _queries(size):
+        apirequest.xml_request('forecast', query)
+
+def bench_forecast(size, work_dir):
+    for query in _queries(size):
+        forecastdata.Forecast(query)
+
+# (Forecast, template text) for bench_write_forecastday, loaded during the
+# warm up so the fixture is not parsed inside the timed runs
+_forecastday_inputs = None
+
+def bench_write_forecastday(size, work_dir):
+    global _forecastday_inputs
+    if _forecastday_inputs is None:
+        _forecastday_inputs = (_fixtures.load_forecast(),
+                               codecs.open(TEMPLATE_PATH, 'r', encoding='utf-8').read())
+    forecast, template = _forecastday_inputs
+    for i in range(size):
+        svg = template
+        for day in forecast.ForecastDays:
+            svg = svgmanip.write_forecastday(svg, day)
+
+def bench_server_flow(size, work_dir):
+    for query in _queries(size):
+        forecast = forecastdata.Forecast(query)
+        svgmanip.write_forecast(forecast, os.path.join(work_dir, query + '.svg'), TEMPLATE_PATH)
+        apirequest.radar_download(query, os.path.join(work_dir, query + '.gif'), request_params=RADAR_PARAMS)
+
+CASES = [
+    ('xml_request', bench_xml_request),
+    ('forecast', bench_forecast),
+    ('write_forecastday', bench_write_forecastday),
+    ('server_flow', bench_server_flow),
+]
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=_fixtures.SERVER_DIR,
+                                       stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes=(1, 100, 10000), repeat=5, cases=None):
+    """Runs the suite.
+
+    Args:
+        sizes: Numbers of locations to run each case at.
+        repeat: Runs of each case at sizes below 1000 (the fastest is kept).
+        cases: Names of the cases to run (defaults to all of CASES).
+
+    Returns:
+        dict of results, as written to the JSON output.
+    """
+    results = dict()
+    responses = {'forecast': _fixtures.read_fixture('forecast.xml'),
+                 'animatedradar': _fixtures.read_fixture('radar.gif')}
+    with stubapi.StubAPIServer(responses):
+        for name, case in CASES:
+            if cases and name not in cases:
+                continue
+            results[name] = dict()
+            # warm up the template, connection pool and fixtures
+            work_dir = tempfile.mkdtemp(prefix='pyweather-suite-')
+            try:
+                case(1, work_dir)
+            finally:
+                shutil.rmtree(work_dir)
+            for size in sizes:
+                runs = list()
+                for attempt in range(repeat if size < 1000 else 1):
+                    work_dir = tempfile.mkdtemp(prefix='pyweather-suite-')
+                    try:
+                        start = time.time()
+                        case(size, work_dir)
+                        runs.append(time.time() - start)
+                    finally:
+                        shutil.rmtree(work_dir)
+                best = min(runs)
+                results[name][str(size)] = {'seconds': best, 'runs': runs,
+                                            'per_location_ms': best * 1e3 / size}
+                print('%-18s %6d locations  %9.3f s  %8.3f ms/location' % (
+                    name, size, best, best * 1e3 / size))
+                sys.stdout.flush()
+    return {
+        'commit': _commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+
+def compare(baseline, current, threshold=0.1):
+    """Prints how each case changed between two result files.
+
+    Args:
+        baseline: dict of results to compare against.
+        current: dict of results to compare.
+        threshold: Fractional slowdown reported as a regression.
+
+    Returns:
+        Number of regressions.
+    """
+    regressions = 0
+    print('baseline %s, current %s' % (baseline.get('commit'), current.get('commit')))
+    for name, sizes in sorted(current['results'].items()):
+        for size, result in sorted(sizes.items(), key=lambda item: int(item[0])):
+            before = baseline['results'].get(name, {}).get(size)
+            if before is None:
+                continue
+            ratio = result['seconds'] / before['seconds']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print('%-18s %6s locations  %8.3f -> %8.3f ms/location  %5.2fx%s' % (
+                name, size, before['per_location_ms'], result['per_location_ms'], ratio, flag))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the PyWeather benchmark suite.')
+    parser.add_argument('--sizes', default='1,100,10000',
+                        help='comma separated numbers of locations (default 1,100,10000)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each case below 1000 locations (default 5)')
+    parser.add_argument('--cases', help='comma separated cases to run (default all)')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown reported as a regression by --compare (default 0.1)')
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as baseline, open(args.compare[1]) as current:
+            regressions = compare(json.load(baseline), json.load(current), args.threshold)
+        return 1 if regressions else 0
+    results = run([int(size) for size in args.sizes.split(',')], args.repeat,
+                  args.cases.split(',') if args.cases else None)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,27 +21,227 @@ Matthew Petroff's Kindle Weather Display project.
 http://mpetroff.net/2012/09/kindle-weather-display/
 https://github.com/mpetroff/kindle-weather-display
 """
+from array import array
+import numbers
+
+try:
+    # Python 2
+    _TEXT_TYPES = (basestring,)
+except NameError:
+    # Python 3
+    _TEXT_TYPES = (str, bytes)
+
+# NumPy, imported on first use as it takes longer to import than the rest of
+# PyWeather: None until then, False if it is not installed.
+_numpy = None
+
+def _get_numpy():
+    """Gets the numpy module, importing it on first use.
+
+    Returns:
+        The numpy module, or False if NumPy is not installed.
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+# Conversion factors
+KPH_PER_MPH = 1.609344
+KPH_PER_MPS = 3.6
+MM_PER_IN = 25.4
+HPA_PER_INHG = 33.8638866667
+
+def _apply(values, conversion):
+    """Applies an arithmetic conversion to a scalar or a whole column.
+
+    Every converter accepts a scalar (including NumPy scalars), a NumPy
+    array, an array.array, a memoryview or a list.  With NumPy installed,
+    columns are converted in a single vectorized operation.  Without it,
+    columns are still accepted but are converted one element at a time in
+    Python, which is far slower for large columns; install NumPy when
+    converting whole columns.
+
+    Args:
+        values: Scalar or column of values to convert.
+        conversion: Function of one argument using only arithmetic
+            operators, so it applies equally to scalars and NumPy arrays.
+
+    Returns:
+        The converted scalar for scalar input; a NumPy array for NumPy
+        array input; otherwise an array.array of doubles.
+
+    Raises:
+        TypeError: values is a string rather than a number or column.
+    """
+    if isinstance(values, numbers.Number):
+        return conversion(values)
+    if isinstance(values, _TEXT_TYPES):
+        raise TypeError('cannot convert a string: %r' % (values,))
+    numpy = _get_numpy()
+    if numpy:
+        if isinstance(values, numpy.ndarray):
+            return conversion(values)
+        converted = conversion(numpy.asarray(values, dtype=numpy.float64))
+        return array('d', converted.tobytes())
+    return array('d', [conversion(value) for value in values])
+
 class Temperature(object):
     """Temperature conversion functions.
     """
+    @staticmethod
     def f_to_c(fahrenheit):
         """Converts fahrenheit to celsius.
 
         Args:
-            fahrenheit: fahrenheit value to convert to celsius.
+            fahrenheit: fahrenheit value (or column of values) to convert to celsius.
 
         Returns:
             celsius value.
         """
-        return (fahrenheit - 32) * 5 / 9
+        return _apply(fahrenheit, lambda f: (f - 32) * 5 / 9)
 
+    @staticmethod
     def c_to_f(celsius):
         """Converts celsius to fahrenheit.
 
         Args:
-            celsius: celsius value to convert to fahrenheit.
+            celsius: celsius value (or column of values) to convert to fahrenheit.
 
         Returns:
             fahrenheit value.
         """
-        return celsius * 9 / 5 + 32
\ No newline at end of file
+        return _apply(celsius, lambda c: c * 9 / 5 + 32)
+
+class Speed(object):
+    """Wind speed conversion functions.
+    """
+    @staticmethod
+    def mph_to_kph(mph):
+        """Converts miles per hour to kilometres per hour.
+
+        Args:
+            mph: miles per hour value (or column of values) to convert.
+
+        Returns:
+            kilometres per hour value.
+        """
+        return _apply(mph, lambda v: v * KPH_PER_MPH)
+
+    @staticmethod
+    def kph_to_mph(kph):
+        """Converts kilometres per hour to miles per hour.
+
+        Args:
+            kph: kilometres per hour value (or column of values) to convert.
+
+        Returns:
+            miles per hour value.
+        """
+        return _apply(kph, lambda v: v / KPH_PER_MPH)
+
+    @staticmethod
+    def mph_to_mps(mph):
+        """Converts miles per hour to metres per second.
+
+        Args:
+            mph: miles per hour value (or column of values) to convert.
+
+        Returns:
+            metres per second value.
+        """
+        return _apply(mph, lambda v: v * KPH_PER_MPH / KPH_PER_MPS)
+
+    @staticmethod
+    def mps_to_mph(mps):
+        """Converts metres per second to miles per hour.
+
+        Args:
+            mps: metres per second value (or column of values) to convert.
+
+        Returns:
+            miles per hour value.
+        """
+        return _apply(mps, lambda v: v * KPH_PER_MPS / KPH_PER_MPH)
+
+    @staticmethod
+    def kph_to_mps(kph):
+        """Converts kilometres per hour to metres per second.
+
+        Args:
+            kph: kilometres per hour value (or column of values) to convert.
+
+        Returns:
+            metres per second value.
+        """
+        return _apply(kph, lambda v: v / KPH_PER_MPS)
+
+    @staticmethod
+    def mps_to_kph(mps):
+        """Converts metres per second to kilometres per hour.
+
+        Args:
+            mps: metres per second value (or column of values) to convert.
+
+        Returns:
+            kilometres per hour value.
+        """
+        return _apply(mps, lambda v: v * KPH_PER_MPS)
+
+class Precipitation(object):
+    """Precipitation quantity conversion functions.
+    """
+    @staticmethod
+    def in_to_mm(inches):
+        """Converts inches to millimetres.
+
+        Args:
+            inches: inches value (or column of values) to convert.
+
+        Returns:
+            millimetres value.
+        """
+        return _apply(inches, lambda v: v * MM_PER_IN)
+
+    @staticmethod
+    def mm_to_in(mm):
+        """Converts millimetres to inches.
+
+        Args:
+            mm: millimetres value (or column of values) to convert.
+
+        Returns:
+            inches value.
+        """
+        return _apply(mm, lambda v: v / MM_PER_IN)
+
+class Pressure(object):
+    """Barometric pressure conversion functions.
+    """
+    @staticmethod
+    def inhg_to_hpa(inhg):
+        """Converts inches of mercury to hectopascals (millibars).
+
+        Args:
+            inhg: inches of mercury value (or column of values) to convert.
+
+        Returns:
+            hectopascals value.
+        """
+        return _apply(inhg, lambda v: v * HPA_PER_INHG)
+
+    @staticmethod
+    def hpa_to_inhg(hpa):
+        """Converts hectopascals (millibars) to inches of mercury.
+
+        Args:
+            hpa: hectopascals value (or column of values) to convert.
+
+        Returns:
+            inches of mercury value.
+        """
+        return _apply(hpa, lambda v: v / HPA_PER_INHG)
@@ -21,8 +21,12 @@ Matthew Petroff's Kindle Weather Display project.
 http://mpetroff.net/2012/09/kindle-weather-display/
 https://github.com/mpetroff/kindle-weather-display
 """
-from apirequest import xml_request
+from apirequest import decode_json, raw_request
+from array import array
+from convert import Precipitation, Speed, Temperature, _get_numpy
 from datetime import datetime
+from io import BytesIO
+import instrument
 
 def _getNodeValue(xml_element, tag_name):
     """Extracts the enclosed text from a specific tag within an XML element
@@ -42,6 +46,313 @@ def _getNodeValue(xml_element, tag_name):
     else: 
         return xml_element.getElementsByTagName(tag_name)[0].firstChild.nodeValue
 
+def _parse_dom(response):
+    """Parses a forecast API response by building a full DOM tree.
+
+    Args:
+        response: The forecast API response (XML bytes).
+
+    Returns:
+        list of ForecastDay objects.
+    """
+    from xml.dom.minidom import parseString
+
+    xml = parseString(response)
+
+    # The API response is broken into two main sections: txt_forecast and
+    # simpleforecast.  txt_forecast contains data for day and night,
+    # including a short, plain english description of the data.
+    # simpleforecast contains data for each calendar day but does not
+    # include any descriptions.  Both parsers are responsible for
+    # creating ForecastDay objects that contain all the data from both
+    # txt_forecast and simpleforecast for a particular calendar day.
+    txt_forecast = xml.getElementsByTagName('txt_forecast')
+    simpleforecast = xml.getElementsByTagName('simpleforecast')
+
+    # Get all forecastday elements from simple forecast
+    simplexml = list()
+    for simpleday in simpleforecast[0].getElementsByTagName('forecastday'):
+        simplexml.append(simpleday)
+
+    # Get all periods in the txt_forecast
+    txtdays = txt_forecast[0].getElementsByTagName('forecastday')
+
+    # Get day forecastday elements from txt_forecast
+    dayxml = list()
+    for i in range(0, len(txtdays), 2):
+        dayxml.append(txtdays[i])
+
+    # Get night forecastday elements from txt_forecast
+    nightxml = list()
+    for i in range(1, len(txtdays), 2):
+        nightxml.append(txtdays[i])
+
+    # Create ForecastDay objects
+    forecastdays = list()
+    for i in range(_day_count(simplexml, txtdays)):
+        forecastdays.append(ForecastDay(dayxml[i], nightxml[i], simplexml[i]))
+    return forecastdays
+
+def _day_count(simpledays, txtdays):
+    """Gets the number of days a response has both day/night texts and data for.
+
+    The forecast feature has 4 days and forecast10day 10; each day has
+    a simpleforecast forecastday and two txt_forecast periods.
+    """
+    return min(len(simpledays), len(txtdays) // 2)
+
+def _dom_fields(day_xml, night_xml, simple_xml):
+    """Gathers ForecastDay field values from minidom elements.
+
+    Args:
+        day_xml: The day-time periods of the txt_forecast section.
+        night_xml: The night-time periods of the txt_forecast section.
+        simple_xml: The simpleforecast section of the API response.
+
+    Returns:
+        dict of unconverted field values (see ForecastDay.from_fields).
+    """
+    fields = dict()
+    fields['epoch'] = simple_xml.getElementsByTagName('epoch')[0].firstChild.nodeValue
+
+    # txt_forecast elements
+    fields['day_icon'] = _getNodeValue(day_xml, 'icon')
+    fields['night_icon'] = _getNodeValue(night_xml, 'icon')
+    fields['day_text'] = _getNodeValue(day_xml, 'fcttext')
+    fields['night_text'] = _getNodeValue(night_xml, 'fcttext')
+
+    # probability of precipitation
+    fields['pop'] = simple_xml.getElementsByTagName('pop')[0].firstChild.nodeValue
+    fields['day_pop'] = _getNodeValue(day_xml, 'pop')
+    fields['night_pop'] = _getNodeValue(night_xml, 'pop')
+
+    # simpleforecast elements
+    fields['period'] = simple_xml.getElementsByTagName('period')[0].firstChild.nodeValue
+    high = simple_xml.getElementsByTagName('high')
+    fields['high_F'] = _getNodeValue(high[0], 'fahrenheit')
+    low = simple_xml.getElementsByTagName('low')
+    fields['low_F'] = _getNodeValue(low[0], 'fahrenheit')
+    fields['humidity'] = simple_xml.getElementsByTagName('avehumidity')[0].firstChild.nodeValue
+
+    # quantity precipitation forecasted
+    qpf_allday = simple_xml.getElementsByTagName('qpf_allday')
+    fields['qpf_allday_in'] = _getNodeValue(qpf_allday[0], 'in')
+    qpf_day = simple_xml.getElementsByTagName('qpf_day')
+    fields['qpf_day_in'] = _getNodeValue(qpf_day[0], 'in')
+    qpf_night = simple_xml.getElementsByTagName('qpf_night')
+    fields['qpf_night_in'] = _getNodeValue(qpf_night[0], 'in')
+
+    # wind
+    minwind = simple_xml.getElementsByTagName('avewind')
+    fields['minwind_mph'] = _getNodeValue(minwind[0], 'mph')
+    fields['minwind_degrees'] = _getNodeValue(minwind[0], 'degrees')
+    fields['minwind_dir'] = _getNodeValue(minwind[0], 'dir')
+    maxwind = simple_xml.getElementsByTagName('maxwind')
+    fields['maxwind_mph'] = _getNodeValue(maxwind[0], 'mph')
+    fields['maxwind_degrees'] = _getNodeValue(maxwind[0], 'degrees')
+    fields['maxwind_dir'] = _getNodeValue(maxwind[0], 'dir')
+    return fields
+
+# Elements of a simpleforecast forecastday whose children are read together.
+_SIMPLE_GROUPS = ('high', 'low', 'qpf_allday', 'qpf_day', 'qpf_night', 'avewind', 'maxwind')
+
+class _StreamScope(object):
+    """Text collected for one element of interest during a streaming parse.
+
+    Attributes:
+        element: the element this scope was opened for.
+        values: dict mapping descendant tag names to the text of their first
+            occurrence.
+        empty: whether the element contains an empty (self closing) element,
+            mirroring the self closing tag check in _getNodeValue.
+        groups: dict of _StreamScope objects for _SIMPLE_GROUPS children.
+    """
+    def __init__(self, element):
+        self.element = element
+        self.values = dict()
+        self.empty = False
+        self.groups = dict()
+
+    def get(self, tag_name):
+        """Gets a descendant's text the way _getNodeValue does."""
+        if self.empty:
+            return 0.0
+        return self.values[tag_name]
+
+def _parse_stream(response):
+    """Parses a forecast API response in a single incremental pass.
+
+    Only the text of the elements ForecastDay needs is kept; every other
+    element is discarded as soon as it has been read, so no tree of the
+    whole response is ever built.
+
+    Args:
+        response: The forecast API response (XML bytes).
+
+    Returns:
+        list of ForecastDay objects.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    section = None
+    scopes = list()
+    txtdays = list()
+    simpledays = list()
+    for event, element in iterparse(BytesIO(response), events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            if tag == 'txt_forecast' or tag == 'simpleforecast':
+                section = tag
+            elif tag == 'forecastday' and section is not None:
+                scopes.append(_StreamScope(element))
+            elif tag in _SIMPLE_GROUPS and section == 'simpleforecast' and scopes:
+                scopes.append(_StreamScope(element))
+            continue
+
+        if len(element) == 0:
+            if element.text is None:
+                # self closing tag
+                for scope in scopes:
+                    scope.empty = True
+            else:
+                for scope in scopes:
+                    if tag not in scope.values:
+                        scope.values[tag] = element.text
+
+        if scopes and scopes[-1].element is element:
+            scope = scopes.pop()
+            if tag in _SIMPLE_GROUPS:
+                scopes[-1].groups.setdefault(tag, scope)
+            elif section == 'txt_forecast':
+                txtdays.append(scope)
+            else:
+                simpledays.append(scope)
+        if tag == 'txt_forecast' or tag == 'simpleforecast':
+            section = None
+        if not scopes:
+            element.clear()
+
+    forecastdays = list()
+    for i in range(_day_count(simpledays, txtdays)):
+        forecastdays.append(ForecastDay.from_fields(
+            _stream_fields(txtdays[2 * i], txtdays[2 * i + 1], simpledays[i])))
+    return forecastdays
+
+def _stream_fields(day_scope, night_scope, simple_scope):
+    """Gathers ForecastDay field values from streaming parse scopes.
+
+    Args:
+        day_scope: _StreamScope for a day-time txt_forecast period.
+        night_scope: _StreamScope for a night-time txt_forecast period.
+        simple_scope: _StreamScope for a simpleforecast day.
+
+    Returns:
+        dict of unconverted field values (see ForecastDay.from_fields).
+    """
+    simple = simple_scope.values
+    groups = simple_scope.groups
+    fields = dict()
+    fields['epoch'] = simple['epoch']
+    fields['day_icon'] = day_scope.get('icon')
+    fields['night_icon'] = night_scope.get('icon')
+    fields['day_text'] = day_scope.get('fcttext')
+    fields['night_text'] = night_scope.get('fcttext')
+    fields['pop'] = simple['pop']
+    fields['day_pop'] = day_scope.get('pop')
+    fields['night_pop'] = night_scope.get('pop')
+    fields['period'] = simple['period']
+    fields['high_F'] = groups['high'].get('fahrenheit')
+    fields['low_F'] = groups['low'].get('fahrenheit')
+    fields['humidity'] = simple['avehumidity']
+    fields['qpf_allday_in'] = groups['qpf_allday'].get('in')
+    fields['qpf_day_in'] = groups['qpf_day'].get('in')
+    fields['qpf_night_in'] = groups['qpf_night'].get('in')
+    fields['minwind_mph'] = groups['avewind'].get('mph')
+    fields['minwind_degrees'] = groups['avewind'].get('degrees')
+    fields['minwind_dir'] = groups['avewind'].get('dir')
+    fields['maxwind_mph'] = groups['maxwind'].get('mph')
+    fields['maxwind_degrees'] = groups['maxwind'].get('degrees')
+    fields['maxwind_dir'] = groups['maxwind'].get('dir')
+    return fields
+
+def _parse_json(response):
+    """Parses a JSON forecast API response.
+
+    Args:
+        response: The forecast API response (JSON bytes).
+
+    Returns:
+        list of ForecastDay objects.
+    """
+    forecast = decode_json(response)['forecast']
+    txtdays = forecast['txt_forecast']['forecastday']
+    simpledays = forecast['simpleforecast']['forecastday']
+    forecastdays = list()
+    for i in range(_day_count(simpledays, txtdays)):
+        forecastdays.append(ForecastDay.from_fields(
+            _json_fields(txtdays[2 * i], txtdays[2 * i + 1], simpledays[i])))
+    return forecastdays
+
+def _json_get(group, key):
+    """Gets a value from a JSON object the way _getNodeValue does from XML.
+
+    An empty value anywhere in the object stands for a self closing tag in
+    the XML response, which makes every value of the group read as 0.0.
+    """
+    for value in group.values():
+        if value is None or value == '':
+            return 0.0
+    return group[key]
+
+def _json_fields(day_json, night_json, simple_json):
+    """Gathers ForecastDay field values from a decoded JSON response.
+
+    Args:
+        day_json: A day-time period of the txt_forecast section.
+        night_json: A night-time period of the txt_forecast section.
+        simple_json: A day of the simpleforecast section.
+
+    Returns:
+        dict of unconverted field values (see ForecastDay.from_fields).
+    """
+    fields = dict()
+    fields['epoch'] = simple_json['date']['epoch']
+    fields['day_icon'] = _json_get(day_json, 'icon')
+    fields['night_icon'] = _json_get(night_json, 'icon')
+    fields['day_text'] = _json_get(day_json, 'fcttext')
+    fields['night_text'] = _json_get(night_json, 'fcttext')
+    fields['pop'] = simple_json['pop']
+    fields['day_pop'] = _json_get(day_json, 'pop')
+    fields['night_pop'] = _json_get(night_json, 'pop')
+    fields['period'] = simple_json['period']
+    fields['high_F'] = _json_get(simple_json['high'], 'fahrenheit')
+    fields['low_F'] = _json_get(simple_json['low'], 'fahrenheit')
+    fields['humidity'] = simple_json['avehumidity']
+    fields['qpf_allday_in'] = _json_get(simple_json['qpf_allday'], 'in')
+    fields['qpf_day_in'] = _json_get(simple_json['qpf_day'], 'in')
+    fields['qpf_night_in'] = _json_get(simple_json['qpf_night'], 'in')
+    fields['minwind_mph'] = _json_get(simple_json['avewind'], 'mph')
+    fields['minwind_degrees'] = _json_get(simple_json['avewind'], 'degrees')
+    fields['minwind_dir'] = _json_get(simple_json['avewind'], 'dir')
+    fields['maxwind_mph'] = _json_get(simple_json['maxwind'], 'mph')
+    fields['maxwind_degrees'] = _json_get(simple_json['maxwind'], 'degrees')
+    fields['maxwind_dir'] = _json_get(simple_json['maxwind'], 'dir')
+    return fields
+
+# Forecast response parsers, selectable when constructing a Forecast.
+PARSERS = {
+    'dom': _parse_dom,
+    'stream': _parse_stream,
+    'json': _parse_json,
+}
+
+# Response format to request from the API for each parser.
+PARSER_FORMATS = {
+    'dom': 'xml',
+    'stream': 'xml',
+    'json': 'json',
+}
+
 class Forecast(object):
     """Encapsulates all data from a particular forecast.
 
@@ -51,7 +362,7 @@ class Forecast(object):
     Attributes:
         ForecastDays: list of ForecastDay objects containing the forecast's data.
     """
-    def __init__(self, request_query):
+    def __init__(self, request_query, parser='dom', requested_feature='forecast'):
         """Creates a new instance of the Forecast class.
 
         Args:
@@ -65,47 +376,92 @@ class Forecast(object):
                     <PWS id> (e.g. pws:KCASANFR70)
                     AutoIP (e.g. autoip)
                     specific IP (e.g. autoip.xml?geo_ip=38.102.136.138)
+            parser: Name of the response parser to use (see PARSERS).
+                'dom' builds a full minidom tree, 'stream' reads the
+                response in a single incremental pass, and 'json'
+                requests and decodes a JSON response instead of XML.
+            requested_feature: Forecast feature to request: 'forecast'
+                (4 days) or 'forecast10day' (10 days).
 
         Returns:
             A new instance of the Forecast class.
         """
-        xml = xml_request('forecast', request_query)
-        txt_forecast = xml.getElementsByTagName('txt_forecast')
-        simpleforecast = xml.getElementsByTagName('simpleforecast')
-        
-        self.ForecastDays = list()
-
-        # The API response is broken into two main sections: txt_forecast and
-        # simpleforecast.  txt_forecast contains data for day and night,
-        # including a short, plain english description of the data.
-        # simpleforecast contains data for each calendar day but does not
-        # include any descriptions.  The Forecast object is responsible to 
-        # creating ForecastDay objects that contain all the data from both
-        # txt_forecast and simpleforecast for a particular calendar day.
-
-        # Get all forecastday elements from simple forecast
-        simplexml = list()
-        for simpleday in simpleforecast[0].getElementsByTagName('forecastday'):
-            simplexml.append(simpleday)
-
-        # Get all periods in the txt_forecast
-        txtdays = txt_forecast[0].getElementsByTagName('forecastday')
-
-        # Get day forecastday elements from txt_forecast
-        dayxml = list()
-        for i in range(0, 8, 2):
-            dayxml.append(txtdays[i])
-
-        # Get night forecastday elements from txt_forecast
-        nightxml = list()
-        for i in range(1, 9, 2):
-            nightxml.append(txtdays[i])
-
-        # Create ForecastDay objects
-        for i in range(0, 4):
-            self.ForecastDays.append(ForecastDay(dayxml[i], nightxml[i], simplexml[i]))
-
-class ForecastDay(object):
+        parse = _get_parser(parser)
+        response = raw_request(requested_feature, request_query, PARSER_FORMATS[parser])
+        with instrument.stage('parse', request_query):
+            self.ForecastDays = parse(response)
+
+    @classmethod
+    def from_response(cls, response, parser='dom'):
+        """Creates a new instance of the Forecast class from a fetched response.
+
+        Args:
+            response: The forecast API response (XML bytes, or JSON bytes
+                for the 'json' parser).
+            parser: Name of the response parser to use (see PARSERS).
+
+        Returns:
+            A new instance of the Forecast class.
+        """
+        forecast = cls.__new__(cls)
+        parse = _get_parser(parser)
+        with instrument.stage('parse'):
+            forecast.ForecastDays = parse(response)
+        return forecast
+
+def _get_parser(parser):
+    """Looks up a forecast response parser by name.
+
+    Args:
+        parser: Name of the response parser (see PARSERS).
+
+    Returns:
+        The parser function.
+    """
+    try:
+        return PARSERS[parser]
+    except KeyError:
+        raise ValueError('Unknown forecast parser: ' + repr(parser))
+
+# Metric values derived from ForecastDay attributes: name -> (attribute, converter)
+METRIC_FIELDS = {
+    'high_C': ('high_F', Temperature.f_to_c),
+    'low_C': ('low_F', Temperature.f_to_c),
+    'qpf_allday_mm': ('qpf_allday_in', Precipitation.in_to_mm),
+    'qpf_day_mm': ('qpf_day_in', Precipitation.in_to_mm),
+    'qpf_night_mm': ('qpf_night_in', Precipitation.in_to_mm),
+    'minwind_kph': ('minwind_mph', Speed.mph_to_kph),
+    'maxwind_kph': ('maxwind_mph', Speed.mph_to_kph),
+}
+
+def _metric_property(name):
+    attribute, converter = METRIC_FIELDS[name]
+    return property(lambda self: converter(getattr(self, attribute)),
+                    doc='Metric counterpart of ' + attribute + ', converted on access.')
+
+class _MetricFields(object):
+    """Metric values computed on access from the imperial attributes.
+
+    Attributes:
+        high_C: Forecasted high temperature (celsius).
+        low_C: Forecasted low temperature (celsius).
+        qpf_allday_mm: Quantity of precipitation forecasted for entire day (mm).
+        qpf_day_mm: Quantity of precipitation forecasted for day-time (mm).
+        qpf_night_mm: Quantity of precipitation forecasted for night-time (mm).
+        minwind_kph: Minimum wind speed forecasted (kilometres per hour).
+        maxwind_kph: Maximum wind speed forecasted (kilometres per hour).
+    """
+    __slots__ = ()
+
+    high_C = _metric_property('high_C')
+    low_C = _metric_property('low_C')
+    qpf_allday_mm = _metric_property('qpf_allday_mm')
+    qpf_day_mm = _metric_property('qpf_day_mm')
+    qpf_night_mm = _metric_property('qpf_night_mm')
+    minwind_kph = _metric_property('minwind_kph')
+    maxwind_kph = _metric_property('maxwind_kph')
+
+class ForecastDay(_MetricFields):
     """Encapsulates data from both txt_forecast and simpleforecast for a single day.
     
     txt_forecast contains data for day and night, including a short, plain 
@@ -114,17 +470,18 @@ class ForecastDay(object):
 
     Attributes:
         forecast_date: datetime object for day this object represents.
+        epoch: The API's date for the day, in seconds since the epoch.
         day_icon: SVG icon name to use for the day-time forecast.
         night_icon: SVG icon name to use for the night-time forecast.
         day_text: Plain english description of the day-time forecast.
         night_text: Plain english description of the night-time forecast.
-        pop: Probability of precipitation for entire day.
+        pop: Probability of precipitation for entire day (percent).
         day_pop: Probability of precipitation for day-time.
         night_pop: Probability of precipitation for night-time.
         period: Relative position of day in the rest of the forecast (1 = today).
         high_F: Forecasted high temperature (fahrenheit).
         low_F: Forecasted low temperature (fahrenheit).
-        humidity: Forecasted relative humidity.
+        humidity: Forecasted relative humidity (percent).
         qpf_allday_in: Quantity of precipitation forecasted for entire day (inches).
         qpf_day_in: Quantity of precipitation forecasted for day-time (inches).
         qpf_night_in: Quantity of precipitation forecasted for night-time (inches).
@@ -134,7 +491,19 @@ class ForecastDay(object):
         maxwind_mph: Maximum wind speed forecasted (miles per hour).
         maxwind_degrees: Forecasted prevailing wind direction (compass heading 0-360).
         maxwind_dir: Forecasted prevailing wind direction (e.g. NNE).
+
+    Metric values (high_C, qpf_day_mm, maxwind_kph, ...) are computed from
+    these attributes when accessed; see _MetricFields.
     """
+    # No per-instance __dict__: forecasts for many locations are held at once.
+    __slots__ = (
+        'forecast_date', 'epoch', 'day_icon', 'night_icon', 'day_text', 'night_text',
+        'pop', 'day_pop', 'night_pop', 'period', 'high_F', 'low_F', 'humidity',
+        'qpf_allday_in', 'qpf_day_in', 'qpf_night_in',
+        'minwind_mph', 'minwind_degrees', 'minwind_dir',
+        'maxwind_mph', 'maxwind_degrees', 'maxwind_dir',
+    )
+
     def __init__(self, day_xml, night_xml, simple_xml):
         """Creates a new instance of the ForecastDay class.
 
@@ -146,55 +515,69 @@ class ForecastDay(object):
         Returns:
             A new instance of the ForecastDay class.
         """
+        with instrument.stage('fields'):
+            self._set_fields(_dom_fields(day_xml, night_xml, simple_xml))
+
+    @classmethod
+    def from_fields(cls, fields):
+        """Creates a new instance of the ForecastDay class from field values.
+
+        Args:
+            fields: dict of unconverted field values keyed by attribute name,
+                plus 'epoch' for the forecast date.  Values are text as read
+                from the response, or 0.0 where the response had a self
+                closing tag.
+
+        Returns:
+            A new instance of the ForecastDay class.
+        """
+        forecastday = cls.__new__(cls)
+        with instrument.stage('fields'):
+            forecastday._set_fields(fields)
+        return forecastday
+
+    def _set_fields(self, fields):
+        """Converts and stores field values read from an API response.
+
+        Args:
+            fields: dict of unconverted field values (see from_fields).
+        """
         # NOTE:
-        # metric values not yet implemented
         # snow_allday, snow_day, snow_night elements not yet implemented
 
         # set the date
-        epoch = simple_xml.getElementsByTagName('epoch')[0].firstChild.nodeValue
-        self.forecast_date = datetime.fromtimestamp(int(epoch))
+        self.epoch = int(fields['epoch'])
+        self.forecast_date = datetime.fromtimestamp(self.epoch)
 
         # txt_forecast elements
-        self.day_icon = _getNodeValue(day_xml, 'icon')
-        self.night_icon = _getNodeValue(night_xml, 'icon')
-        self.day_text = _getNodeValue(day_xml, 'fcttext')
-        self.night_text = _getNodeValue(night_xml, 'fcttext')
+        self.day_icon = fields['day_icon']
+        self.night_icon = fields['night_icon']
+        self.day_text = fields['day_text']
+        self.night_text = fields['night_text']
         
         # probability of precipitation
-        self.pop = simple_xml.getElementsByTagName('pop')[0].firstChild.nodeValue
-        self.day_pop = int(_getNodeValue(day_xml, 'pop'))
-        self.night_pop = int(_getNodeValue(night_xml, 'pop'))
+        self.pop = int(fields['pop'])
+        self.day_pop = int(fields['day_pop'])
+        self.night_pop = int(fields['night_pop'])
 
         # simpleforecast elements
-        self.period = simple_xml.getElementsByTagName('period')[0].firstChild.nodeValue
-        
-        high = simple_xml.getElementsByTagName('high')
-        self.high_F = int(_getNodeValue(high[0], 'fahrenheit'))
-        
-        low = simple_xml.getElementsByTagName('low')
-        self.low_F = int(_getNodeValue(low[0], 'fahrenheit'))
-        
-        self.humidity = simple_xml.getElementsByTagName('avehumidity')[0].firstChild.nodeValue
+        self.period = int(fields['period'])
+        self.high_F = int(fields['high_F'])
+        self.low_F = int(fields['low_F'])
+        self.humidity = int(fields['humidity'])
 
         # quantity precipitation forecasted
-        qpf_allday = simple_xml.getElementsByTagName('qpf_allday')
-        self.qpf_allday_in = float(_getNodeValue(qpf_allday[0], 'in'))
-
-        qpf_day = simple_xml.getElementsByTagName('qpf_day')
-        self.qpf_day_in = float(_getNodeValue(qpf_day[0], 'in'))
-
-        qpf_night = simple_xml.getElementsByTagName('qpf_night')
-        self.qpf_night_in = float(_getNodeValue(qpf_night[0], 'in'))
+        self.qpf_allday_in = float(fields['qpf_allday_in'])
+        self.qpf_day_in = float(fields['qpf_day_in'])
+        self.qpf_night_in = float(fields['qpf_night_in'])
         
         # wind
-        minwind = simple_xml.getElementsByTagName('avewind')
-        self.minwind_mph = int(_getNodeValue(minwind[0], 'mph'))
-        self.minwind_degrees = float(_getNodeValue(minwind[0], 'degrees'))
-        self.minwind_dir = _getNodeValue(minwind[0], 'dir')
-        maxwind = simple_xml.getElementsByTagName('maxwind')
-        self.maxwind_mph = int(_getNodeValue(maxwind[0], 'mph'))
-        self.maxwind_degrees = float(_getNodeValue(maxwind[0], 'degrees'))
-        self.maxwind_dir = _getNodeValue(maxwind[0], 'dir')
+        self.minwind_mph = int(fields['minwind_mph'])
+        self.minwind_degrees = float(fields['minwind_degrees'])
+        self.minwind_dir = fields['minwind_dir']
+        self.maxwind_mph = int(fields['maxwind_mph'])
+        self.maxwind_degrees = float(fields['maxwind_degrees'])
+        self.maxwind_dir = fields['maxwind_dir']
         
     def __str__(self):
         """Creates a neatly formatted string using this object's encapsulated data.
@@ -218,4 +601,184 @@ class ForecastDay(object):
         output += '\t\t' + self.night_text + '\n'
         output += '\t\tprecip: ' + str(self.qpf_night_in) + '\"\n'
         output += '\t\tchance: ' + str(self.night_pop) + '%\n'
-        return output
\ No newline at end of file
+        return output
+
+class ForecastTable(object):
+    """Stores the ForecastDays of many locations in parallel columns.
+
+    Each ForecastDay attribute is held in its own array.array column rather
+    than in one object per day, and repeated strings (icons, descriptions,
+    wind directions) are stored once and referenced by index.  Indexing the
+    table returns a ForecastRow view of a single day in O(1).  Dates are
+    stored as the API's epoch and forecast_date is made from it on access.
+
+    Attributes:
+        locations: dict mapping each location to the indexes of its rows.
+    """
+    # (attribute, array typecode); 'S' columns hold indexes into _strings.
+    COLUMNS = (
+        ('epoch', 'l'),
+        ('day_icon', 'S'),
+        ('night_icon', 'S'),
+        ('day_text', 'S'),
+        ('night_text', 'S'),
+        ('pop', 'h'),
+        ('day_pop', 'h'),
+        ('night_pop', 'h'),
+        ('period', 'h'),
+        ('high_F', 'h'),
+        ('low_F', 'h'),
+        ('humidity', 'h'),
+        ('qpf_allday_in', 'd'),
+        ('qpf_day_in', 'd'),
+        ('qpf_night_in', 'd'),
+        ('minwind_mph', 'h'),
+        ('minwind_degrees', 'd'),
+        ('minwind_dir', 'S'),
+        ('maxwind_mph', 'h'),
+        ('maxwind_degrees', 'd'),
+        ('maxwind_dir', 'S'),
+    )
+
+    def __init__(self):
+        """Creates a new, empty instance of the ForecastTable class.
+
+        Returns:
+            A new instance of the ForecastTable class.
+        """
+        self.locations = dict()
+        self._columns = dict()
+        for name, typecode in self.COLUMNS:
+            self._columns[name] = array('I' if typecode == 'S' else typecode)
+        self._strings = list()
+        self._string_ids = dict()
+
+    def __len__(self):
+        return len(self._columns['period'])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ForecastTable index out of range')
+        return ForecastRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ForecastRow(self, index)
+
+    def append(self, location, forecast_obj):
+        """Adds a location's forecast to the table.
+
+        Args:
+            location: Key identifying the forecast (e.g. its request query).
+            forecast_obj: Forecast object whose ForecastDays to add.
+
+        Returns:
+            None.
+        """
+        rows = self.locations.setdefault(location, list())
+        for day in forecast_obj.ForecastDays:
+            rows.append(len(self))
+            for name, typecode in self.COLUMNS:
+                value = getattr(day, name)
+                if typecode == 'S':
+                    value = self._string_id(value)
+                self._columns[name].append(value)
+
+    def forecast(self, location):
+        """Gets a location's forecast as a Forecast of ForecastRow views.
+
+        Args:
+            location: Key the forecast was added under.
+
+        Returns:
+            A Forecast object whose ForecastDays are ForecastRow views.
+        """
+        forecast = Forecast.__new__(Forecast)
+        forecast.ForecastDays = [ForecastRow(self, index) for index in self.locations[location]]
+        return forecast
+
+    def column(self, name):
+        """Gets a numeric column.
+
+        Args:
+            name: ForecastDay attribute name (e.g. high_F, qpf_day_in).
+                Dates are in the epoch column, in seconds since the epoch.
+
+        Returns:
+            The column's array.array (shared, not a copy).
+        """
+        if self._TYPECODES[name] == 'S':
+            raise ValueError(name + ' is not a numeric column')
+        return self._columns[name]
+
+    def metric_column(self, name):
+        """Converts a whole column to metric in one call.
+
+        Args:
+            name: Metric attribute name (see METRIC_FIELDS, e.g. high_C).
+
+        Returns:
+            array.array of doubles.
+        """
+        attribute, converter = METRIC_FIELDS[name]
+        return converter(self.column(attribute))
+
+    def numpy_column(self, name):
+        """Gets a numeric column as a NumPy array sharing the column's memory.
+
+        Args:
+            name: ForecastDay attribute name (e.g. high_F, qpf_day_in).
+
+        Returns:
+            numpy.ndarray view of the column.  The view is invalidated by
+            further appends to the table.
+        """
+        numpy = _get_numpy()
+        if not numpy:
+            raise ImportError('numpy is required for ForecastTable.numpy_column')
+        column = self.column(name)
+        return numpy.frombuffer(column, dtype=column.typecode)
+
+    def nbytes(self):
+        """Gets the memory held by the table's columns (excluding strings)."""
+        return sum(column.itemsize * len(column) for column in self._columns.values())
+
+    def _string_id(self, value):
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def _get(self, name, index):
+        if name == 'forecast_date':
+            return datetime.fromtimestamp(self._columns['epoch'][index])
+        value = self._columns[name][index]
+        if self._TYPECODES[name] == 'S':
+            return self._strings[value]
+        return value
+
+ForecastTable._TYPECODES = dict(ForecastTable.COLUMNS)
+
+class ForecastRow(_MetricFields):
+    """A read-only view of one day in a ForecastTable.
+
+    ForecastRow has the same attributes as ForecastDay, read from the
+    table's columns on access.
+    """
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name):
+        if name not in ForecastTable._TYPECODES and name != 'forecast_date':
+            raise AttributeError(name)
+        return self._table._get(name, self._index)
+
+    def __str__(self):
+        return ForecastDay.__str__(self)
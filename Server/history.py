@@ -0,0 +1,238 @@
+"""Stores fetched forecasts so they can be compared over time.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+
+Inspiration as well as coding strategies are borrowed heavily from
+Matthew Petroff's Kindle Weather Display project.
+
+http://mpetroff.net/2012/09/kindle-weather-display/
+https://github.com/mpetroff/kindle-weather-display
+"""
+import sqlite3
+import threading
+import time
+
+import forecastdata
+
+# ForecastDay attributes stored for each day, besides forecast_date.
+_FIELDS = (
+    'day_icon', 'night_icon', 'day_text', 'night_text',
+    'pop', 'day_pop', 'night_pop', 'period', 'high_F', 'low_F', 'humidity',
+    'qpf_allday_in', 'qpf_day_in', 'qpf_night_in',
+    'minwind_mph', 'minwind_degrees', 'minwind_dir',
+    'maxwind_mph', 'maxwind_degrees', 'maxwind_dir',
+)
+
+# Text columns are declared without a type so values are stored as given:
+# ForecastDay holds 0.0 where the response had a self closing tag.
+# forecast_day is the proleptic Gregorian ordinal of forecast_date, so
+# "forecasts for date D" is an equality lookup that walks the index in
+# fetch order.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecast_day (
+    location TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    forecast_date REAL NOT NULL,
+    forecast_day INTEGER NOT NULL,
+    day_icon, night_icon, day_text, night_text,
+    pop INTEGER, day_pop INTEGER, night_pop INTEGER, period INTEGER,
+    high_F INTEGER, low_F INTEGER, humidity INTEGER,
+    qpf_allday_in REAL, qpf_day_in REAL, qpf_night_in REAL,
+    minwind_mph INTEGER, minwind_degrees REAL, minwind_dir,
+    maxwind_mph INTEGER, maxwind_degrees REAL, maxwind_dir
+);
+CREATE INDEX IF NOT EXISTS forecast_day_by_location
+    ON forecast_day (location, fetched);
+CREATE INDEX IF NOT EXISTS forecast_day_by_location_day
+    ON forecast_day (location, forecast_day, fetched);
+CREATE INDEX IF NOT EXISTS forecast_day_by_day
+    ON forecast_day (forecast_day, fetched);
+"""
+
+_COLUMNS = ('location', 'fetched', 'forecast_date', 'forecast_day') + _FIELDS
+_INSERT = 'INSERT INTO forecast_day (%s) VALUES (%s)' % (
+    ', '.join(_COLUMNS), ', '.join('?' * len(_COLUMNS)))
+_SELECT = 'SELECT %s FROM forecast_day' % ', '.join(_COLUMNS)
+
+class ForecastHistory(object):
+    """An append-only SQLite store of fetched ForecastDays.
+
+    Each day is stored with the location it was fetched for and the time it
+    was fetched, indexed for the latest forecast of a location and for the
+    forecasts of a given date across fetches.  Rows are buffered and
+    inserted in batched transactions.  An instance may be shared between
+    threads: its buffer and connection are only used under a lock.
+
+    Attributes:
+        path: Path of the SQLite database (':memory:' for an in-memory store).
+        batch_size: Number of buffered days that triggers a flush.
+    """
+    def __init__(self, path, batch_size=1000):
+        """Creates a new instance of the ForecastHistory class.
+
+        Args:
+            path: Path of the SQLite database, created if it does not exist.
+            batch_size: Number of buffered days that triggers a flush.
+
+        Returns:
+            A new instance of the ForecastHistory class.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        # Every use of the connection holds _lock (reentrant, as queries
+        # flush first), so it may be used from any thread.
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        self._pending = list()
+
+    def add(self, location, forecast_obj, fetched=None):
+        """Buffers a fetched forecast for insertion.
+
+        Args:
+            location: Key identifying the forecast (e.g. its request query).
+            forecast_obj: Forecast object to store.
+            fetched: Time the forecast was fetched (defaults to now).
+
+        Returns:
+            None.
+        """
+        if fetched is None:
+            fetched = time.time()
+        rows = list()
+        for day in forecast_obj.ForecastDays:
+            row = [location, fetched, time.mktime(day.forecast_date.timetuple()),
+                   day.forecast_date.toordinal()]
+            row.extend(getattr(day, name) for name in _FIELDS)
+            rows.append(row)
+        with self._lock:
+            self._pending.extend(rows)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def add_many(self, forecasts):
+        """Inserts many fetched forecasts in batched transactions.
+
+        Args:
+            forecasts: Iterable of (location, Forecast, fetched) tuples.
+
+        Returns:
+            None.
+        """
+        for location, forecast_obj, fetched in forecasts:
+            self.add(location, forecast_obj, fetched)
+        self.flush()
+
+    def flush(self):
+        """Inserts every buffered day in a single transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            with self._connection:
+                self._connection.executemany(_INSERT, self._pending)
+            self._pending = list()
+
+    def latest(self, location):
+        """Gets the most recently fetched forecast for a location.
+
+        Args:
+            location: Key the forecast was stored under.
+
+        Returns:
+            (fetched, Forecast) tuple, or None if nothing is stored for the
+            location.
+        """
+        with self._lock:
+            self.flush()
+            rows = self._connection.execute(
+                _SELECT + ' WHERE location = ? AND fetched = '
+                '(SELECT MAX(fetched) FROM forecast_day WHERE location = ?) ORDER BY period',
+                (location, location)).fetchall()
+        if not rows:
+            return None
+        forecast = forecastdata.Forecast.__new__(forecastdata.Forecast)
+        forecast.ForecastDays = [_forecastday(row) for row in rows]
+        return rows[0][1], forecast
+
+    def for_date(self, forecast_date, location=None, last=10):
+        """Gets the forecasts made for a date over the most recent fetches.
+
+        Args:
+            forecast_date: date (or datetime) the forecasts are for.
+            location: Only return forecasts stored under this key (optional).
+            last: Maximum number of fetches to return.  Without a location,
+                every forecast made at each of the last distinct fetch times
+                is returned, so locations fetched together are all included.
+
+        Returns:
+            list of (location, fetched, ForecastDay) tuples, most recently
+            fetched first.
+        """
+        day = forecast_date.toordinal()
+        if location is not None:
+            # one day per fetch, so the last rows are the last fetches
+            query = _SELECT + ' WHERE forecast_day = ? AND location = ? ORDER BY fetched DESC LIMIT ?'
+            args = (day, location, last)
+        else:
+            query = (_SELECT + ' WHERE forecast_day = ? AND fetched IN '
+                     '(SELECT DISTINCT fetched FROM forecast_day WHERE forecast_day = ? '
+                     'ORDER BY fetched DESC LIMIT ?) ORDER BY fetched DESC, location')
+            args = (day, day, last)
+        with self._lock:
+            self.flush()
+            rows = self._connection.execute(query, args).fetchall()
+        return [(row[0], row[1], _forecastday(row)) for row in rows]
+
+    def compact(self, retention, now=None, vacuum=True):
+        """Deletes forecasts fetched longer ago than the retention period.
+
+        Args:
+            retention: Seconds to keep forecasts for.
+            now: Current time (defaults to now).
+            vacuum: Whether to reclaim the freed space in the database file.
+
+        Returns:
+            Number of days deleted.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self.flush()
+            with self._connection:
+                deleted = self._connection.execute(
+                    'DELETE FROM forecast_day WHERE fetched < ?', (now - retention,)).rowcount
+            if vacuum and deleted:
+                self._connection.execute('VACUUM')
+        return deleted
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._connection.execute('SELECT COUNT(*) FROM forecast_day').fetchone()[0]
+
+    def close(self):
+        """Flushes buffered days and closes the database."""
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+def _forecastday(row):
+    """Builds a ForecastDay from a forecast_day row."""
+    fields = dict(zip(_COLUMNS, row))
+    fields['epoch'] = fields['forecast_date']
+    return forecastdata.ForecastDay.from_fields(fields)
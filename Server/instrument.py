@@ -0,0 +1,415 @@
+"""Records where time goes in the fetch, parse and render stages.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+
+Inspiration as well as coding strategies are borrowed heavily from
+Matthew Petroff's Kindle Weather Display project.
+
+http://mpetroff.net/2012/09/kindle-weather-display/
+https://github.com/mpetroff/kindle-weather-display
+"""
+import json
+import math
+import sys
+import threading
+
+import atomicfile
+
+try:
+    from time import perf_counter as _clock
+except ImportError:
+    from time import time as _clock
+
+# Stages recorded by the other modules:
+#   fetch      apirequest.raw_request, including the response cache
+#   radar      apirequest.radar_download
+#   url        apirequest._get_url
+#   request    sending a request and waiting for the response headers
+#   read       reading a response body (bytes are counted as received)
+#   parse      forecastdata parsing a response into ForecastDays
+#   fields     reading and converting one ForecastDay's field values (the
+#              stream and json parsers read them during parse)
+#   text       svgmanip cleaning and wrapping one ForecastDay's texts
+#   render     svgmanip populating the template
+#   write      svgmanip writing an SVG or PNG file (not linking one from a
+#              RenderCache)
+#   rasterize  raster rendering SVG text to pixels
+#   encode     raster encoding a PNG
+
+# Quantiles reported for each stage.
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Upper bounds (le) in seconds of the buckets exported to Prometheus.
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                      0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram(object):
+    """A log-bucketed histogram of durations.
+
+    Bucket bounds grow by GROWTH from MINIMUM seconds, so quantiles are
+    estimated to within a few percent whatever the scale, in a fixed
+    amount of memory.
+
+    Attributes:
+        count: Number of recorded values.
+        total: Sum of the recorded values.
+        minimum: Smallest recorded value (None before any).
+        maximum: Largest recorded value (None before any).
+    """
+    MINIMUM = 1e-7
+    GROWTH = 1.05
+    _LOG_GROWTH = math.log(GROWTH)
+
+    def __init__(self):
+        """Creates a new instance of the Histogram class.
+
+        Returns:
+            A new instance of the Histogram class.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        # bucket index -> count; bucket i holds values up to MINIMUM * GROWTH**i
+        self._buckets = dict()
+
+    def add(self, value):
+        """Records a value.
+
+        Args:
+            value: Duration in seconds.
+
+        Returns:
+            None.
+        """
+        if value > self.MINIMUM:
+            bucket = int(math.ceil(math.log(value / self.MINIMUM) / self._LOG_GROWTH))
+        else:
+            bucket = 0
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def quantile(self, q):
+        """Estimates a quantile of the recorded values.
+
+        Args:
+            q: Quantile between 0 and 1 (e.g. 0.95).
+
+        Returns:
+            The estimated value, or None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                # geometric middle of the bucket, kept within the observed range
+                value = self.MINIMUM * self.GROWTH ** (bucket - 0.5)
+                return min(max(value, self.minimum), self.maximum)
+        return self.maximum
+
+    def cumulative(self, bounds):
+        """Counts the recorded values up to each of several bounds.
+
+        A value is counted under a bound if its bucket ends at or below the
+        bound, so values within one bucket (GROWTH) below a bound may be
+        counted under the next bound.
+
+        Args:
+            bounds: Increasing upper bounds in seconds.
+
+        Returns:
+            list of the number of values up to each bound.
+        """
+        counts = list()
+        buckets = sorted(self._buckets.items())
+        seen = 0
+        position = 0
+        for bound in bounds:
+            while (position < len(buckets)
+                   and self.MINIMUM * self.GROWTH ** buckets[position][0] <= bound * (1 + 1e-9)):
+                seen += buckets[position][1]
+                position += 1
+            counts.append(seen)
+        return counts
+
+class _StageTotals(object):
+    """Durations, bytes and allocations recorded for one stage."""
+    __slots__ = ('seconds', 'bytes', 'blocks')
+
+    def __init__(self):
+        self.seconds = Histogram()
+        self.bytes = 0
+        self.blocks = 0
+
+class Recorder(object):
+    """Aggregates stage measurements, overall and for each location.
+
+    Attributes:
+        stages: dict mapping stage names to their totals: a Histogram of
+            durations ('seconds'), bytes transferred ('bytes') and the net
+            number of memory blocks allocated ('blocks').
+        locations: dict mapping each location to a dict of stage names to
+            [count, seconds, bytes, blocks] totals.
+    """
+    def __init__(self):
+        """Creates a new instance of the Recorder class.
+
+        Returns:
+            A new instance of the Recorder class.
+        """
+        self.stages = dict()
+        self.locations = dict()
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, location=None, nbytes=0, blocks=0):
+        """Records one measurement of a stage.
+
+        Args:
+            stage: Stage name (e.g. 'parse').
+            seconds: Wall time the stage took.
+            location: Request query the stage ran for (optional).
+            nbytes: Bytes transferred by the stage.
+            blocks: Net memory blocks allocated by the stage.
+
+        Returns:
+            None.
+        """
+        with self._lock:
+            totals = self.stages.get(stage)
+            if totals is None:
+                totals = self.stages[stage] = _StageTotals()
+            totals.seconds.add(seconds)
+            totals.bytes += nbytes
+            totals.blocks += blocks
+            if location is not None:
+                location_stages = self.locations.get(location)
+                if location_stages is None:
+                    location_stages = self.locations[location] = dict()
+                location_totals = location_stages.get(stage)
+                if location_totals is None:
+                    location_totals = location_stages[stage] = [0, 0.0, 0, 0]
+                location_totals[0] += 1
+                location_totals[1] += seconds
+                location_totals[2] += nbytes
+                location_totals[3] += blocks
+
+    def snapshot(self):
+        """Summarizes what has been recorded.
+
+        Returns:
+            dict with a 'stages' dict giving each stage's count, sum, min,
+            max, quantiles ('p50', 'p95', 'p99'), cumulative 'buckets'
+            counts (one for each of PROMETHEUS_BUCKETS), bytes and blocks,
+            and a 'locations' dict giving each location's totals per stage.
+        """
+        with self._lock:
+            stages = dict()
+            for name, totals in self.stages.items():
+                histogram = totals.seconds
+                summary = {'count': histogram.count, 'sum': histogram.total,
+                           'min': histogram.minimum, 'max': histogram.maximum,
+                           'bytes': totals.bytes, 'blocks': totals.blocks}
+                for q in QUANTILES:
+                    summary['p%g' % (q * 100)] = histogram.quantile(q)
+                summary['buckets'] = histogram.cumulative(PROMETHEUS_BUCKETS)
+                stages[name] = summary
+            locations = dict()
+            for location, location_stages in self.locations.items():
+                locations[location] = dict(
+                    (name, {'count': count, 'seconds': seconds, 'bytes': nbytes, 'blocks': blocks})
+                    for name, (count, seconds, nbytes, blocks) in location_stages.items())
+        return {'stages': stages, 'locations': locations}
+
+    def prometheus(self, prefix='pyweather'):
+        """Formats the stage totals in the Prometheus text exposition format.
+
+        Durations are exported as a histogram with the PROMETHEUS_BUCKETS
+        bounds, so quantiles can be computed over several servers with
+        histogram_quantile; per-location totals are left out to keep the
+        number of series bounded.
+
+        Args:
+            prefix: Prefix of the metric names.
+
+        Returns:
+            The metrics text.
+        """
+        stages = sorted(self.snapshot()['stages'].items())
+        lines = ['# HELP %s_stage_seconds Wall time of each stage.' % prefix,
+                 '# TYPE %s_stage_seconds histogram' % prefix]
+        for name, summary in stages:
+            for bound, count in zip(PROMETHEUS_BUCKETS, summary['buckets']):
+                lines.append('%s_stage_seconds_bucket{stage="%s",le="%g"} %d' % (prefix, name, bound, count))
+            lines.append('%s_stage_seconds_bucket{stage="%s",le="+Inf"} %d' % (prefix, name, summary['count']))
+            lines.append('%s_stage_seconds_sum{stage="%s"} %r' % (prefix, name, summary['sum']))
+            lines.append('%s_stage_seconds_count{stage="%s"} %d' % (prefix, name, summary['count']))
+        lines += ['# HELP %s_stage_bytes_total Bytes transferred by each stage.' % prefix,
+                  '# TYPE %s_stage_bytes_total counter' % prefix]
+        lines += ['%s_stage_bytes_total{stage="%s"} %d' % (prefix, name, summary['bytes'])
+                  for name, summary in stages if summary['bytes']]
+        # net allocations can be negative, so they are a gauge
+        lines += ['# HELP %s_stage_allocated_blocks Net memory blocks allocated by each stage.' % prefix,
+                  '# TYPE %s_stage_allocated_blocks gauge' % prefix]
+        lines += ['%s_stage_allocated_blocks{stage="%s"} %d' % (prefix, name, summary['blocks'])
+                  for name, summary in stages]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix='pyweather'):
+        """Writes the metrics for the node_exporter textfile collector.
+
+        Args:
+            path: Path of the .prom file to write (replaced atomically).
+            prefix: Prefix of the metric names.
+
+        Returns:
+            None.
+        """
+        atomicfile.write(path, self.prometheus(prefix))
+
+    def write_json(self, path):
+        """Writes the snapshot as JSON.
+
+        Args:
+            path: Path of the JSON file to write (replaced atomically).
+
+        Returns:
+            None.
+        """
+        atomicfile.write(path, json.dumps(self.snapshot(), indent=2, sort_keys=True))
+
+    def write(self, path):
+        """Writes a JSON snapshot if path ends in .json, else Prometheus text."""
+        if path.endswith('.json'):
+            self.write_json(path)
+        else:
+            self.write_prometheus(path)
+
+class _Stage(object):
+    """Measures one run of a stage; returned by stage while recording."""
+    __slots__ = ('_recorder', '_name', '_location', '_outer', '_start', '_blocks', 'nbytes')
+
+    def __init__(self, recorder, name, location):
+        self._recorder = recorder
+        self._name = name
+        self._location = location
+        self.nbytes = 0
+
+    def __enter__(self):
+        self._outer = getattr(_current, 'location', None)
+        if self._location is None:
+            self._location = self._outer
+        else:
+            _current.location = self._location
+        self._blocks = sys.getallocatedblocks()
+        self._start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = _clock() - self._start
+        blocks = sys.getallocatedblocks() - self._blocks
+        _current.location = self._outer
+        self._recorder.record(self._name, seconds, self._location, self.nbytes, blocks)
+        return False
+
+    def add_bytes(self, nbytes):
+        """Counts bytes transferred by the stage."""
+        self.nbytes += nbytes
+
+class _NullStage(object):
+    """Stands in for _Stage while recording is off."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+# The Recorder measurements go to, or None when recording is off (the default).
+_recorder = None
+
+# The location stages in the current thread are running for.
+_current = threading.local()
+
+def stage(name, location=None):
+    """Measures a stage, for use in a with statement.
+
+    While recording is off this returns a shared object that does nothing,
+    so stages can stay in production code.
+
+        with instrument.stage('read') as measured:
+            body = response.read()
+            measured.add_bytes(len(body))
+
+    Args:
+        name: Stage name.
+        location: Request query the stage runs for.  Stages nested inside
+            it are recorded for the same location.
+
+    Returns:
+        A context manager with an add_bytes(nbytes) method.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name, location)
+
+def get_recorder():
+    """Gets the Recorder measurements go to.
+
+    Returns:
+        The Recorder, or None if recording is off.
+    """
+    return _recorder
+
+def set_recorder(recorder):
+    """Sets the Recorder measurements go to.
+
+    Args:
+        recorder: Recorder to use, or None to turn recording off.
+
+    Returns:
+        None.
+    """
+    global _recorder
+    _recorder = recorder
+
+def enable():
+    """Turns recording on with a new Recorder, unless it is already on.
+
+    Returns:
+        The Recorder in use.
+    """
+    if _recorder is None:
+        set_recorder(Recorder())
+    return _recorder
+
+def disable():
+    """Turns recording off."""
+    set_recorder(None)
@@ -0,0 +1,511 @@
+"""Renders populated forecast SVGs to grayscale PNGs for e-ink displays.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+
+Inspiration as well as coding strategies are borrowed heavily from
+Matthew Petroff's Kindle Weather Display project.
+
+http://mpetroff.net/2012/09/kindle-weather-display/
+https://github.com/mpetroff/kindle-weather-display
+"""
+import codecs
+import hashlib
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+import atomicfile
+import instrument
+import svgmanip
+
+# cairosvg and NumPy, imported on first use as they take longer to import
+# than the rest of PyWeather: None until then, False if not installed.
+_cairosvg = None
+_numpy = None
+
+def _get_cairosvg():
+    """Gets the cairosvg package, importing it on first use.
+
+    Returns:
+        The cairosvg package, or False if cairosvg is not installed.
+    """
+    global _cairosvg
+    if _cairosvg is None:
+        try:
+            import cairosvg.parser
+            import cairosvg.surface
+        except ImportError:
+            cairosvg = False
+        _cairosvg = cairosvg
+    return _cairosvg
+
+def _get_numpy():
+    """Gets the numpy module, importing it on first use.
+
+    Returns:
+        The numpy module, or False if NumPy is not installed.
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+_SVG_NS = '{http://www.w3.org/2000/svg}'
+_XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+# Offsets of the blue, green, red and alpha bytes of a cairo ARGB32 pixel,
+# which is stored as a native-endian 32-bit integer.
+if sys.byteorder == 'little':
+    _BLUE, _GREEN, _RED, _ALPHA = 0, 1, 2, 3
+else:
+    _BLUE, _GREEN, _RED, _ALPHA = 3, 2, 1, 0
+
+# Matches the template's icon placeholders, e.g. <use xlink:href="#P1I1" .../>
+_ICON_USE = re.compile(r'<use\b[^>]*?xlink:href="#(P\d+I[12])"[^>]*/>')
+_ICON_SLOT = re.compile(r'#(P\d+I[12])$')
+_STYLESHEET = re.compile(r'<\?xml-stylesheet\b[^>]*?href="([^"]+)"[^>]*\?>\s*')
+_SVG_OPEN = re.compile(r'<svg\b[^>]*>')
+_DEFS = re.compile(r'<defs\b.*?</defs>', re.DOTALL)
+
+# Lookup tables quantizing 8-bit gray to the high or low nibble of a byte.
+_HIGH_NIBBLE = bytes(bytearray(value & 0xF0 for value in range(256)))
+_LOW_NIBBLE = bytes(bytearray(value >> 4 for value in range(256)))
+
+class GrayImage(namedtuple('GrayImage', 'width height pixels')):
+    """An 8-bit grayscale image.
+
+    Attributes:
+        width: Width in pixels.
+        height: Height in pixels.
+        pixels: bytes of width * height gray levels, row by row (0 is black).
+    """
+    __slots__ = ()
+
+    def crop(self, rect):
+        """Gets part of the image.
+
+        Args:
+            rect: (x, y, width, height) of the part, in pixels.
+
+        Returns:
+            A GrayImage of the part.
+        """
+        x, y, width, height = rect
+        rows = [self.pixels[(y + row) * self.width + x:(y + row) * self.width + x + width]
+                for row in range(height)]
+        return GrayImage(width, height, b''.join(rows))
+
+def _gray(bgra):
+    """Converts cairo ARGB32 pixels to 8-bit gray (BT.601 luma)."""
+    numpy = _get_numpy()
+    if numpy:
+        pixels = numpy.frombuffer(bgra, numpy.uint8).reshape(-1, 4).astype(numpy.uint16)
+        luma = pixels[:, _RED] * 77 + pixels[:, _GREEN] * 150 + pixels[:, _BLUE] * 29
+        return (luma >> 8).astype(numpy.uint8).tobytes()
+    # Without NumPy, every pixel is given a 16-bit lane of one big integer;
+    # the weights add up to 256, so the sums never carry into the next lane
+    # and the gray level is the high byte of each lane.
+    count = len(bgra) // 4
+    total = 0
+    for offset, weight in ((_RED, 77), (_GREEN, 150), (_BLUE, 29)):
+        lanes = bytearray(2 * count)
+        lanes[1::2] = bgra[offset::4]
+        total += int.from_bytes(bytes(lanes), 'big') * weight
+    return total.to_bytes(2 * count, 'big')[0::2]
+
+def rasterize(svg, width=None, height=None, background='white'):
+    """Renders SVG text in-process with cairosvg.
+
+    Args:
+        svg: The SVG text.  External stylesheets are not loaded (see
+            RasterTemplate, which inlines the template's).
+        width: Output width in pixels (defaults to the SVG's).
+        height: Output height in pixels (defaults to the SVG's).
+        background: Background color, or None for a transparent background.
+
+    Returns:
+        (width, height, pixels) where pixels holds the cairo ARGB32 data,
+        four bytes per pixel with premultiplied alpha.
+    """
+    cairosvg = _get_cairosvg()
+    if not cairosvg:
+        raise ImportError('rasterizing SVG requires cairosvg (pip install cairosvg)')
+    with instrument.stage('rasterize'):
+        tree = cairosvg.parser.Tree(bytestring=svg.encode('utf-8'))
+        surface = cairosvg.surface.PNGSurface(tree, None, 96, output_width=width, output_height=height,
+                                              background_color=background)
+        image = surface.cairo
+        image.flush()
+        data = bytes(image.get_data())
+        stride = image.get_stride()
+        width, height = image.get_width(), image.get_height()
+        if stride != width * 4:
+            data = b''.join(data[row * stride:row * stride + width * 4] for row in range(height))
+        return width, height, data
+
+def encode_png(image, bit_depth=8, offset=None, compression=6):
+    """Encodes a grayscale PNG.
+
+    Args:
+        image: GrayImage to encode.
+        bit_depth: 8 for 256 gray levels, or 4 for the 16 levels of most
+            e-ink displays.
+        offset: (x, y) position of the image on the display, recorded in an
+            oFFs chunk (optional).
+        compression: zlib compression level.
+
+    Returns:
+        The PNG file contents.
+    """
+    with instrument.stage('encode') as measured:
+        width, height, pixels = image
+        if bit_depth == 8:
+            stride = width
+        elif bit_depth == 4:
+            if width % 2:
+                # pad each row to a whole byte
+                pixels = b''.join(pixels[row * width:(row + 1) * width] + b'\0' for row in range(height))
+            high = pixels[0::2].translate(_HIGH_NIBBLE)
+            low = pixels[1::2].translate(_LOW_NIBBLE)
+            # the nibbles do not overlap, so one big OR packs every pair
+            pixels = (int.from_bytes(high, 'big') | int.from_bytes(low, 'big')).to_bytes(len(high), 'big')
+            stride = (width + 1) // 2
+        else:
+            raise ValueError('Unsupported bit depth: %r' % (bit_depth,))
+        # filter type 0 (none) before each row
+        raw = b''.join(b'\0' + pixels[row * stride:(row + 1) * stride] for row in range(height))
+        chunks = [_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, 0, 0, 0, 0))]
+        if offset is not None:
+            chunks.append(_png_chunk(b'oFFs', struct.pack('>iiB', offset[0], offset[1], 0)))
+        chunks.append(_png_chunk(b'IDAT', zlib.compress(raw, compression)))
+        chunks.append(_png_chunk(b'IEND', b''))
+        png = b'\x89PNG\r\n\x1a\n' + b''.join(chunks)
+        measured.add_bytes(len(png))
+        return png
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+def changed_rect(old, new, align=8):
+    """Finds the rectangle of pixels that differ between two images.
+
+    Args:
+        old: Previous GrayImage (None if there is none).
+        new: Current GrayImage.
+        align: The rectangle's left edge and width are rounded out to
+            multiples of this many pixels, as partial e-ink updates need.
+
+    Returns:
+        (x, y, width, height) of the changed pixels, the whole image if the
+        sizes differ or there is no previous image, or None if nothing
+        changed.
+    """
+    width, height = new.width, new.height
+    if old is None or (old.width, old.height) != (width, height):
+        return (0, 0, width, height)
+    if old.pixels == new.pixels:
+        return None
+    before, after = old.pixels, new.pixels
+    rows = [row for row in range(height)
+            if before[row * width:(row + 1) * width] != after[row * width:(row + 1) * width]]
+    left, right = width, 0
+    for row in rows:
+        a = before[row * width:(row + 1) * width]
+        b = after[row * width:(row + 1) * width]
+        # binary search for the first and last differing columns; each
+        # step is a slice comparison
+        low, high = 0, left
+        while low < high:
+            middle = (low + high) // 2
+            if a[:middle + 1] == b[:middle + 1]:
+                low = middle + 1
+            else:
+                high = middle
+        left = min(left, low)
+        low, high = right, width
+        while low < high:
+            middle = (low + high) // 2
+            if a[middle:] != b[middle:]:
+                low = middle + 1
+            else:
+                high = middle
+        right = max(right, low)
+    left -= left % align
+    right = min(width, right + (-right) % align)
+    return (left, rows[0], right - left, rows[-1] + 1 - rows[0])
+
+class _Glyph(object):
+    """A pre-rasterized icon: its position and premultiplied gray and alpha."""
+    __slots__ = ('x', 'y', 'width', 'height', 'gray', 'alpha')
+
+    def __init__(self, x, y, width, height, gray, alpha):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.gray = gray
+        self.alpha = alpha
+
+    def composite(self, pixels, page_width):
+        """Draws the glyph over an 8-bit page (a bytearray), in place."""
+        numpy = _get_numpy()
+        if numpy:
+            page = numpy.frombuffer(pixels, numpy.uint8).reshape(-1, page_width)
+            region = page[self.y:self.y + self.height, self.x:self.x + self.width]
+            gray = numpy.frombuffer(self.gray, numpy.uint8).reshape(self.height, self.width)
+            alpha = numpy.frombuffer(self.alpha, numpy.uint8).reshape(self.height, self.width)
+            region[:] = gray + (region.astype(numpy.uint16) * (255 - alpha) + 127) // 255
+            return
+        for row in range(self.height):
+            start = (self.y + row) * page_width + self.x
+            offset = row * self.width
+            for column in range(self.width):
+                alpha = self.alpha[offset + column]
+                if alpha:
+                    pixels[start + column] = self.gray[offset + column] \
+                        + (pixels[start + column] * (255 - alpha) + 127) // 255
+
+class RasterTemplate(object):
+    """The SVG template prepared for rendering to grayscale rasters.
+
+    The template's stylesheet is inlined so it is read once.  The icon
+    placeholders (P<n>I1, P<n>I2) are taken out of the page: each icon is
+    rasterized once per placeholder position, cropped to the pixels it
+    covers, cached and composited over the rendered page.  The icons'
+    paths and drop shadow filter are therefore not rendered again for
+    every forecast.
+
+    Attributes:
+        width: Width of the rendered images in pixels.
+        height: Height of the rendered images in pixels.
+        page: CompiledTemplate of the page without its icons.
+        icons: dict mapping icon slots (P1I1, ...) to SVG documents holding
+            only that icon, with {icon} where its name goes.
+        mtime: modification time of the template file when it was loaded.
+    """
+    def __init__(self, svg, width=None, height=None, base_path='.', mtime=None, rasterizer=None):
+        """Creates a new instance of the RasterTemplate class.
+
+        Args:
+            svg: The SVG template text.
+            width: Width of the rendered images (defaults to the template's).
+            height: Height of the rendered images (defaults to the template's).
+            base_path: Directory the template's stylesheet is relative to.
+            mtime: modification time of the template file (optional).
+            rasterizer: Function rendering SVG text to pixels, with the
+                arguments and result of rasterize (defaults to rasterize).
+
+        Returns:
+            A new instance of the RasterTemplate class.
+        """
+        self.mtime = mtime
+        self._rasterize = rasterizer or rasterize
+        root = ElementTree.fromstring(svg.encode('utf-8'))
+        self.width = width or int(float(root.get('width')))
+        self.height = height or int(float(root.get('height')))
+
+        style = css = ''
+        stylesheet = _STYLESHEET.search(svg)
+        if stylesheet is not None:
+            css_path = os.path.join(base_path, stylesheet.group(1))
+            css = codecs.open(css_path, 'r', encoding='utf-8-sig').read()
+            style = '<style type="text/css"><![CDATA[%s]]></style>' % css
+            svg = svg[:stylesheet.start()] + svg[stylesheet.end():]
+        svg_open = _SVG_OPEN.search(svg)
+        svg = svg[:svg_open.end()] + style + svg[svg_open.end():]
+
+        defs = _DEFS.search(svg)
+        header = svg_open.group(0) + style + (defs.group(0) if defs is not None else '')
+        self.icons = dict()
+        for slot, transforms, use in _icon_uses(root, []):
+            attributes = ' '.join('%s=%s' % ('xlink:href' if name == _XLINK_HREF else name,
+                                             quoteattr('#{icon}' if name == _XLINK_HREF else value))
+                                  for name, value in sorted(use.attrib.items()))
+            self.icons[slot] = (header + ''.join('<g transform=%s>' % quoteattr(transform)
+                                                 for transform in transforms)
+                                + '<use %s/>' % attributes + '</g>' * len(transforms) + '</svg>')
+        page = _ICON_USE.sub('', svg)
+        if len(_ICON_USE.findall(svg)) != len(self.icons):
+            raise ValueError('Icon placeholders must each appear once, as <use xlink:href="#P<n>I<1|2>"/>')
+        self.page = svgmanip.CompiledTemplate(page, mtime, css)
+        # (slot, icon name) -> _Glyph, or None for icons that draw nothing
+        self._glyphs = dict()
+
+    def render(self, values):
+        """Renders the template populated with values to a grayscale image.
+
+        Args:
+            values: dict mapping slot names to the text to insert (see
+                svgmanip.forecastday_values).
+
+        Returns:
+            A GrayImage of width x height pixels.
+        """
+        width, height, bgra = self._rasterize(self.page.render(values), self.width, self.height)
+        pixels = bytearray(_gray(bgra))
+        for slot in sorted(self.icons):
+            if slot in values:
+                glyph = self._glyph(slot, values[slot])
+                if glyph is not None:
+                    glyph.composite(pixels, width)
+        return GrayImage(width, height, bytes(pixels))
+
+    def _glyph(self, slot, icon):
+        key = (slot, icon)
+        try:
+            return self._glyphs[key]
+        except KeyError:
+            pass
+        width, height, bgra = self._rasterize(self.icons[slot].replace('{icon}', icon),
+                                              self.width, self.height, background=None)
+        alpha = bgra[_ALPHA::4]
+        glyph = None
+        rows = [row for row in range(height) if alpha[row * width:(row + 1) * width].strip(b'\0')]
+        if rows:
+            top, bottom = rows[0], rows[-1] + 1
+            left, right = width, 0
+            for row in rows:
+                line = alpha[row * width:(row + 1) * width]
+                left = min(left, width - len(line.lstrip(b'\0')))
+                right = max(right, len(line.rstrip(b'\0')))
+            rect = (left, top, right - left, bottom - top)
+            glyph = _Glyph(left, top, right - left, bottom - top,
+                           GrayImage(width, height, _gray(bgra)).crop(rect).pixels,
+                           GrayImage(width, height, alpha).crop(rect).pixels)
+        self._glyphs[key] = glyph
+        return glyph
+
+def _icon_uses(element, transforms):
+    """Yields (slot, ancestor transforms, use element) for each icon use."""
+    for child in element:
+        href = child.get(_XLINK_HREF, '')
+        match = _ICON_SLOT.match(href)
+        if child.tag == _SVG_NS + 'use' and match is not None:
+            yield match.group(1), transforms, child
+            continue
+        transform = child.get('transform')
+        for use in _icon_uses(child, transforms + [transform] if transform else transforms):
+            yield use
+
+# (version, RasterTemplate) keyed by (path, width, height), where version is
+# the digest of the compiled template and its stylesheet, so the raster
+# template is prepared again when either changes.
+_raster_templates = {}
+
+def load_raster_template(template_path=svgmanip.TEMPLATE_PATH, width=None, height=None):
+    """Gets a RasterTemplate, preparing it if it is new or it or its
+    stylesheet has changed.
+
+    Args:
+        template_path: Path to the SVG template.
+        width: Width of the rendered images (defaults to the template's).
+        height: Height of the rendered images (defaults to the template's).
+
+    Returns:
+        A RasterTemplate for the template file.
+    """
+    source = svgmanip.load_template(template_path)
+    key = (template_path, width, height)
+    cached = _raster_templates.get(key)
+    if cached is None or cached[0] != source.digest:
+        svg = codecs.open(template_path, 'r', encoding='utf-8').read()
+        cached = (source.digest, RasterTemplate(svg, width, height, os.path.dirname(os.path.abspath(template_path)),
+                                                source.mtime))
+        _raster_templates[key] = cached
+    return cached[1]
+
+def render_forecast_image(forecast_obj, template_path=svgmanip.TEMPLATE_PATH, width=None, height=None):
+    """Renders a Forecast to a grayscale image.
+
+    Args:
+        forecast_obj: Forecast object containing data to populate.
+        template_path: Path to the SVG template.
+        width: Width of the image (defaults to the template's).
+        height: Height of the image (defaults to the template's).
+
+    Returns:
+        A GrayImage.
+    """
+    template = load_raster_template(template_path, width, height)
+    values = dict()
+    for day in forecast_obj.ForecastDays:
+        values.update(svgmanip.forecastday_values(day, template.page.text_boxes))
+    return template.render(values)
+
+# Last image written to each output path: the GrayImage when a diff is
+# written, otherwise a digest of its pixels.  Least recently written first,
+# and bounded as each GrayImage holds a whole display's pixels; an evicted
+# path is rewritten in full.
+_written = OrderedDict()
+_written_lock = threading.Lock()
+_WRITTEN_ENTRIES = 32
+
+def write_forecast_png(forecast_obj, output_path='forecast.png', template_path=svgmanip.TEMPLATE_PATH,
+                       width=None, height=None, bit_depth=8, diff_path=None, align=8):
+    """Renders a Forecast to a grayscale PNG at the display's resolution.
+
+    The PNG is not rewritten when the image has not changed since it was
+    last written by this process.  If diff_path is given, the rectangle of
+    pixels that changed is also written there, with its position on the
+    display in the PNG's oFFs chunk, for a partial e-ink refresh.
+
+    Args:
+        forecast_obj: Forecast object containing data to populate.
+        output_path: Path of the PNG file to write.
+        template_path: Path to the SVG template.
+        width: Width of the display (defaults to the template's).
+        height: Height of the display (defaults to the template's).
+        bit_depth: 8 for 256 gray levels, or 4 for 16.
+        diff_path: Path to write the changed rectangle to (optional).
+        align: Multiple of pixels the changed rectangle's left edge and
+            width are rounded out to.
+
+    Returns:
+        (x, y, width, height) of the changed pixels (the whole image when
+        there is no previous one), or None if nothing was written.
+    """
+    image = render_forecast_image(forecast_obj, template_path, width, height)
+    exists = os.path.exists(output_path)
+    with _written_lock:
+        previous = _written.pop(output_path, None) if exists else None
+    if diff_path is None:
+        written = hashlib.sha1(image.pixels).digest()
+        rect = None if previous == written else (0, 0, image.width, image.height)
+    else:
+        written = image
+        rect = changed_rect(previous if isinstance(previous, GrayImage) else None, image, align)
+    if rect is not None:
+        with instrument.stage('write') as measured:
+            measured.add_bytes(atomicfile.write(output_path, encode_png(image, bit_depth), suffix='.png'))
+        if diff_path is not None:
+            with instrument.stage('write') as measured:
+                measured.add_bytes(atomicfile.write(diff_path, encode_png(image.crop(rect), bit_depth, rect[:2]),
+                                                    suffix='.png'))
+    with _written_lock:
+        _written[output_path] = written
+        while len(_written) > _WRITTEN_ENTRIES:
+            _written.popitem(last=False)
+    return rect
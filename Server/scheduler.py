@@ -0,0 +1,452 @@
+"""Keeps forecast SVGs and radar images for many locations up to date.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+
+Inspiration as well as coding strategies are borrowed heavily from
+Matthew Petroff's Kindle Weather Display project.
+
+http://mpetroff.net/2012/09/kindle-weather-display/
+https://github.com/mpetroff/kindle-weather-display
+
+Usage:
+    python scheduler.py locations.json [--requests-per-minute N] [--history DATABASE]
+                        [--coalesce PRECISION] [--metrics FILE]
+    python scheduler.py --test [--duration SECONDS] [--metrics FILE]
+
+locations.json holds a list of locations, e.g.:
+    [{"query": "38.667426,-90.396479", "interval": 600,
+      "forecast": "forecast.svg", "radar": "radar.gif",
+      "radar_params": "?width=800&height=400&newmaps=1&num=15"}]
+
+"png" (and "png_diff") also render the forecast to a grayscale PNG.
+"""
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+
+import apirequest
+import forecastdata
+import instrument
+import svgmanip
+
+logger = logging.getLogger('pyweather.scheduler')
+
+class Location(object):
+    """A location to keep up to date and where to write its outputs.
+
+    Attributes:
+        query: Geographical location for which to request (see
+            forecastdata.Forecast for acceptable forms).
+        interval: Seconds between refreshes.
+        forecast_path: SVG file to write the forecast to, or None.
+        radar_path: File to write the radar image to, or None.
+        radar_params: Additional parameters for the radar request.
+        png_path: Grayscale PNG file to render the forecast to, or None.
+            Only written when forecast_path is set.
+        png_diff_path: File to write the changed part of the PNG to for a
+            partial e-ink refresh, or None.
+    """
+    def __init__(self, query, interval=600, forecast_path=None, radar_path=None, radar_params='',
+                 png_path=None, png_diff_path=None):
+        self.query = query
+        self.interval = interval
+        self.forecast_path = forecast_path
+        self.radar_path = radar_path
+        self.radar_params = radar_params
+        self.png_path = png_path
+        self.png_diff_path = png_diff_path
+
+    @property
+    def cost(self):
+        """Number of API requests one refresh makes."""
+        return (self.forecast_path is not None) + (self.radar_path is not None)
+
+    def __repr__(self):
+        return 'Location(%r)' % self.query
+
+def load_locations(path):
+    """Reads a list of locations from a JSON file.
+
+    Args:
+        path: Path to a JSON file holding a list of objects with a query and
+            optional interval, forecast, radar, radar_params, png and
+            png_diff keys.
+
+    Returns:
+        list of Location objects.
+    """
+    with open(path) as locations_file:
+        entries = json.load(locations_file)
+    return [Location(entry['query'], entry.get('interval', 600), entry.get('forecast'),
+                     entry.get('radar'), entry.get('radar_params', ''),
+                     entry.get('png'), entry.get('png_diff')) for entry in entries]
+
+class RefreshScheduler(object):
+    """Refreshes locations when they are due, within an API request budget.
+
+    Locations are kept in a priority queue ordered by the time they are next
+    due.  API requests are spaced evenly to stay within
+    requests_per_minute, and the first refresh of each location is
+    staggered so they do not all fall due at once.  Because the process
+    stays resident, the compiled template, pooled connections and the
+    incremental renderer's state carry over from one refresh to the next.
+
+    Attributes:
+        requests_per_minute: API request budget (None for no limit).
+        history: ForecastHistory fetched forecasts are stored in, or None.
+        metrics_path: File instrument measurements are written to, or None.
+        stats: dict of 'refreshes', 'failures', 'unchanged' (forecasts whose
+            SVG did not need rewriting), 'radar_failures' (radar downloads
+            that failed without failing their location's refresh) and
+            'requests' counts.
+    """
+    # Seconds to wait before retrying a location whose refresh failed.
+    RETRY_DELAY = 60
+
+    def __init__(self, locations, requests_per_minute=None, parser='stream', clock=time.time, sleep=time.sleep,
+                 history=None, metrics_path=None):
+        """Creates a new instance of the RefreshScheduler class.
+
+        Args:
+            locations: Location objects to keep up to date.
+            requests_per_minute: API request budget (None for no limit).
+            parser: Name of the forecastdata response parser to use.
+            clock: Function returning the current time in seconds.
+            sleep: Function sleeping for a number of seconds.
+            history: history.ForecastHistory that every fetched forecast is
+                added to (optional).
+            metrics_path: File the instrument measurements are written to
+                after each refresh while recording is on (a JSON snapshot
+                if it ends in .json, else Prometheus text).
+
+        Returns:
+            A new instance of the RefreshScheduler class.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.parser = parser
+        self.history = history
+        self.metrics_path = metrics_path
+        self.stats = {'refreshes': 0, 'failures': 0, 'unchanged': 0, 'radar_failures': 0, 'requests': 0}
+        self._clock = clock
+        self._sleep = sleep
+        self._queue = list()
+        # PNG paths whose last write failed
+        self._stale_pngs = set()
+        self._sequence = 0
+        self._next_request = clock()
+        self._stopped = False
+        now = clock()
+        locations = list(locations)
+        for index, location in enumerate(locations):
+            self.add(location, now + location.interval * index / float(len(locations)))
+
+    def add(self, location, due=None):
+        """Schedules a location.
+
+        Args:
+            location: Location to keep up to date.
+            due: Time of its first refresh (defaults to now).
+
+        Returns:
+            None.
+        """
+        if due is None:
+            due = self._clock()
+        # the sequence number keeps equally due locations in insertion order
+        heapq.heappush(self._queue, (due, self._sequence, location))
+        self._sequence += 1
+
+    def stop(self):
+        """Makes run return after the refresh in progress."""
+        self._stopped = True
+
+    def run(self, until=None):
+        """Refreshes locations as they fall due.
+
+        Args:
+            until: Time to return at (None runs until stop is called).
+
+        Returns:
+            None.
+        """
+        self._stopped = False
+        while self._queue and not self._stopped:
+            due = max(self._queue[0][0], self._next_request)
+            now = self._clock()
+            if until is not None and due > until:
+                if until > now:
+                    self._sleep(until - now)
+                return
+            if due > now:
+                self._sleep(due - now)
+                continue
+            self.run_next()
+
+    def run_next(self):
+        """Refreshes the location that is due first and reschedules it.
+
+        Returns:
+            The refreshed Location.
+        """
+        due, sequence, location = heapq.heappop(self._queue)
+        try:
+            self.refresh(location)
+        except Exception:
+            self.stats['failures'] += 1
+            logger.exception('refreshing %s failed', location.query)
+            next_due = self._clock() + min(self.RETRY_DELAY, location.interval)
+        else:
+            self.stats['refreshes'] += 1
+            next_due = max(due + location.interval, self._clock())
+        if self.requests_per_minute:
+            self._next_request = max(self._next_request, self._clock()) \
+                + location.cost * 60.0 / self.requests_per_minute
+        self.add(location, next_due)
+        recorder = instrument.get_recorder()
+        if self.metrics_path is not None and recorder is not None:
+            recorder.write(self.metrics_path)
+        return location
+
+    def refresh(self, location):
+        """Fetches a location's forecast and radar image and writes them.
+
+        The PNG is rendered when the SVG changed, or when it is missing or
+        its last render failed.  A failed radar download is logged and
+        counted in stats['radar_failures'] rather than raised.
+
+        Args:
+            location: Location to refresh.
+
+        Returns:
+            None.
+        """
+        with instrument.stage('refresh', location.query):
+            if location.forecast_path is not None:
+                self.stats['requests'] += 1
+                forecast = forecastdata.Forecast(location.query, self.parser)
+                if self.history is not None:
+                    self.history.add(location.query, forecast, self._clock())
+                changed = svgmanip.write_forecast_incremental(forecast, location.forecast_path)
+                if not changed:
+                    self.stats['unchanged'] += 1
+                png_path = location.png_path
+                if png_path is not None and (changed or png_path in self._stale_pngs
+                                             or not os.path.exists(png_path)):
+                    # imported here, as only locations with a PNG need it
+                    import raster
+                    # stays stale until written, so a failed write is retried
+                    # even though the SVG is then unchanged
+                    self._stale_pngs.add(png_path)
+                    raster.write_forecast_png(forecast, png_path, diff_path=location.png_diff_path)
+                    self._stale_pngs.discard(png_path)
+            if location.radar_path is not None:
+                self.stats['requests'] += 1
+                try:
+                    apirequest.radar_download(location.query, location.radar_path,
+                                              request_params=location.radar_params)
+                except Exception:
+                    # the forecast is up to date; the radar is retried at
+                    # the next refresh
+                    self.stats['radar_failures'] += 1
+                    logger.exception('downloading the radar image of %s failed', location.query)
+
+class FakeClock(object):
+    """A clock whose sleep advances time instantly, for test mode."""
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class _CheckedScheduler(RefreshScheduler):
+    """A RefreshScheduler that logs each refresh for run_test to check."""
+    def __init__(self, *args, **kwargs):
+        RefreshScheduler.__init__(self, *args, **kwargs)
+        # (time, due, location) of each refresh
+        self.log = list()
+
+    def run_next(self):
+        due = self._queue[0][0]
+        location = RefreshScheduler.run_next(self)
+        self.log.append((self._clock(), due, location))
+        return location
+
+def _check_run(scheduler, requests_per_minute, connections, max_connections):
+    """Checks a test run's refreshes against what the scheduler promises.
+
+    Args:
+        scheduler: _CheckedScheduler after the run.
+        requests_per_minute: API request budget of the run.
+        connections: Number of connections the stub API accepted.
+        max_connections: Connection limit of the HTTP client.
+
+    Returns:
+        list of descriptions of the checks that failed.
+    """
+    problems = list()
+    log = scheduler.log
+    if scheduler.stats['failures']:
+        problems.append('%d refreshes failed' % scheduler.stats['failures'])
+    if scheduler.stats.get('radar_failures'):
+        problems.append('%d radar downloads failed' % scheduler.stats['radar_failures'])
+    if not log:
+        return problems + ['no location was refreshed']
+
+    # No 60 second window holds more requests than the budget, allowing for
+    # the requests of the refresh that starts the window.
+    max_cost = max(location.cost for when, due, location in log)
+    first = 0
+    requests = 0
+    for when, due, location in log:
+        requests += location.cost
+        while log[first][0] <= when - 60:
+            requests -= log[first][2].cost
+            first += 1
+        if requests > requests_per_minute + max_cost:
+            problems.append('%d requests in the minute before %.0f exceeds the budget of %g'
+                            % (requests, when, requests_per_minute))
+            break
+
+    # Locations are refreshed in the order they fall due, never early, and
+    # fall due no more often than their interval.
+    last_due = dict()
+    for index, (when, due, location) in enumerate(log):
+        if when < due:
+            problems.append('%s refreshed %.1f s early' % (location.query, due - when))
+        if index and due < log[index - 1][1]:
+            problems.append('%s refreshed out of order' % location.query)
+        previous = last_due.get(location.query)
+        if previous is not None and due - previous < location.interval:
+            problems.append('%s fell due after %.0f s, within its interval of %d s'
+                            % (location.query, due - previous, location.interval))
+        last_due[location.query] = due
+
+    # No location waits longer than it takes to refresh every location once
+    # at the budgeted pace, including those still queued when the run ended.
+    limit = len(scheduler._queue) * max_cost * 60.0 / requests_per_minute
+    now = scheduler._clock()
+    waits = [(when - due, location) for when, due, location in log]
+    waits.extend((now - due, location) for due, sequence, location in scheduler._queue)
+    wait, location = max(waits, key=lambda entry: entry[0])
+    if wait > limit:
+        problems.append('%s waited %.0f s past due, longer than %.0f s' % (location.query, wait, limit))
+
+    # Pooled connections are reused rather than opened per request.
+    if connections > max_connections:
+        problems.append('%d connections opened for %d requests (limit %d)'
+                        % (connections, scheduler.stats['requests'], max_connections))
+    return problems
+
+def run_test(duration=3600, locations=20, requests_per_minute=10):
+    """Runs the scheduler against a local stub API with a fake clock.
+
+    Checks that the run kept within the request budget, refreshed locations
+    in the order they fell due and no more often than their intervals, left
+    no location waiting longer than one pass over every location at the
+    budgeted pace, and reused pooled connections.
+
+    Args:
+        duration: Simulated seconds to run for.
+        locations: Number of simulated locations.
+        requests_per_minute: API request budget.
+
+    Returns:
+        list of descriptions of the checks that failed (empty if the run
+        passed).
+    """
+    import os
+    import shutil
+    import tempfile
+    import stubapi
+
+    fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'fixtures')
+    with open(os.path.join(fixture_dir, 'forecast.xml'), 'rb') as fixture:
+        responses = {'forecast': fixture.read(), 'animatedradar': b'GIF89a'}
+    output_dir = tempfile.mkdtemp(prefix='pyweather-scheduler-')
+    clock = FakeClock(time.time())
+    try:
+        with stubapi.StubAPIServer(responses) as stub:
+            sites = [Location('%d' % (63100 + i), 300 * (1 + i % 3),
+                              os.path.join(output_dir, '%d.svg' % i), os.path.join(output_dir, '%d.gif' % i))
+                     for i in range(locations)]
+            scheduler = _CheckedScheduler(sites, requests_per_minute, clock=clock.time, sleep=clock.sleep)
+            start = clock.time()
+            scheduler.run(until=start + duration)
+            print('%d simulated seconds: %s' % (duration, scheduler.stats))
+            print('stub API: %d requests over %d connections (%.1f requests/minute)' % (
+                stub.counters['requests'], stub.counters['connections'],
+                stub.counters['requests'] * 60.0 / duration))
+            problems = _check_run(scheduler, requests_per_minute, stub.counters['connections'],
+                                  apirequest.get_default_client().max_connections)
+            for problem in problems:
+                print('FAILED: %s' % problem)
+            return problems
+    finally:
+        shutil.rmtree(output_dir)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Keep forecasts and radar images up to date.')
+    parser.add_argument('locations', nargs='?', help='JSON file listing locations')
+    parser.add_argument('--requests-per-minute', type=float, default=10,
+                        help='API request budget (default 10)')
+    parser.add_argument('--history', metavar='DATABASE',
+                        help='SQLite database to store every fetched forecast in')
+    parser.add_argument('--coalesce', type=int, metavar='PRECISION',
+                        help='snap lat/long queries to geohash cells of this precision (e.g. 6) and '
+                             'cache responses, so nearby locations share one fetch')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='record stage timings and write them to FILE after each refresh '
+                             '(JSON if it ends in .json, else Prometheus text)')
+    parser.add_argument('--test', action='store_true',
+                        help='run against a local stub API with a fake clock')
+    parser.add_argument('--duration', type=float, default=3600,
+                        help='simulated seconds to run in test mode (default 3600)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.metrics:
+        instrument.enable()
+    if args.coalesce:
+        import spatial
+        apirequest.set_coalescer(spatial.QueryCoalescer(args.coalesce))
+        apirequest.set_cache(apirequest.MemoryCache())
+    if args.test:
+        problems = run_test(args.duration, requests_per_minute=args.requests_per_minute)
+        if args.metrics:
+            instrument.get_recorder().write(args.metrics)
+        return 1 if problems else 0
+    elif args.locations:
+        store = None
+        if args.history:
+            import history
+            store = history.ForecastHistory(args.history, batch_size=1)
+        try:
+            RefreshScheduler(load_locations(args.locations), args.requests_per_minute,
+                             history=store, metrics_path=args.metrics).run()
+        finally:
+            if store is not None:
+                store.close()
+    else:
+        parser.error('a locations file is required unless --test is given')
+
+if __name__ == '__main__':
+    sys.exit(main())
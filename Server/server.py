@@ -20,17 +20,117 @@ Matthew Petroff's Kindle Weather Display project.
 
 http://mpetroff.net/2012/09/kindle-weather-display/
 https://github.com/mpetroff/kindle-weather-display
+
+Usage:
+    python server.py [LOCATION] [--forecast FILE | --no-forecast] [--radar FILE | --no-radar]
+                     [--radar-params PARAMS] [--png FILE] [--template FILE] [--parser NAME]
+                     [--api-key-file FILE] [--api-root URL]
+
+Writes the forecast SVG and radar image of one location (by default
+38.667426,-90.396479 to forecast.svg and radar.gif).  Only the modules a run
+needs are imported, and the radar image downloads while the forecast is
+fetched and rendered.
 """
 #!/usr/bin/python
+import sys
+import threading
+
+DEFAULT_LOCATION = '38.667426,-90.396479'
+DEFAULT_RADAR_PARAMS = '?width=800&height=400&newmaps=1&num=15&delay=25&timelabel=1&timelabel.y=10'
+
+def parse_args(argv=None):
+    """Parses the command line.
+
+    Args:
+        argv: Arguments to parse (defaults to sys.argv[1:]).
+
+    Returns:
+        argparse.Namespace of the options.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description='Write the forecast and radar image of a location.')
+    parser.add_argument('location', nargs='?', default=DEFAULT_LOCATION,
+                        help='location to request, e.g. 63167 or MO/St_Louis (default %s)' % DEFAULT_LOCATION)
+    parser.add_argument('--forecast', metavar='FILE', default='forecast.svg',
+                        help='SVG file to write the forecast to (default forecast.svg)')
+    parser.add_argument('--no-forecast', dest='forecast', action='store_const', const=None,
+                        help='do not write a forecast SVG')
+    parser.add_argument('--radar', metavar='FILE', default='radar.gif',
+                        help='file to write the radar image to (default radar.gif)')
+    parser.add_argument('--no-radar', dest='radar', action='store_const', const=None,
+                        help='do not download a radar image')
+    parser.add_argument('--radar-params', metavar='PARAMS', default=DEFAULT_RADAR_PARAMS,
+                        help='radar request parameters (default %s)' % DEFAULT_RADAR_PARAMS.replace('%', '%%'))
+    parser.add_argument('--png', metavar='FILE',
+                        help='also render the forecast to a grayscale PNG (requires cairosvg)')
+    parser.add_argument('--template', metavar='FILE', default='./template.svg',
+                        help='SVG template to render (default ./template.svg)')
+    parser.add_argument('--parser', default='stream', choices=('dom', 'stream', 'json'),
+                        help='forecast response parser (default stream)')
+    parser.add_argument('--api-key-file', metavar='FILE',
+                        help='file holding the API key (default ./api.key)')
+    parser.add_argument('--api-root', metavar='URL',
+                        help='root URL of the API (default http://api.wunderground.com/api/)')
+    return parser.parse_args(argv)
+
+def _start(target, *args, **kwargs):
+    """Runs a function in a background thread.
+
+    Returns:
+        (thread, errors) where errors is a list that gets the exception the
+        function raised, if any.
+    """
+    errors = list()
+
+    def run():
+        try:
+            target(*args, **kwargs)
+        except Exception as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread, errors
+
+def main(argv=None):
+    args = parse_args(argv)
+    import apirequest
+    if args.api_key_file:
+        apirequest.API_KEY_PATH = args.api_key_file
+    if args.api_root:
+        apirequest.API_ROOT = args.api_root
+    # read the key once, before the requests run in parallel
+    apirequest._get_apikey()
+
+    radar = None
+    if args.radar:
+        radar = _start(apirequest.radar_download, args.location, args.radar,
+                       request_params=args.radar_params)
+    try:
+        if args.forecast or args.png:
+            import forecastdata
+            import svgmanip
+            if args.forecast:
+                # compiled while the forecast request is in flight
+                template = _start(svgmanip.load_template, args.template)
+            forecast = forecastdata.Forecast(args.location, args.parser)
+            if args.forecast:
+                template[0].join()
+                if template[1]:
+                    raise template[1][0]
+                svgmanip.write_forecast(forecast, args.forecast, args.template)
+            if args.png:
+                import raster
+                raster.write_forecast_png(forecast, args.png, args.template)
+    finally:
+        # the download finishes, replacing or removing its temporary file,
+        # before the process exits, even if the forecast failed
+        if radar is not None:
+            radar[0].join()
+    if radar is not None and radar[1]:
+        raise radar[1][0]
+    return 0
 
-import apirequest
-import forecastdata
-import svgmanip
-
-forecast = forecastdata.Forecast('38.667426,-90.396479')
-svgmanip.write_forecast(forecast)
-f = open('radar.gif', 'wb')
-params = '?width=800&height=400&newmaps=1&num=15&delay=25&timelabel=1&timelabel.y=10'
-img = apirequest.radar_request('38.667426,-90.396479', request_params=params)
-f.write(img)
-f.close()
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Snaps nearby latitude/longitude queries to shared grid cells.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+
+Inspiration as well as coding strategies are borrowed heavily from
+Matthew Petroff's Kindle Weather Display project.
+
+http://mpetroff.net/2012/09/kindle-weather-display/
+https://github.com/mpetroff/kindle-weather-display
+"""
+from collections import OrderedDict
+import re
+import threading
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_BASE32_INDEX = dict((char, index) for index, char in enumerate(_BASE32))
+
+# Matches <latitude>,<longitude> queries, e.g. 38.667426,-90.396479
+_LATLONG = re.compile(r'^\s*([-+]?\d+(?:\.\d*)?|[-+]?\.\d+)\s*,\s*([-+]?\d+(?:\.\d*)?|[-+]?\.\d+)\s*$')
+
+def parse_latlong(request_query):
+    """Reads a <latitude>,<longitude> query.
+
+    Args:
+        request_query: Geographical location for which to request.
+
+    Returns:
+        (latitude, longitude) floats, or None if the query is not a valid
+        latitude/longitude pair.
+    """
+    match = _LATLONG.match(request_query)
+    if match is None:
+        return None
+    latitude, longitude = float(match.group(1)), float(match.group(2))
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    return latitude, longitude
+
+def geohash_encode(latitude, longitude, precision=6):
+    """Encodes a position as a geohash.
+
+    Args:
+        latitude: Latitude in degrees.
+        longitude: Longitude in degrees.
+        precision: Number of characters; each adds 5 bits, e.g. 5 gives
+            cells of about 4.9 x 4.9 km, 6 about 1.2 x 0.6 km and 7 about
+            150 x 150 m.
+
+    Returns:
+        The geohash string.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = list()
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            value, value_range = longitude, lon_range
+        else:
+            value, value_range = latitude, lat_range
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            value_range[0] = middle
+        else:
+            bits = bits * 2
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+def geohash_bounds(geohash):
+    """Decodes a geohash into the cell it covers.
+
+    Args:
+        geohash: Geohash string.
+
+    Returns:
+        ((south, north), (west, east)) bounds of the cell in degrees.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return tuple(lat_range), tuple(lon_range)
+
+def geohash_center(geohash):
+    """Gets the center of a geohash cell.
+
+    Args:
+        geohash: Geohash string.
+
+    Returns:
+        (latitude, longitude) of the cell's center.
+    """
+    (south, north), (west, east) = geohash_bounds(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+class QueryCoalescer(object):
+    """Snaps latitude/longitude queries to the center of their geohash cell.
+
+    Locations a few hundred metres apart get the same forecast, because the
+    API's forecast grid is coarser than that.  Rewriting every query in a
+    cell to the cell's center gives those locations the same request, so a
+    ResponseCache (see apirequest.set_cache) serves all of them from one
+    fetch.  Other forms of query are left as they are.  The max_entries
+    most recently used queries are remembered (with the cells they fell
+    in); older ones are snapped again when they come back.
+
+    Attributes:
+        precision: Geohash precision (characters) of the cells.
+        features: Set of API features whose queries are snapped, or None
+            for every feature.
+        max_entries: Maximum number of queries remembered.
+        stats: dict of 'queries' (latitude/longitude queries snapped),
+            'distinct' (different queries seen), 'cells' (different cells
+            they fell in) and 'evictions' (queries forgotten) counts.
+            A query seen again after it was forgotten counts again.
+    """
+    def __init__(self, precision=6, features=None, max_entries=4096):
+        """Creates a new instance of the QueryCoalescer class.
+
+        Args:
+            precision: Geohash precision of the cells (see geohash_encode).
+            features: API features to snap queries of, e.g.
+                ['forecast'] to leave radar images centered on each
+                location (defaults to every feature).
+            max_entries: Maximum number of queries remembered.
+
+        Returns:
+            A new instance of the QueryCoalescer class.
+        """
+        self.precision = precision
+        self.features = set(features) if features is not None else None
+        self.max_entries = max_entries
+        self.stats = {'queries': 0, 'distinct': 0, 'cells': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        # geohash -> set of the remembered queries that fell in the cell
+        self._cells = dict()
+        # query -> (canonical query, geohash), least recently used first
+        self._canonical = OrderedDict()
+
+    def canonical(self, requested_feature, request_query):
+        """Gets the query to send in place of a query.
+
+        Args:
+            requested_feature: Type of API request (forecast, animatedradar).
+            request_query: Geographical location for which to request.
+
+        Returns:
+            The center of the query's cell as <latitude>,<longitude> for
+            latitude/longitude queries of the snapped features, otherwise
+            the query unchanged.
+        """
+        if self.features is not None and requested_feature not in self.features:
+            return request_query
+        with self._lock:
+            entry = self._canonical.pop(request_query, None)
+            if entry is not None:
+                self._canonical[request_query] = entry
+                self.stats['queries'] += 1
+                return entry[0]
+        position = parse_latlong(request_query)
+        if position is None:
+            return request_query
+        geohash = geohash_encode(position[0], position[1], self.precision)
+        canonical = '%.6f,%.6f' % geohash_center(geohash)
+        with self._lock:
+            self.stats['queries'] += 1
+            if request_query not in self._canonical:
+                self._canonical[request_query] = (canonical, geohash)
+                self.stats['distinct'] += 1
+                cell = self._cells.get(geohash)
+                if cell is None:
+                    cell = self._cells[geohash] = set()
+                    self.stats['cells'] += 1
+                cell.add(request_query)
+                while len(self._canonical) > self.max_entries:
+                    self._forget(*self._canonical.popitem(last=False))
+        return canonical
+
+    def _forget(self, request_query, entry):
+        """Removes an evicted query from its cell (with the lock held)."""
+        cell = self._cells[entry[1]]
+        cell.discard(request_query)
+        if not cell:
+            del self._cells[entry[1]]
+        self.stats['evictions'] += 1
+
+    def __len__(self):
+        return len(self._canonical)
+
+    @property
+    def fan_in(self):
+        """Average number of remembered queries per cell (1.0 before any)."""
+        with self._lock:
+            if not self._cells:
+                return 1.0
+            return len(self._canonical) / float(len(self._cells))
+
+    def cells(self):
+        """Gets the queries that fell in each cell.
+
+        Returns:
+            dict mapping each cell's canonical query to a sorted list of the
+            queries snapped to it.
+        """
+        with self._lock:
+            return dict(('%.6f,%.6f' % geohash_center(geohash), sorted(queries))
+                        for geohash, queries in self._cells.items())
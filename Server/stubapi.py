@@ -0,0 +1,197 @@
+"""A local stand-in for the Wunderground API, for offline testing and benchmarks.
+
+This file is part of PyWeather.
+
+PyWeather is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyWeather is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyWeather.  If not, see <http://www.gnu.org/licenses/>.
+"""
+try:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+from email.utils import formatdate
+import gzip
+import hashlib
+import io
+import re
+import threading
+import time
+
+import apirequest
+
+# Matches the path of an API URL formed by apirequest._get_url, e.g.
+# /api/<key>/forecast/q/MO/St_Louis.xml?width=800
+_PATH_PATTERN = re.compile(r'^/api/(?P<key>[^/]*)/(?P<feature>[^/]+)/q/(?P<query>.+)\.(?P<format>[a-z]+)$')
+
+_CONTENT_TYPES = {
+    'xml': 'text/xml; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+    'gif': 'image/gif',
+    'png': 'image/png',
+}
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Answers API requests from the server's canned responses."""
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY the
+    # client's delayed ACK stalls every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.count('connections')
+
+    def do_GET(self):
+        stub = self.server
+        stub.count('requests')
+        path, _, query_string = self.path.partition('?')
+        match = _PATH_PATTERN.match(path)
+        if stub.delay:
+            time.sleep(stub.delay)
+        if (match is None or match.group('feature') not in stub.responses
+                or match.group('query') in stub.unknown_queries):
+            self._send(404, b'', 'text/plain')
+            return
+        if stub.take_failure():
+            self._send(503, b'', 'text/plain')
+            return
+        stub.requested.append((match.group('feature'), match.group('query'), match.group('format')))
+        body = stub.responses[match.group('feature')]
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        validators = {'ETag': etag, 'Last-Modified': stub.last_modified}
+        if self.headers.get('If-None-Match') == etag or (
+                'If-None-Match' not in self.headers
+                and self.headers.get('If-Modified-Since') == stub.last_modified):
+            self._send(304, b'', None, validators)
+            return
+        self._send(200, body, _CONTENT_TYPES.get(match.group('format'), 'application/octet-stream'),
+                   validators)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body and content_type and content_type.startswith(('text/', 'application/json')) \
+                and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as compressed:
+                compressed.write(body)
+            body = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.server.drop_connections:
+            # closed without a Connection: close header, as a server does
+            # when an idle keep-alive connection times out
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class StubAPIServer(ThreadingMixIn, HTTPServer):
+    """Serves canned responses using the API's URL layout on localhost.
+
+    Requests are matched on the api/<key>/<feature>/q/<query>.<format> layout
+    produced by apirequest._get_url and answered with the response registered
+    for the feature.  Connections and requests are counted so tests can check
+    how many TCP connections a client opened.
+
+    Attributes:
+        responses: dict mapping API features (forecast, animatedradar) to
+            response bodies.
+        delay: Seconds to wait before answering each request.
+        failures: Number of upcoming requests to answer with 503.
+        unknown_queries: Set of queries to answer with 404.
+        drop_connections: Whether to close every connection after one
+            response without telling the client, so a client reusing it
+            finds it closed.
+        counters: dict of 'connections' and 'requests' counts.
+        last_modified: Last-Modified date sent with every response.  A
+            request whose ETag or If-Modified-Since matches is answered
+            with 304 Not Modified.
+        requested: list of (feature, query, format) tuples served.
+        url: Root URL to use as apirequest.API_ROOT.
+    """
+    daemon_threads = True
+
+    def __init__(self, responses=None, delay=0.0, failures=0, port=0):
+        """Creates a new instance of the StubAPIServer class.
+
+        Args:
+            responses: dict mapping API features to response bodies.
+            delay: Seconds to wait before answering each request.
+            failures: Number of upcoming requests to answer with 503.
+            port: Port to listen on (0 picks a free port).
+
+        Returns:
+            A new instance of the StubAPIServer class.
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', port), _StubHandler)
+        self.responses = dict(responses or {})
+        self.delay = delay
+        self.failures = failures
+        self.unknown_queries = set()
+        self.drop_connections = False
+        self.counters = {'connections': 0, 'requests': 0}
+        self.requested = list()
+        self.last_modified = formatdate(int(time.time()) - 60, usegmt=True)
+        self.url = 'http://127.0.0.1:%d/api/' % self.server_address[1]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._saved = None
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def take_failure(self):
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return True
+            return False
+
+    def start(self):
+        """Starts serving on a background thread and points apirequest at it.
+
+        Returns:
+            This server, so it can be used in a with statement.
+        """
+        self._saved = (apirequest.API_ROOT, apirequest.API_KEY)
+        apirequest.API_ROOT = self.url
+        apirequest.API_KEY = 'stub'
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and restores apirequest's API root and key."""
+        self.shutdown()
+        self.server_close()
+        if self._saved is not None:
+            apirequest.API_ROOT, apirequest.API_KEY = self._saved
+            self._saved = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -22,23 +22,944 @@ http://mpetroff.net/2012/09/kindle-weather-display/
 https://github.com/mpetroff/kindle-weather-display
 """
 import codecs
+import hashlib
+import operator
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
 
-def write_forecast(forecast_obj):
-    """Opens an SVG file and populates it with Forecast data.
+import atomicfile
+import instrument
+
+TEMPLATE_PATH = './template.svg'
+
+# Matches every placeholder slot in the SVG template, e.g. P1I1 (day icon),
+# P1I2 (night icon), period1daytext1 or period4high.
+_PERIOD_FIELDS = (r'(?:title|daytext\d+|nighttext\d+|high|low|humidity'
+                  r'|dayrainchance|nightrainchance|dayrainamount|nightrainamount)')
+_SLOT_PATTERN = re.compile(r'P(?P<icon_period>\d+)I[12]|period(?P<period>\d+)' + _PERIOD_FIELDS)
+
+# Matches the slots of a dashboard template: the period slots of a repeating
+# period block have N for their period (PNI1, periodNhigh, ...).
+_DASHBOARD_SLOT = re.compile(r'PNI[12]|periodN' + _PERIOD_FIELDS + r'|location(?:name|query)')
+
+# Matches the markers around a dashboard template's repeating blocks, e.g.
+# <!-- repeat period step="80 0" count="7" --> ... <!-- end period -->
+_BLOCK_MARKER = re.compile(
+    r'<!--\s*(?:repeat\s+(?P<name>location|period)\b(?P<attributes>[^>]*?)|end\s+(?P<end>location|period))\s*-->')
+
+# Matches a dashboard template's directive to copy another template's <defs>,
+# e.g. <!-- defs template.svg -->
+_DEFS_INCLUDE = re.compile(r'<!--\s*defs\s+(?P<path>[^\s>]+)\s*-->')
+_DEFS = re.compile(r'<defs\b.*?</defs>', re.S)
+_PAGE_SIZE_SLOT = re.compile(r'dashboard(?:width|height)')
+
+# Compiled templates keyed by path, as (paths, modification times, template):
+# a template is reloaded when its file or a file it reads (its stylesheet or
+# included defs) changes.
+_template_cache = {}
+_dashboard_cache = {}
+
+DASHBOARD_PATH = './dashboard.svg'
+
+# The area a forecast text is wrapped to fit: width in pixels, font size in
+# pixels and number of lines (daytext1, daytext2, ... slots).
+TextBox = namedtuple('TextBox', 'width font_size lines')
+
+# Boxes of the day and night texts in template.svg, used when a template's
+# own are not given.
+DAY_TEXT = TextBox(592, 16, 2)
+NIGHT_TEXT = TextBox(358, 14, 2)
+TEXT_BOXES = {'daytext': DAY_TEXT, 'nighttext': NIGHT_TEXT}
+
+# Font size of text without one in the stylesheet (CSS medium).
+_DEFAULT_FONT_SIZE = 16
+
+# Whether forecast text too long for its box is cut short with an ellipsis.
+# Off by default: the last line then holds the rest of the text, even if it
+# runs past the box, so no words are dropped.
+ELLIPSIZE_TEXT = False
+
+# Matches the first sentence of the high/low/wind summary that forecast texts
+# end with, e.g. " High 77F. Winds S at 10 to 15 mph.".  Only a sentence
+# after the first counts, and High/Low only when a temperature follows, so
+# texts such as "Low clouds and fog early." are kept.
+_SUMMARY_CLAUSES = re.compile(
+    r'(?<=[.!?])\s*(?:(?:High|Low)s?\s+(?:(?:near|around|in the)\s+)?(?:(?:low|mid|upper)\s+)?-?\d|Winds\b)')
+
+# Matches a text slot's <text> element, e.g.
+# <text class="nighttext" x="410" y="95">period1nighttext1</text>
+_TEXT_SLOT = re.compile(
+    r'<text\b(?P<attributes>[^>]*)>\s*period(?P<period>\d+|N)(?P<kind>daytext|nighttext)(?P<line>\d+)\s*<')
+_RECT = re.compile(r'<rect\b[^>]*>')
+_SVG_OPEN = re.compile(r'<svg\b[^>]*>')
+_ATTRIBUTE = re.compile(r'([\w:-]+)\s*=\s*"([^"]*)"')
+_STYLESHEET = re.compile(r'<\?xml-stylesheet\b[^>]*?href="([^"]+)"[^>]*\?>')
+_CSS_RULE = re.compile(r'([^{}]+)\{([^}]*)\}')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_FONT_SIZE = re.compile(r'font-size\s*:\s*([\d.]+)px')
+
+# Advance widths of Verdana in units of 1/2048 em.  The stylesheet asks for
+# Lucida Sans first and only falls back to Verdana, and the font a viewer
+# actually uses is not known here, so these are an approximation: Verdana is
+# a little wider than Lucida Sans, so text tends to wrap slightly early
+# rather than overflow its box.
+_UNITS_PER_EM = 2048
+_ADVANCES = dict(zip(
+    ' !"#$%&\'()*+,-./0123456789:;<=>?@'
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~',
+    (720, 805, 934, 1794, 1303, 2219, 1484, 549, 1024, 1024, 1303, 1794, 745, 924, 745, 1178,
+     1303, 1303, 1303, 1303, 1303, 1303, 1303, 1303, 1303, 1303, 924, 924, 1794, 1794, 1794, 1112, 2047,
+     1401, 1405, 1430, 1577, 1294, 1178, 1587, 1540, 862, 917, 1423, 1145, 1730, 1532, 1612, 1235,
+     1612, 1425, 1401, 1237, 1499, 1401, 2026, 1403, 1239, 1403, 1024, 1178, 1024, 1794, 1303, 1303,
+     1231, 1275, 1067, 1275, 1208, 719, 1275, 1296, 562, 690, 1202, 562, 1992, 1296, 1226, 1275,
+     1275, 874, 1051, 807, 1296, 1202, 1661, 1202, 1202, 1051, 1300, 1024, 1300, 1794)))
+_ELLIPSIS = u'\u2026'
+_ADVANCES[_ELLIPSIS] = 2048
+_DEFAULT_ADVANCE = 1303
+
+# Cleaned and wrapped texts keyed by (forecast text, TextBox), least recently
+# used first.
+_text_cache = OrderedDict()
+_text_lock = threading.Lock()
+_TEXT_CACHE_ENTRIES = 4096
+
+class CompiledTemplate(object):
+    """An SVG template split into literal segments and placeholder slots.
+
+    The template is scanned once for placeholder slots.  Rendering is then a
+    single join of the literal segments with the slot values, rather than one
+    full-document replace per slot.
+
+    The parts of the template holding each period's slots are also kept as
+    separate chunks, so a single period can be re-rendered on its own.
+
+    Attributes:
+        slots: list of slot names in the order they appear in the template.
+        periods: set of forecast periods (1, 2, ...) that have slots.
+        chunks: list of frozensets of the periods whose slots each chunk
+            holds (empty for chunks of literal text); joining every
+            rendered chunk gives the whole document.
+        mtime: modification time of the template file when it was compiled.
+        digest: SHA-1 hex digest of the template and stylesheet text,
+            identifying its version (the stylesheet sets the text boxes
+            the forecast texts are wrapped to).
+        text_boxes: dict mapping text kinds ('daytext', 'nighttext') to
+            the TextBox their slots give them (see text_boxes).
+    """
+    def __init__(self, svg, mtime=None, css=''):
+        """Creates a new instance of the CompiledTemplate class.
+
+        Args:
+            svg: The SVG template text.
+            mtime: modification time of the template file (optional).
+            css: Text of the template's stylesheet, for the text slots'
+                font sizes (optional).
+
+        Returns:
+            A new instance of the CompiledTemplate class.
+        """
+        self.mtime = mtime
+        self.digest = _digest(svg, css)
+        self.slots = list()
+        # Literal segments and slot names alternate in _parts; _slot_positions
+        # records the index of each slot so a render only fills those.
+        self._parts = list()
+        self._slot_positions = list()
+        position = 0
+        # period -> [first part index, last part index + 1]
+        period_ranges = dict()
+        for match in _SLOT_PATTERN.finditer(svg):
+            self._parts.append(svg[position:match.start()])
+            index = len(self._parts)
+            self._slot_positions.append((index, match.group(0)))
+            self._parts.append(match.group(0))
+            self.slots.append(match.group(0))
+            position = match.end()
+            period = int(match.group('icon_period') or match.group('period'))
+            period_range = period_ranges.setdefault(period, [index, index + 1])
+            period_range[1] = index + 1
+        self._parts.append(svg[position:])
+        self.periods = set(period_ranges)
+        self._build_chunks(period_ranges)
+        self.text_boxes = text_boxes(svg, css)
+
+    def _build_chunks(self, period_ranges):
+        """Splits _parts into literal chunks and chunks holding periods' slots.
+
+        Periods whose slots interleave share a chunk.
+        """
+        merged = list()
+        for period, (start, end) in sorted(period_ranges.items(), key=lambda item: item[1]):
+            if merged and start < merged[-1][2]:
+                merged[-1][0].add(period)
+                merged[-1][2] = max(merged[-1][2], end)
+            else:
+                merged.append([set([period]), start, end])
+        self.chunks = list()
+        # (start, end, slot positions relative to start) for each chunk
+        self._chunk_spans = list()
+        position = 0
+        for periods, start, end in merged:
+            if start > position:
+                self._add_chunk(frozenset(), position, start)
+            self._add_chunk(frozenset(periods), start, end)
+            position = end
+        if position < len(self._parts):
+            self._add_chunk(frozenset(), position, len(self._parts))
+
+    def _add_chunk(self, periods, start, end):
+        slots = [(index - start, slot) for index, slot in self._slot_positions if start <= index < end]
+        self.chunks.append(periods)
+        self._chunk_spans.append((start, end, slots))
+
+    def render(self, values):
+        """Fills the template's slots with values.
+
+        Args:
+            values: dict mapping slot names to the text to insert.  Slots
+                without a value are left as-is.
+
+        Returns:
+            The populated SVG text.
+        """
+        with instrument.stage('render'):
+            parts = list(self._parts)
+            for index, slot in self._slot_positions:
+                if slot in values:
+                    parts[index] = values[slot]
+            return ''.join(parts)
+
+    def render_chunk(self, chunk, values):
+        """Fills the slots of a single chunk with values.
+
+        Args:
+            chunk: Index of the chunk in chunks.
+            values: dict mapping slot names to the text to insert.
+
+        Returns:
+            The populated text of the chunk.
+        """
+        with instrument.stage('render'):
+            start, end, slots = self._chunk_spans[chunk]
+            parts = self._parts[start:end]
+            for index, slot in slots:
+                if slot in values:
+                    parts[index] = values[slot]
+            return ''.join(parts)
+
+def load_template(template_path=TEMPLATE_PATH):
+    """Gets a compiled SVG template, compiling it if it or its stylesheet is
+    new or has changed.
+
+    Args:
+        template_path: Path to the SVG template.
+
+    Returns:
+        A CompiledTemplate for the template file.
+    """
+    cached = _template_cache.get(template_path)
+    if cached is None or _mtimes(cached[0]) != cached[1]:
+        svg = codecs.open(template_path, 'r', encoding='utf-8').read()
+        css_path = _stylesheet_path(svg, template_path)
+        paths = (template_path, css_path)
+        mtimes = _mtimes(paths)
+        cached = (paths, mtimes, CompiledTemplate(svg, mtimes[0], _read_stylesheet(css_path)))
+        _template_cache[template_path] = cached
+    return cached[2]
+
+def _stylesheet_path(svg, template_path):
+    """Gets the path of the stylesheet an SVG template links to, or None."""
+    stylesheet = _STYLESHEET.search(svg)
+    if stylesheet is None:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(template_path)), stylesheet.group(1))
+
+def _read_stylesheet(css_path):
+    """Reads a template's stylesheet ('' if there is none)."""
+    if css_path is None:
+        return ''
+    try:
+        return codecs.open(css_path, 'r', encoding='utf-8-sig').read()
+    except (IOError, OSError):
+        return ''
+
+def _mtimes(paths):
+    """Gets the modification times of files (None for a missing file or path)."""
+    mtimes = list()
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime if path is not None else None)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def _digest(svg, css):
+    """Gets the SHA-1 hex digest identifying a template and its stylesheet."""
+    digest = hashlib.sha1(svg.encode('utf-8'))
+    digest.update(b'\0' + css.encode('utf-8'))
+    return digest.hexdigest()
+
+def text_boxes(svg, css=''):
+    """Measures the boxes forecast texts are wrapped to fit in a template.
+
+    The first period's text slots (or those of a dashboard's repeating
+    period block) are measured: the number of lines is the
+    number of <kind>1, <kind>2, ... slots, the font size is given by the
+    stylesheet for the text's class (or for text) and the width runs from
+    the text's x to the right edge of the smallest rect it is in, less half
+    the font size of padding.
+
+    Args:
+        svg: The SVG template text.
+        css: Text of the template's stylesheet.
+
+    Returns:
+        dict mapping text kinds ('daytext', 'nighttext') to TextBoxes.
+        Kinds without slots in the template are left out.
+    """
+    font_sizes = dict()
+    for selectors, declarations in _CSS_RULE.findall(_CSS_COMMENT.sub('', css)):
+        font_size = _FONT_SIZE.search(declarations)
+        if font_size is not None:
+            for selector in selectors.split(','):
+                font_sizes[selector.strip()] = float(font_size.group(1))
+    rects = list()
+    for rect in _RECT.findall(svg):
+        attributes = dict(_ATTRIBUTE.findall(rect))
+        try:
+            rects.append(tuple(float(attributes.get(name, 0)) for name in ('x', 'y', 'width', 'height')))
+        except ValueError:
+            pass
+    svg_open = _SVG_OPEN.search(svg)
+    svg_width = float(dict(_ATTRIBUTE.findall(svg_open.group(0))).get('width', 0)) if svg_open else 0.0
+
+    # kind -> [period, line count, first line's attributes]
+    slots = dict()
+    for match in _TEXT_SLOT.finditer(svg):
+        period = 0 if match.group('period') == 'N' else int(match.group('period'))
+        kind, line = match.group('kind'), int(match.group('line'))
+        found = slots.get(kind)
+        if found is None or period < found[0]:
+            found = slots[kind] = [period, 0, None]
+        if period == found[0]:
+            found[1] = max(found[1], line)
+            if line == 1:
+                found[2] = dict(_ATTRIBUTE.findall(match.group('attributes')))
+
+    boxes = dict()
+    for kind, (period, lines, attributes) in slots.items():
+        attributes = attributes or dict()
+        font_size = _DEFAULT_FONT_SIZE
+        for selector in ['text'] + ['.' + name for name in attributes.get('class', '').split()]:
+            font_size = font_sizes.get(selector, font_size)
+        x = float(attributes.get('x', 0))
+        y = float(attributes.get('y', 0))
+        right = svg_width
+        area = None
+        for rect_x, rect_y, rect_width, rect_height in rects:
+            if rect_x <= x < rect_x + rect_width and rect_y <= y <= rect_y + rect_height:
+                if area is None or rect_width * rect_height < area:
+                    area = rect_width * rect_height
+                    right = rect_x + rect_width
+        boxes[kind] = TextBox(int(right - x - font_size / 2), font_size, lines)
+    return boxes
+
+def render_forecast(forecast_obj, template_path=TEMPLATE_PATH):
+    """Populates the compiled SVG template with Forecast data.
 
     Args:
         forecast_obj: Forecast object containing data to populate.
+        template_path: Path to the SVG template.
 
     Returns:
-        None.
+        The populated SVG text.
     """
-    # Open the SVG template (read-only)
-    output = codecs.open('./template.svg', 'r', encoding='utf-8').read()
+    template = load_template(template_path)
+    values = dict()
     for day in forecast_obj.ForecastDays:
-        # Write each day to the opened SVG file
-        output = write_forecastday(output, day)
+        values.update(forecastday_values(day, template.text_boxes))
+    return template.render(values)
+
+def write_forecast(forecast_obj, output_path='forecast.svg', template_path=TEMPLATE_PATH, cache=None):
+    """Opens an SVG file and populates it with Forecast data.
+
+    Args:
+        forecast_obj: Forecast object containing data to populate.
+        output_path: Path of the SVG file to write.
+        template_path: Path to the SVG template.
+        cache: RenderCache to reuse identical renders from (optional).
+
+    Returns:
+        True if the SVG was taken from the cache rather than rendered.
+    """
+    if cache is not None:
+        return cache.write(forecast_obj, output_path, template_path)
+    output = render_forecast(forecast_obj, template_path)
     # Save the populated SVG file
-    codecs.open('forecast.svg', 'w', encoding='utf-8').write(output)
+    _write_atomic(output_path, output)
+    return False
+
+# Gets the ForecastDay attributes that forecastday_values reads.
+_render_fields = operator.attrgetter(
+    'period', 'forecast_date', 'day_icon', 'night_icon', 'day_text', 'night_text',
+    'high_F', 'low_F', 'humidity', 'day_pop', 'night_pop', 'qpf_day_in', 'qpf_night_in')
+
+def render_key(forecast_obj, template):
+    """Forms the RenderCache key of a Forecast rendered with a template.
+
+    Two forecasts have the same key when every ForecastDay value the
+    template is populated from is the same, so they render to the same SVG.
+    The key also covers the stylesheet (see CompiledTemplate.digest), whose
+    font sizes decide how the forecast texts are wrapped, and ELLIPSIZE_TEXT.
+
+    Args:
+        forecast_obj: Forecast object to render.
+        template: CompiledTemplate it is rendered with.
+
+    Returns:
+        Hex digest string.
+    """
+    days = repr([_render_fields(day) for day in forecast_obj.ForecastDays])
+    ellipsis = _ELLIPSIS if ELLIPSIZE_TEXT else ''
+    return hashlib.sha1((template.digest + ellipsis + days).encode('utf-8')).hexdigest()
+
+class RenderCache(object):
+    """Keeps rendered forecast SVGs in a directory, keyed on their content.
+
+    Locations sharing a forecast grid point produce identical SVGs.  The
+    cache keys each rendered SVG on the forecast values and template
+    version (see render_key); when the same key is written again the cached
+    file is hard linked (or copied, where links are not possible) into
+    place instead of being rendered again.  The least recently used files
+    are removed once the cache holds more than max_entries files or
+    max_bytes bytes.  Recency is tracked in the cache's in-memory index;
+    cached files are never touched on a hit, as output files may share
+    their inode.  A new process orders the files it finds by when they were
+    rendered.  Output files linked from a removed entry are not
+    affected.  Because an output file may share its data with the cache,
+    it must be replaced (as every writer in this module does) rather than
+    modified in place.
+
+    Attributes:
+        directory: Directory holding the rendered SVGs.
+        max_entries: Maximum number of cached SVGs.
+        max_bytes: Maximum total size of the cached SVGs.
+        stats: dict of 'hits', 'misses' and 'evictions' counts.
+    """
+    SUFFIX = '.svg'
+
+    def __init__(self, directory, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        """Creates a new instance of the RenderCache class.
+
+        Args:
+            directory: Directory holding the rendered SVGs (created if it
+                does not exist).  It should be on the same filesystem as
+                the output files so they can be hard linked.
+            max_entries: Maximum number of cached SVGs.
+            max_bytes: Maximum total size of the cached SVGs.
+
+        Returns:
+            A new instance of the RenderCache class.
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        # key -> size, least recently used first
+        self._index = OrderedDict()
+        self._bytes = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load_index()
+
+    def __reduce__(self):
+        # write_forecasts workers open the same directory rather than
+        # receiving a copy of the index
+        return type(self), (self.directory, self.max_entries, self.max_bytes)
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def size(self):
+        """Total size in bytes of the cached SVGs."""
+        return self._bytes
+
+    @property
+    def hit_rate(self):
+        """Fraction of writes served from the cache (0.0 before any write)."""
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / float(total) if total else 0.0
+
+    def write(self, forecast_obj, output_path, template_path=TEMPLATE_PATH):
+        """Writes a forecast SVG, reusing a cached render when there is one.
+
+        Args:
+            forecast_obj: Forecast object containing data to populate.
+            output_path: Path of the SVG file to write.
+            template_path: Path to the SVG template.
+
+        Returns:
+            True on a cache hit, False if the SVG was rendered.
+        """
+        template = load_template(template_path)
+        key = render_key(forecast_obj, template)
+        path = self._path(key)
+        with self._lock:
+            known = key in self._index
+            if known:
+                self._index[key] = self._index.pop(key)
+        # the file may also have been rendered by another process sharing
+        # the directory, or removed by one
+        try:
+            atomicfile.link(path, output_path)
+        except (IOError, OSError):
+            with self._lock:
+                self._remove(key)
+        else:
+            size = None if known else os.stat(path).st_size
+            with self._lock:
+                self.stats['hits'] += 1
+                if size is not None:
+                    self._add(key, size)
+            return True
+
+        values = dict()
+        for day in forecast_obj.ForecastDays:
+            values.update(forecastday_values(day, template.text_boxes))
+        output = template.render(values)
+        _write_atomic(path, output)
+        atomicfile.link(path, output_path)
+        size = os.stat(path).st_size
+        with self._lock:
+            self.stats['misses'] += 1
+            self._add(key, size)
+        return False
+
+    def clear(self):
+        """Removes every cached SVG."""
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key, delete=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _load_index(self):
+        entries = list()
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX) or name.startswith('.'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-len(self.SUFFIX)], stat.st_size))
+        with self._lock:
+            for mtime, key, size in sorted(entries):
+                self._add(key, size)
+
+    def _add(self, key, size):
+        self._remove(key)
+        self._index[key] = size
+        self._bytes += size
+        while len(self._index) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._index)), delete=True)
+            self.stats['evictions'] += 1
+
+    def _remove(self, key, delete=False):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+        if delete:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+class _RenderState(object):
+    """What was last written to an output file by write_forecast_incremental.
+
+    Attributes:
+        template: CompiledTemplate the file was rendered from.
+        values: dict mapping each period to its dict of slot values.
+        chunks: list of the rendered text of each template chunk.
+    """
+    def __init__(self, template):
+        self.template = template
+        self.values = dict()
+        self.chunks = [None] * len(template.chunks)
+
+# _RenderState objects keyed by output path, least recently written first.
+# A process writing more outputs than this re-renders the evicted ones fully.
+_render_states = OrderedDict()
+_render_lock = threading.Lock()
+_RENDER_STATE_ENTRIES = 1024
+
+def write_forecast_incremental(forecast_obj, output_path='forecast.svg', template_path=TEMPLATE_PATH):
+    """Populates an SVG file with Forecast data, re-rendering only what changed.
+
+    The slot values last written to each output file are remembered, for
+    the _RENDER_STATE_ENTRIES most recently written files.  When no
+    period's values have changed the file is left untouched; otherwise only
+    the template chunks holding the changed periods are re-rendered before
+    the file is replaced.  The first write of a file in a process,
+    a changed template or a missing output file re-renders everything.
+
+    Args:
+        forecast_obj: Forecast object containing data to populate.
+        output_path: Path of the SVG file to write.
+        template_path: Path to the SVG template.
+
+    Returns:
+        set of the periods (1, 2, ...) whose values changed.  Empty if the
+        file was not rewritten.
+    """
+    template = load_template(template_path)
+    values = dict()
+    for day in forecast_obj.ForecastDays:
+        values[int(day.period)] = forecastday_values(day, template.text_boxes)
+
+    exists = os.path.exists(output_path)
+    with _render_lock:
+        state = _render_states.pop(output_path, None)
+        fresh = state is None or state.template is not template or not exists
+        if fresh:
+            state = _RenderState(template)
+        _render_states[output_path] = state
+        while len(_render_states) > _RENDER_STATE_ENTRIES:
+            _render_states.popitem(last=False)
+    if fresh:
+        dirty = set(template.periods)
+        stale_chunks = range(len(template.chunks))
+    else:
+        dirty = set(period for period in template.periods
+                    if values.get(period) != state.values.get(period))
+        if not dirty:
+            return dirty
+        stale_chunks = [chunk for chunk, periods in enumerate(template.chunks) if periods & dirty]
+
+    for chunk in stale_chunks:
+        chunk_values = dict()
+        for period in template.chunks[chunk]:
+            chunk_values.update(values.get(period, {}))
+        state.chunks[chunk] = template.render_chunk(chunk, chunk_values)
+    _write_atomic(output_path, ''.join(state.chunks))
+    state.values = values
+    return dirty
+
+class _Block(object):
+    """A repeating block of a dashboard template.
+
+    Attributes:
+        name: 'location' or 'period'.
+        step: (x, y) offset of each repetition from the one before.
+        count: Maximum number of repetitions (None for no limit).
+        parts: list of literal text (str), slot names (1-tuples) and
+            nested _Blocks.
+    """
+    __slots__ = ('name', 'step', 'count', 'parts')
+
+    def __init__(self, name, attributes=''):
+        self.name = name
+        attributes = dict(_ATTRIBUTE.findall(attributes))
+        self.step = tuple(float(value) for value in attributes.get('step', '0 0').replace(',', ' ').split())
+        if len(self.step) != 2:
+            raise ValueError('A repeat step must be "<x> <y>": ' + repr(attributes['step']))
+        self.count = int(attributes['count']) if 'count' in attributes else None
+        self.parts = list()
+
+class DashboardTemplate(object):
+    """An SVG template showing the forecasts of several locations.
+
+    The template draws one location and one of its periods.  The location
+    is wrapped in <!-- repeat location step="<x> <y>" --> ...
+    <!-- end location --> markers and is repeated for each Forecast,
+    offset by step each time.  Inside it, the period is wrapped in
+    <!-- repeat period step="<x> <y>" count="<n>" --> ...
+    <!-- end period --> markers and is repeated for each of the
+    location's ForecastDays (up to count), so 4 day and 10 day forecasts
+    fill the same template.
+
+    Period slots inside the period block have N for their period (PNI1,
+    periodNtitle, periodNhigh, ...); locationname and locationquery may
+    be used anywhere in the location block.  The <svg> element's width and
+    height are those of a dashboard with one location and grow by the
+    location step for each further location.
+
+    The template is compiled into literal text, slots and blocks once, and
+    a render appends every part to one list that is joined at the end, so
+    rendering is linear in the number of locations and periods.
+
+    Attributes:
+        mtime: modification time of the template file when it was compiled.
+        digest: SHA-1 hex digest of the template and stylesheet text.
+        text_boxes: dict of the period block's TextBoxes (see text_boxes).
+    """
+    def __init__(self, svg, mtime=None, css=''):
+        """Creates a new instance of the DashboardTemplate class.
+
+        Args:
+            svg: The SVG template text.
+            mtime: modification time of the template file (optional).
+            css: Text of the template's stylesheet (optional).
+
+        Returns:
+            A new instance of the DashboardTemplate class.
+        """
+        self.mtime = mtime
+        self.digest = _digest(svg, css)
+        self.text_boxes = text_boxes(svg, css)
+
+        # the page size becomes two slots filled in at render time
+        svg_open = _SVG_OPEN.search(svg)
+        if svg_open is None:
+            raise ValueError('Dashboard template has no <svg> element')
+        attributes = dict(_ATTRIBUTE.findall(svg_open.group(0)))
+        self._size = (float(attributes.get('width', 0)), float(attributes.get('height', 0)))
+        svg_tag = re.sub(r'\b(width|height)\s*=\s*"[^"]*"', r'\1="dashboard\1"', svg_open.group(0))
+        svg = svg[:svg_open.start()] + svg_tag + svg[svg_open.end():]
+
+        self._root = _Block('dashboard')
+        self._location = None
+        stack = [self._root]
+        position = 0
+        for marker in _BLOCK_MARKER.finditer(svg):
+            self._add_literal(stack[-1], svg[position:marker.start()])
+            position = marker.end()
+            if marker.group('name'):
+                name = marker.group('name')
+                if (name == 'location') != (len(stack) == 1) or len(stack) > 2:
+                    raise ValueError('A period block must be inside a location block, '
+                                     'and a location block must not be nested: ' + marker.group(0))
+                block = _Block(name, marker.group('attributes'))
+                stack[-1].parts.append(block)
+                stack.append(block)
+                if name == 'location':
+                    if self._location is not None:
+                        raise ValueError('Dashboard template has more than one location block')
+                    self._location = block
+            else:
+                if stack[-1].name != marker.group('end'):
+                    raise ValueError('Unexpected ' + marker.group(0))
+                stack.pop()
+        if len(stack) > 1:
+            raise ValueError('Unclosed %s block in dashboard template' % stack[-1].name)
+        self._add_literal(self._root, svg[position:])
+        if self._location is None:
+            raise ValueError('Dashboard template has no location block')
+
+    @staticmethod
+    def _add_literal(block, text):
+        slot_pattern = _DASHBOARD_SLOT if block.name != 'dashboard' else _PAGE_SIZE_SLOT
+        position = 0
+        for match in slot_pattern.finditer(text):
+            block.parts.append(text[position:match.start()])
+            block.parts.append((match.group(0),))
+            position = match.end()
+        block.parts.append(text[position:])
+
+    def render(self, forecasts, names=None, queries=None):
+        """Fills the template with the forecasts of several locations.
+
+        Args:
+            forecasts: list of Forecast objects, one for each location.
+            names: Display names of the locations (optional), filling
+                locationname.
+            queries: Request queries of the locations (optional), filling
+                locationquery.
+
+        Returns:
+            The populated SVG text.
+        """
+        from xml.sax.saxutils import escape
+
+        with instrument.stage('render'):
+            locations = list()
+            for index, forecast_obj in enumerate(forecasts):
+                values = {'locationname': escape(names[index]) if names else '',
+                          'locationquery': escape(queries[index]) if queries else ''}
+                locations.append((values, forecast_obj.ForecastDays))
+            step_x, step_y = self._location.step
+            extra = max(len(locations) - 1, 0)
+            page = {'dashboardwidth': '%g' % (self._size[0] + step_x * extra),
+                    'dashboardheight': '%g' % (self._size[1] + step_y * extra)}
+            output = list()
+            self._render_parts(self._root, page, locations, output)
+            return ''.join(output)
+
+    def _render_parts(self, block, values, items, output):
+        """Appends a block's parts to output, repeating nested blocks.
+
+        Args:
+            block: _Block whose parts to render.
+            values: dict of slot values for the block.
+            items: list of what the nested block repeats for: (location
+                values, ForecastDays) pairs in the dashboard block and
+                ForecastDays in the location block.
+            output: list the rendered text is appended to.
+        """
+        for part in block.parts:
+            if isinstance(part, tuple):
+                output.append(values.get(part[0], ''))
+            elif isinstance(part, _Block):
+                repeated = items if part.count is None else items[:part.count]
+                step_x, step_y = part.step
+                for index, item in enumerate(repeated):
+                    output.append('<g transform="translate(%g,%g)">' % (step_x * index, step_y * index))
+                    if part.name == 'location':
+                        self._render_parts(part, item[0], item[1], output)
+                    else:
+                        day_values = forecastday_values(item, self.text_boxes, 'N')
+                        day_values.update(values)
+                        self._render_parts(part, day_values, (), output)
+                    output.append('</g>')
+            else:
+                # literal text, str or (on Python 2) unicode
+                output.append(part)
+
+def load_dashboard_template(template_path=DASHBOARD_PATH):
+    """Gets a compiled dashboard template, compiling it if it is new or has changed.
+
+    A <!-- defs <path> --> comment in the template is replaced by the <defs>
+    of the SVG file at path (relative to the template), so the icons of
+    template.svg need not be copied into each dashboard template.
+
+    Args:
+        template_path: Path to the dashboard template.
+
+    Returns:
+        A DashboardTemplate for the template file.
+    """
+    cached = _dashboard_cache.get(template_path)
+    if cached is None or _mtimes(cached[0]) != cached[1]:
+        svg = codecs.open(template_path, 'r', encoding='utf-8').read()
+        defs_path = None
+        include = _DEFS_INCLUDE.search(svg)
+        if include is not None:
+            defs_path = os.path.join(os.path.dirname(os.path.abspath(template_path)), include.group('path'))
+            defs = _DEFS.search(codecs.open(defs_path, 'r', encoding='utf-8').read())
+            svg = svg[:include.start()] + (defs.group(0) if defs else '') + svg[include.end():]
+        css_path = _stylesheet_path(svg, template_path)
+        paths = (template_path, css_path, defs_path)
+        mtimes = _mtimes(paths)
+        cached = (paths, mtimes, DashboardTemplate(svg, mtimes[0], _read_stylesheet(css_path)))
+        _dashboard_cache[template_path] = cached
+    return cached[2]
+
+def render_dashboard(forecasts, names=None, template_path=DASHBOARD_PATH, queries=None):
+    """Populates a dashboard template with the forecasts of several locations.
+
+    Args:
+        forecasts: list of Forecast objects, one for each location.
+        names: Display names of the locations (optional).
+        template_path: Path to the dashboard template.
+        queries: Request queries of the locations (optional).
+
+    Returns:
+        The populated SVG text.
+    """
+    return load_dashboard_template(template_path).render(forecasts, names, queries)
+
+def write_dashboard(forecasts, output_path='dashboard.svg', names=None, template_path=DASHBOARD_PATH,
+                    queries=None):
+    """Writes a dashboard SVG showing the forecasts of several locations.
+
+    Args:
+        forecasts: list of Forecast objects, one for each location.
+        output_path: Path of the SVG file to write.
+        names: Display names of the locations (optional).
+        template_path: Path to the dashboard template.
+        queries: Request queries of the locations (optional).
+
+    Returns:
+        None.
+    """
+    _write_atomic(output_path, render_dashboard(forecasts, names, template_path, queries))
+
+def _write_atomic(output_path, output):
+    """Writes an SVG file with atomicfile.write, recording it as a write stage.
+
+    Args:
+        output_path: Path of the file to write.
+        output: Text to write (encoded as UTF-8), or bytes.
+
+    Returns:
+        None.
+    """
+    with instrument.stage('write') as measured:
+        measured.add_bytes(atomicfile.write(output_path, output, suffix='.svg'))
+
+RenderResult = namedtuple('RenderResult', 'output_path error seconds cached')
+RenderResult.__doc__ = """Outcome of one write_forecasts job.
+
+Attributes:
+    output_path: The SVG file the job wrote.
+    error: Description of the exception raised by the job, or None.
+    seconds: Wall time the worker spent on the job.
+    cached: Whether the SVG was taken from the RenderCache.
+"""
+
+def write_forecasts(jobs, processes=None, chunksize=8, template_path=TEMPLATE_PATH, cache=None):
+    """Writes many forecast SVGs, spreading the jobs over a process pool.
+
+    Each worker process compiles the template once.  Jobs are sent to the
+    workers in chunks to keep inter-process overhead low, and results are
+    yielded as each job finishes; a failed job does not stop the others.
+
+    Args:
+        jobs: Iterable of (Forecast, output_path) tuples.  Forecast objects
+            are pickled to the workers.
+        processes: Number of worker processes (defaults to the CPU count).
+        chunksize: Number of jobs sent to a worker at a time.
+        template_path: Path to the SVG template.
+        cache: RenderCache to reuse identical renders from (optional).
+            Each worker opens its own RenderCache on the same directory,
+            so the stats of this object are not updated; count the cached
+            results instead.
+
+    Yields:
+        RenderResult objects, in completion order.
+    """
+    import multiprocessing
+
+    pool = multiprocessing.Pool(processes, _init_render_worker, (template_path, cache))
+    try:
+        for result in pool.imap_unordered(_render_job, jobs, chunksize):
+            yield result
+    except BaseException:
+        # an error, or the caller stopped early (GeneratorExit): drop the
+        # jobs still queued
+        pool.terminate()
+        pool.join()
+        raise
+    # let the workers exit once their queue is empty
+    pool.close()
+    pool.join()
+
+_worker_template_path = TEMPLATE_PATH
+_worker_cache = None
+
+def _init_render_worker(template_path, cache=None):
+    """Compiles the template once when a write_forecasts worker starts."""
+    global _worker_template_path, _worker_cache
+    _worker_template_path = template_path
+    _worker_cache = cache
+    load_template(template_path)
+
+def _render_job(job):
+    """Runs one write_forecasts job in a worker process."""
+    forecast_obj, output_path = job
+    start = time.time()
+    try:
+        cached = write_forecast(forecast_obj, output_path, _worker_template_path, _worker_cache)
+    except Exception as error:
+        return RenderResult(output_path, '%s: %s' % (type(error).__name__, error), time.time() - start, False)
+    return RenderResult(output_path, None, time.time() - start, cached)
 
 def write_forecastday(svg, forecastday_obj):
     """Populates an opened SVG file with data from a ForecastDay object.
@@ -50,76 +971,153 @@ def write_forecastday(svg, forecastday_obj):
     Returns:
         The opened SVG file with newly populated data.
     """
+    for slot, value in forecastday_values(forecastday_obj).items():
+        svg = svg.replace(slot, value)
+    return svg
+
+def forecastday_values(forecastday_obj, boxes=None, period=None):
+    """Maps a ForecastDay object's data onto the SVG template's slots.
+
+    Args:
+        forecastday_obj: ForecastDay object containing data to populate.
+        boxes: dict of the template's TextBoxes (see
+            CompiledTemplate.text_boxes); defaults to TEXT_BOXES.
+        period: Period to name the slots for, e.g. 'N' for a dashboard's
+            period block (defaults to the ForecastDay's period).
+
+    Returns:
+        dict mapping slot names (e.g. period1high) to the text to insert.
+    """
     # Get the ForecastDay's position (period) in the Forecast
-    period = forecastday_obj.period
+    if period is None:
+        period = forecastday_obj.period
+    period = str(period)
+    values = dict()
 
     # Icons
-    svg = svg.replace('P' + period + 'I1', forecastday_obj.day_icon)
-    svg = svg.replace('P' + period + 'I2', forecastday_obj.night_icon)
+    values['P' + period + 'I1'] = forecastday_obj.day_icon
+    values['P' + period + 'I2'] = forecastday_obj.night_icon
 
     period = 'period' + period
 
     # Text
-    svg = svg.replace(period + 'title', forecastday_obj.forecast_date.strftime('%a %b %d'))
-    daytext = _clean_text(forecastday_obj.day_text)
-    nighttext = _clean_text(forecastday_obj.night_text, 40)
-    svg = svg.replace(period + 'daytext1', daytext[0])
-    svg = svg.replace(period + 'daytext2', daytext[1])
-    svg = svg.replace(period + 'nighttext1', nighttext[0])
-    svg = svg.replace(period + 'nighttext2', nighttext[1])
+    values[period + 'title'] = forecastday_obj.forecast_date.strftime('%a %b %d')
+    if boxes is None:
+        boxes = TEXT_BOXES
+    with instrument.stage('text'):
+        daytext = _clean_text(forecastday_obj.day_text, boxes.get('daytext', DAY_TEXT))
+        nighttext = _clean_text(forecastday_obj.night_text, boxes.get('nighttext', NIGHT_TEXT))
+    for line, text in enumerate(daytext, 1):
+        values[period + 'daytext' + str(line)] = text
+    for line, text in enumerate(nighttext, 1):
+        values[period + 'nighttext' + str(line)] = text
 
     # High, low, humidity
-    svg = svg.replace(period + 'high', str(forecastday_obj.high_F) + 'F')
-    svg = svg.replace(period + 'low', str(forecastday_obj.low_F) + 'F')
-    svg = svg.replace(period + 'humidity', str(forecastday_obj.humidity) + '%')
+    values[period + 'high'] = str(forecastday_obj.high_F) + 'F'
+    values[period + 'low'] = str(forecastday_obj.low_F) + 'F'
+    values[period + 'humidity'] = str(forecastday_obj.humidity) + '%'
 
     # Rain info
-    svg = svg.replace(period + 'dayrainchance', str(forecastday_obj.day_pop) + '%')
-    svg = svg.replace(period + 'nightrainchance', str(forecastday_obj.night_pop) + '%')
-    svg = svg.replace(period + 'dayrainamount', str(forecastday_obj.qpf_day_in) + '\"')
-    svg = svg.replace(period + 'nightrainamount', str(forecastday_obj.qpf_night_in) + '\"')
-    return svg
+    values[period + 'dayrainchance'] = str(forecastday_obj.day_pop) + '%'
+    values[period + 'nightrainchance'] = str(forecastday_obj.night_pop) + '%'
+    values[period + 'dayrainamount'] = str(forecastday_obj.qpf_day_in) + '\"'
+    values[period + 'nightrainamount'] = str(forecastday_obj.qpf_night_in) + '\"'
+    return values
 
-def _clean_text(forecast_text, break_length=65):
+def _clean_text(forecast_text, box=DAY_TEXT):
     """Cleans forecast text for display in SVG template
 
-    The API response contains plain english desciptions of the day's 
-    forecast.  These strings always contain a summary of the high,
+    The API response contains plain english desciptions of the day's
+    forecast.  These strings always end with a summary of the high,
     low, and wind speed/direction.  This information is captured in
-    other attributes of the ForecastDay class.  Also, the forecast
-    text is often too long to display on one line in the SVG
-    template, so this method splits long lines into an array of two
-    lines.
+    other attributes of the ForecastDay class, so the text is cut at
+    the first sentence starting with High, Low or Winds.  Also, the
+    forecast text is often too long to display on one line in the SVG
+    template, so it is wrapped to fit the box (see _wrap_text and
+    ELLIPSIZE_TEXT).
+
+    Descriptions repeat across days and locations, so results are kept
+    in a bounded cache.
 
     Args:
         forecast_text: Long, verbose string of forecast text to clean.
-        break_length: Position to look for whitespace to break the line.
+        box: TextBox the text is displayed in.
 
     Returns:
-        A 2-element array containing cleaned forecast text.
+        A tuple of box.lines lines of cleaned forecast text.
     """
-    new_end = forecast_text.find('High')
-    if new_end == -1:
-        new_end = forecast_text.find('Low')
-    if new_end > -1:
-        forecast_text = forecast_text[:new_end - 1]
-    return _wrap_text(forecast_text, break_length)
+    ellipsis = ELLIPSIZE_TEXT
+    key = (forecast_text, box, ellipsis)
+    with _text_lock:
+        lines = _text_cache.pop(key, None)
+        if lines is not None:
+            _text_cache[key] = lines
+            return lines
+    summary = _SUMMARY_CLAUSES.search(forecast_text)
+    if summary is not None:
+        forecast_text = forecast_text[:summary.start()]
+    lines = _wrap_text(forecast_text, box, ellipsis)
+    with _text_lock:
+        _text_cache[key] = lines
+        while len(_text_cache) > _TEXT_CACHE_ENTRIES:
+            _text_cache.popitem(last=False)
+    return lines
 
-def _wrap_text(forecast_text, break_length):
-    """Splits a long line of text into two lines
+def _wrap_text(forecast_text, box, ellipsis=False):
+    """Splits a long line of text into lines that fit a box
+
+    Words are laid out greedily using approximate widths of the template's
+    font (Verdana's; see _ADVANCES).  Text that does not fit in box.lines
+    lines is left on the last line, or with ellipsis is cut at a word and
+    ends with an ellipsis.
 
     Args:
-        forecast_text: Long string of forecast text to split into 2 lines.
-        break_length: Position to look for whitespace to break the line.
+        forecast_text: Long string of forecast text to split.
+        box: TextBox the text is displayed in.
+        ellipsis: Whether to cut text that does not fit short.
+
     Returns:
-        A 2-element array containing forecast text.
+        A tuple of box.lines lines of forecast text ('' for unused lines).
     """
-    wrapped_text = ['', '']
-    if len(forecast_text) <= break_length:
-        # Don't wrap short strings
-        wrapped_text[0] = forecast_text
-    else:
-        br = forecast_text.find(' ', break_length)
-        wrapped_text[0] = forecast_text[:br]
-        wrapped_text[1] = forecast_text[br:]
-    return wrapped_text
\ No newline at end of file
+    # widths in font units, so the box is scaled rather than every word
+    max_width = box.width * _UNITS_PER_EM / box.font_size
+    space = _ADVANCES[' ']
+    words = forecast_text.split()
+    lines = list()
+    line = list()
+    line_width = 0
+    for index, word in enumerate(words):
+        word_width = _text_width(word)
+        if line and line_width + space + word_width > max_width:
+            if len(lines) == box.lines - 1:
+                if ellipsis:
+                    lines.append(_ellipsize(line + words[index:], max_width))
+                else:
+                    lines.append(' '.join(line + words[index:]))
+                line = None
+                break
+            lines.append(' '.join(line))
+            line = [word]
+            line_width = word_width
+        else:
+            line_width += space + word_width if line else word_width
+            line.append(word)
+    if line:
+        lines.append(' '.join(line))
+    return tuple(lines) + ('',) * (box.lines - len(lines))
+
+def _ellipsize(words, max_width):
+    """Joins as many words as fit in max_width font units with an ellipsis."""
+    budget = max_width - _ADVANCES[_ELLIPSIS]
+    count = 0
+    width = -_ADVANCES[' ']
+    for word in words:
+        width += _ADVANCES[' '] + _text_width(word)
+        if width > budget:
+            break
+        count += 1
+    return ' '.join(words[:max(count, 1)]) + _ELLIPSIS
+
+def _text_width(text):
+    """Gets the advance width of text in font units."""
+    return sum(_ADVANCES.get(char, _DEFAULT_ADVANCE) for char in text)
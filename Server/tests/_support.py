@@ -0,0 +1,31 @@
+"""Helpers shared by the PyWeather tests.
+
+Tests are run from the Server directory, e.g.:
+
+    python -m pytest tests
+    python -m unittest discover tests
+
+They use the recorded API responses in benchmarks/fixtures and need no
+network access.
+"""
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(TEST_DIR)
+FIXTURE_DIR = os.path.join(SERVER_DIR, 'benchmarks', 'fixtures')
+TEMPLATE_PATH = os.path.join(SERVER_DIR, 'template.svg')
+DASHBOARD_PATH = os.path.join(SERVER_DIR, 'dashboard.svg')
+
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+def read_fixture(name):
+    """Reads a recorded fixture (e.g. forecast.xml) as bytes."""
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as fixture:
+        return fixture.read()
+
+def load_forecast(name='forecast.xml', parser='dom'):
+    """Builds a Forecast object from a recorded API response."""
+    import forecastdata
+    return forecastdata.Forecast.from_response(read_fixture(name), parser)
@@ -0,0 +1,214 @@
+"""Tests for apirequest.HTTPClient against a local stub API server, and for
+the response caches."""
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from _support import read_fixture
+
+import apirequest
+import stubapi
+
+class _ClosedFile(io.BytesIO):
+    """A file whose writes fail, to fail a download part way through."""
+    def write(self, data):
+        raise ValueError('write failed')
+
+class HTTPClientTest(unittest.TestCase):
+    def setUp(self):
+        self.forecast = read_fixture('forecast.xml')
+        self.stub = stubapi.StubAPIServer({'forecast': self.forecast,
+                                           'animatedradar': read_fixture('radar.gif')}).start()
+        self.url = apirequest._get_url('forecast', 'MO/St_Louis')
+        self.client = apirequest.HTTPClient(max_connections=1, retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_reuses_one_connection(self):
+        for i in range(10):
+            self.assertEqual(self.client.get(self.url), self.forecast)
+        self.assertEqual(self.stub.counters['requests'], 10)
+        self.assertEqual(self.stub.counters['connections'], 1)
+
+    def test_retries_503(self):
+        self.stub.failures = 2
+        self.assertEqual(self.client.get(self.url), self.forecast)
+        self.assertEqual(self.stub.counters['requests'], 3)
+
+    def test_gives_up_after_retries(self):
+        self.stub.failures = 3
+        with self.assertRaises(apirequest.HTTPError) as raised:
+            self.client.get(self.url)
+        self.assertEqual(raised.exception.status, 503)
+
+    def test_recovers_from_stale_keep_alive(self):
+        self.stub.drop_connections = True
+        for i in range(3):
+            self.assertEqual(self.client.get(self.url), self.forecast)
+        self.assertEqual(self.stub.counters['requests'], 3)
+        self.assertEqual(self.stub.counters['connections'], 3)
+
+    def test_closes_connection_on_failed_read(self):
+        opened = list()
+        connect = self.client._connect
+
+        def record(key):
+            connection = connect(key)
+            opened.append(connection)
+            return connection
+        self.client._connect = record
+
+        radar_url = apirequest._get_url('animatedradar', 'MO/St_Louis', 'gif')
+        with self.assertRaises(ValueError):
+            self.client.download(radar_url, _ClosedFile())
+        self.assertEqual(len(opened), 1)
+        self.assertIsNone(opened[0].sock)
+        self.assertEqual(self.client._idle.get(('http', self.url.split('/')[2])) or [], [])
+        # the connection's slot was released (max_connections is 1)
+        self.assertEqual(self.client.get(self.url), self.forecast)
+
+class RadarDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.radar = read_fixture('radar.gif')
+        self.stub = stubapi.StubAPIServer({'animatedradar': self.radar}).start()
+        self.client = apirequest.HTTPClient(retries=0)
+        self.directory = tempfile.mkdtemp(prefix='pyweather-radar-')
+        self.path = os.path.join(self.directory, 'radar.gif')
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+        shutil.rmtree(self.directory)
+        apirequest._radar_validators.clear()
+
+    def _download(self):
+        return apirequest.radar_download('MO/St_Louis', self.path, client=self.client)
+
+    def _read(self):
+        with open(self.path, 'rb') as radar:
+            return radar.read()
+
+    def test_conditional_download(self):
+        self.assertEqual(self._download(), (True, len(self.radar)))
+        self.assertEqual(self._read(), self.radar)
+        version = apirequest._file_version(self.path)
+        self.assertEqual(self._download(), (False, 0))
+        # the 304 left the file untouched
+        self.assertEqual(apirequest._file_version(self.path), version)
+        self.assertEqual(os.listdir(self.directory), ['radar.gif'])
+
+    def test_unconditional_for_a_file_written_elsewhere(self):
+        self._download()
+        with open(self.path, 'wb') as radar:
+            radar.write(b'written by another process')
+        self.assertEqual(self._download(), (True, len(self.radar)))
+        self.assertEqual(self._read(), self.radar)
+        # a file this process did not download is not trusted either
+        apirequest._radar_validators.clear()
+        self.assertTrue(self._download().modified)
+
+    def test_error_leaves_no_temp_file(self):
+        self._download()
+        self.stub.responses = {}
+        with self.assertRaises(apirequest.HTTPError):
+            self._download()
+        self.assertEqual(os.listdir(self.directory), ['radar.gif'])
+        self.assertEqual(self._read(), self.radar)
+
+    def test_validators_are_bounded(self):
+        entries = apirequest._RADAR_VALIDATOR_ENTRIES
+        apirequest._RADAR_VALIDATOR_ENTRIES = 2
+        try:
+            for name in ('1.gif', '2.gif', '3.gif'):
+                apirequest.radar_download('MO/St_Louis', os.path.join(self.directory, name), client=self.client)
+            self.assertEqual([os.path.basename(path) for path in apirequest._radar_validators],
+                             ['2.gif', '3.gif'])
+        finally:
+            apirequest._RADAR_VALIDATOR_ENTRIES = entries
+
+class _Clock(object):
+    """A clock that only moves when told to."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.directory = tempfile.mkdtemp(prefix='pyweather-cache-')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _caches(self, **kwargs):
+        return [apirequest.MemoryCache(clock=self.clock, **kwargs),
+                apirequest.DiskCache(self.directory, clock=self.clock, **kwargs)]
+
+    def test_is_abstract(self):
+        with self.assertRaises(TypeError):
+            apirequest.ResponseCache()
+
+    def test_expires_after_feature_ttl(self):
+        for cache in self._caches(ttl=60, feature_ttls={'animatedradar': 10}):
+            cache.put(('forecast', 'a'), b'forecast')
+            cache.put(('animatedradar', 'a'), b'radar')
+            self.clock.now += 30
+            self.assertEqual(cache.get(('forecast', 'a')), b'forecast')
+            self.assertIsNone(cache.get(('animatedradar', 'a')))
+            self.assertEqual(cache.stats['expirations'], 1)
+            self.assertEqual((len(cache), cache.size), (1, len(b'forecast')))
+            cache.clear()
+
+    def test_evicts_least_recently_used(self):
+        for cache in self._caches(max_entries=2):
+            cache.put(('forecast', 'a'), b'a')
+            cache.put(('forecast', 'b'), b'b')
+            cache.get(('forecast', 'a'))
+            cache.put(('forecast', 'c'), b'c')
+            self.assertIsNone(cache.get(('forecast', 'b')))
+            self.assertEqual(cache.get(('forecast', 'a')), b'a')
+            self.assertEqual(cache.stats['evictions'], 1)
+            cache.clear()
+
+    def test_disk_cache_reloads_its_index(self):
+        cache = apirequest.DiskCache(self.directory, clock=self.clock)
+        cache.put(('forecast', 'a'), b'forecast')
+        reloaded = apirequest.DiskCache(self.directory, clock=self.clock)
+        self.assertEqual(reloaded.get(('forecast', 'a')), b'forecast')
+        self.assertEqual(reloaded.size, len(b'forecast'))
+
+    def test_coalesces_concurrent_fetches(self):
+        cache = apirequest.MemoryCache(clock=self.clock)
+        started = threading.Event()
+        release = threading.Event()
+        fetches = list()
+        def fetch():
+            fetches.append(1)
+            started.set()
+            release.wait(5)
+            return b'body'
+        bodies = list()
+        leader = threading.Thread(target=lambda: bodies.append(cache.get_or_fetch(('forecast', 'a'), fetch)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: bodies.append(cache.get_or_fetch(('forecast', 'a'), fetch)))
+        follower.start()
+        while not cache.stats['coalesced']:
+            follower.join(0.01)
+        # a cache hit does not wait on the fetch in progress
+        cache.put(('forecast', 'b'), b'other')
+        self.assertEqual(cache.get(('forecast', 'b')), b'other')
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual((bodies, len(fetches)), ([b'body', b'body'], 1))
+
+if __name__ == '__main__':
+    unittest.main()
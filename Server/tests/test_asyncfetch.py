@@ -0,0 +1,41 @@
+"""Tests for asyncfetch against a local stub API server."""
+import unittest
+
+from _support import read_fixture
+
+import apirequest
+import asyncfetch
+import stubapi
+
+class FetchForecastsTest(unittest.TestCase):
+    def test_fetches_every_location(self):
+        with stubapi.StubAPIServer({'forecast': read_fixture('forecast.xml')}):
+            results = asyncfetch.fetch_all_forecasts(['63167', '63105', 'MO/St_Louis'], concurrency=2)
+        self.assertEqual(sorted(result.query for result in results), ['63105', '63167', 'MO/St_Louis'])
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(len(result.value.ForecastDays), 4)
+
+    def test_one_failure_does_not_stop_the_rest(self):
+        with stubapi.StubAPIServer({'forecast': read_fixture('forecast.xml')}) as stub:
+            stub.unknown_queries.add('00000')
+            results = asyncfetch.fetch_all_forecasts(['63167', '00000', '63105', 'MO/St_Louis'],
+                                                     concurrency=2)
+        self.assertEqual(sorted(result.query for result in results), ['00000', '63105', '63167', 'MO/St_Louis'])
+        for result in results:
+            if result.query == '00000':
+                self.assertIsInstance(result.error, apirequest.HTTPError)
+                self.assertEqual(result.error.status, 404)
+                self.assertIsNone(result.value)
+            else:
+                self.assertIsNone(result.error)
+                self.assertEqual(len(result.value.ForecastDays), 4)
+
+    def test_unknown_parser_raises_once(self):
+        with stubapi.StubAPIServer({'forecast': read_fixture('forecast.xml')}) as stub:
+            with self.assertRaises(ValueError):
+                asyncfetch.fetch_all_forecasts(['63167', '63105'], parser='sax')
+            self.assertEqual(stub.counters['requests'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
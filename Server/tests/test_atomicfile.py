@@ -0,0 +1,54 @@
+"""Tests for atomicfile."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import _support
+
+import atomicfile
+
+class AtomicFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-atomic-')
+        self.path = os.path.join(self.directory, 'forecast.svg')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read(self, path):
+        with open(path, 'rb') as written:
+            return written.read()
+
+    def test_write_replaces_and_keeps_mode(self):
+        self.assertEqual(atomicfile.write(self.path, u'café'), 5)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+        os.chmod(self.path, 0o600)
+        atomicfile.write(self.path, b'new', suffix='.svg')
+        self.assertEqual(self._read(self.path), b'new')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.listdir(self.directory), ['forecast.svg'])
+
+    def test_failed_or_discarded_write_leaves_file(self):
+        atomicfile.write(self.path, b'old')
+        with self.assertRaises(ValueError):
+            with atomicfile.AtomicWriter(self.path) as writer:
+                writer.file.write(b'partial')
+                raise ValueError('failed')
+        with atomicfile.AtomicWriter(self.path) as writer:
+            writer.file.write(b'unchanged')
+            writer.discard()
+        self.assertEqual(self._read(self.path), b'old')
+        self.assertEqual(os.listdir(self.directory), ['forecast.svg'])
+
+    def test_link(self):
+        source = os.path.join(self.directory, 'cached.svg')
+        atomicfile.write(source, b'cached')
+        atomicfile.write(self.path, b'old')
+        atomicfile.link(source, self.path)
+        atomicfile.link(source, self.path)
+        self.assertEqual(self._read(self.path), b'cached')
+        self.assertEqual(sorted(os.listdir(self.directory)), ['cached.svg', 'forecast.svg'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""Tests for the unit converters in convert."""
+from array import array
+import unittest
+
+import _support
+
+import convert
+
+class ConvertTest(unittest.TestCase):
+    def test_scalars_convert_to_scalars(self):
+        self.assertEqual(convert.Temperature.f_to_c(212), 100)
+        self.assertAlmostEqual(convert.Speed.mph_to_kph(10.0), 16.09344)
+
+    def test_columns_convert_to_arrays(self):
+        for column in ([32, 212], array('d', [32, 212]), memoryview(array('d', [32, 212]))):
+            converted = convert.Temperature.f_to_c(column)
+            self.assertEqual(list(converted), [0.0, 100.0])
+
+    def test_strings_raise(self):
+        for text in ('72', b'72'):
+            with self.assertRaises(TypeError):
+                convert.Temperature.f_to_c(text)
+
+    def test_numpy_scalars_convert_to_scalars(self):
+        numpy = convert._get_numpy()
+        if not numpy:
+            self.skipTest('NumPy is not installed')
+        for value in (numpy.int64(212), numpy.float32(212)):
+            converted = convert.Temperature.f_to_c(value)
+            self.assertEqual(numpy.ndim(converted), 0)
+            self.assertAlmostEqual(float(converted), 100.0)
+        self.assertEqual(list(convert.Temperature.f_to_c(numpy.array([32.0, 212.0]))), [0.0, 100.0])
+
+if __name__ == '__main__':
+    unittest.main()
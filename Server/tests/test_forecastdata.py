@@ -0,0 +1,95 @@
+"""Tests for the forecastdata response parsers and ForecastTable."""
+import unittest
+
+from _support import load_forecast, read_fixture
+
+import apirequest
+import forecastdata
+import stubapi
+
+def _attributes(forecast):
+    """Gets every ForecastDay attribute of a Forecast, day by day."""
+    names = forecastdata.ForecastDay.__slots__ + tuple(sorted(forecastdata.METRIC_FIELDS))
+    return [dict((name, getattr(day, name)) for name in names) for day in forecast.ForecastDays]
+
+class ParserTest(unittest.TestCase):
+    def _assert_equivalent(self, response, days):
+        expected = _attributes(forecastdata.Forecast.from_response(response, 'dom'))
+        self.assertEqual(len(expected), days)
+        streamed = _attributes(forecastdata.Forecast.from_response(response, 'stream'))
+        for day, (stream_day, dom_day) in enumerate(zip(streamed, expected)):
+            self.assertEqual(stream_day, dom_day, 'day %d' % (day + 1))
+        self.assertEqual(len(streamed), len(expected))
+        return expected
+
+    def test_stream_matches_dom(self):
+        self._assert_equivalent(read_fixture('forecast.xml'), 4)
+
+    def test_stream_matches_dom_for_10_days(self):
+        self._assert_equivalent(read_fixture('forecast10day.xml'), 10)
+
+    def test_self_closing_elements(self):
+        response = read_fixture('forecast10day.xml')
+        expected = forecastdata.Forecast.from_response(response, 'dom')
+        day = [day.qpf_allday_in for day in expected.ForecastDays].index(0.67)
+        # the first 0.67 is that day's qpf_allday
+        days = self._assert_equivalent(response.replace(b'<in>0.67</in>', b'<in/>', 1), 10)
+        # a self closing tag reads as 0.0
+        self.assertEqual(days[day]['qpf_allday_in'], 0.0)
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            forecastdata.Forecast.from_response(read_fixture('forecast.xml'), 'sax')
+
+class RequestTest(unittest.TestCase):
+    def test_json_matches_dom(self):
+        with stubapi.StubAPIServer({'forecast': read_fixture('forecast.xml')}) as stub:
+            expected = _attributes(forecastdata.Forecast('MO/St_Louis', parser='dom'))
+            stub.responses['forecast'] = read_fixture('forecast.json')
+            decoded = _attributes(forecastdata.Forecast('MO/St_Louis', parser='json'))
+            self.assertEqual([request[2] for request in stub.requested], ['xml', 'json'])
+        self.assertEqual(len(expected), 4)
+        self.assertEqual(decoded, expected)
+        self.assertIsNotNone(apirequest._json_loads)
+
+class ForecastTableTest(unittest.TestCase):
+    def setUp(self):
+        self.forecasts = {'MO/St_Louis': load_forecast('forecast.xml'),
+                          'KS/Wichita': load_forecast('forecast10day.xml')}
+        self.table = forecastdata.ForecastTable()
+        for location in sorted(self.forecasts):
+            self.table.append(location, self.forecasts[location])
+
+    def test_append(self):
+        self.assertEqual(len(self.table), 14)
+        self.assertEqual(self.table.locations, {'KS/Wichita': list(range(10)),
+                                                'MO/St_Louis': list(range(10, 14))})
+        self.assertEqual(self.table[-1].day_text, self.forecasts['MO/St_Louis'].ForecastDays[-1].day_text)
+        with self.assertRaises(IndexError):
+            self.table[14]
+
+    def test_rows_match_forecast_days(self):
+        for location, forecast in self.forecasts.items():
+            rows = self.table.forecast(location).ForecastDays
+            self.assertEqual(_attributes(self.table.forecast(location)), _attributes(forecast))
+            self.assertEqual(len(rows), len(forecast.ForecastDays))
+            self.assertTrue(all(isinstance(row, forecastdata.ForecastRow) for row in rows))
+        with self.assertRaises(AttributeError):
+            self.table[0].nonexistent
+
+    def test_columns(self):
+        days = self.forecasts['KS/Wichita'].ForecastDays + self.forecasts['MO/St_Louis'].ForecastDays
+        self.assertEqual(list(self.table.column('high_F')), [day.high_F for day in days])
+        self.assertEqual(list(self.table.column('epoch')), [day.epoch for day in days])
+        self.assertEqual(list(self.table.metric_column('high_C')), [day.high_C for day in days])
+        with self.assertRaises(ValueError):
+            self.table.column('day_icon')
+
+    def test_dates_are_stored_as_the_api_epoch(self):
+        day = self.forecasts['MO/St_Louis'].ForecastDays[0]
+        self.assertEqual(day.epoch, int(read_fixture('forecast.xml').split(b'<epoch>')[1].split(b'<')[0]))
+        self.assertEqual(self.table[10].epoch, day.epoch)
+        self.assertEqual(self.table[10].forecast_date, day.forecast_date)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests for history.ForecastHistory."""
+import threading
+import unittest
+
+from _support import load_forecast
+
+import history
+
+class ForecastHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.forecast = load_forecast()
+        self.date = self.forecast.ForecastDays[0].forecast_date
+        self.store = history.ForecastHistory(':memory:', batch_size=10)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_latest(self):
+        self.store.add('63122', self.forecast, 100.0)
+        self.store.add('63122', self.forecast, 200.0)
+        fetched, forecast = self.store.latest('63122')
+        self.assertEqual((fetched, len(forecast.ForecastDays)), (200.0, 4))
+        self.assertIsNone(self.store.latest('63105'))
+
+    def test_for_date_limits_fetches_not_rows(self):
+        # three locations fetched together at each of four times
+        self.store.add_many((location, self.forecast, fetched)
+                            for fetched in (100.0, 200.0, 300.0, 400.0)
+                            for location in ('63105', '63122', '63167'))
+        days = self.store.for_date(self.date, last=2)
+        self.assertEqual([(location, fetched) for location, fetched, day in days],
+                         [('63105', 400.0), ('63122', 400.0), ('63167', 400.0),
+                          ('63105', 300.0), ('63122', 300.0), ('63167', 300.0)])
+        days = self.store.for_date(self.date, '63122', last=3)
+        self.assertEqual([fetched for location, fetched, day in days], [400.0, 300.0, 200.0])
+        self.assertEqual(days[0][2].forecast_date, self.date)
+
+    def test_shared_between_threads(self):
+        def add(location):
+            for fetched in range(20):
+                self.store.add(location, self.forecast, float(fetched))
+                self.store.latest(location)
+        threads = [threading.Thread(target=add, args=('%d' % (63100 + i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.store), 4 * 20 * 4)
+
+    def test_compact(self):
+        self.store.add('63122', self.forecast, 100.0)
+        self.store.add('63122', self.forecast, 200.0)
+        self.assertEqual(self.store.compact(150, now=300.0), 4)
+        self.assertEqual(len(self.store), 4)
+
+if __name__ == '__main__':
+    unittest.main()
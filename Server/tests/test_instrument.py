@@ -0,0 +1,68 @@
+"""Tests for instrument.Histogram and the Recorder's Prometheus export."""
+import re
+import unittest
+
+import _support
+
+import instrument
+
+# Matches a pyweather_stage_seconds_bucket line, capturing le and the count.
+_BUCKET = re.compile(r'^pyweather_stage_seconds_bucket\{stage="parse",le="([^"]+)"\} (\d+)$')
+
+class HistogramTest(unittest.TestCase):
+    def test_quantiles_are_within_one_bucket(self):
+        histogram = instrument.Histogram()
+        # 1 ms to 1 s in 1 ms steps, shuffled by a fixed stride
+        for index in range(1000):
+            histogram.add(((index * 389) % 1000 + 1) / 1000.0)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.total, 500.5)
+        self.assertEqual((histogram.minimum, histogram.maximum), (0.001, 1.0))
+        for q, expected in ((0.5, 0.5), (0.95, 0.95), (0.99, 0.99)):
+            estimate = histogram.quantile(q)
+            self.assertTrue(expected / instrument.Histogram.GROWTH <= estimate
+                            <= expected * instrument.Histogram.GROWTH, (q, estimate))
+
+    def test_single_value(self):
+        histogram = instrument.Histogram()
+        self.assertIsNone(histogram.quantile(0.5))
+        histogram.add(0.25)
+        self.assertEqual(histogram.quantile(0.5), 0.25)
+        self.assertEqual(histogram.quantile(0.99), 0.25)
+
+    def test_cumulative(self):
+        histogram = instrument.Histogram()
+        for value in (0.0001, 0.003, 0.003, 0.2, 4.0):
+            histogram.add(value)
+        self.assertEqual(histogram.cumulative((0.001, 0.01, 0.1, 1.0, 10.0)), [1, 3, 3, 4, 5])
+
+class PrometheusTest(unittest.TestCase):
+    def setUp(self):
+        self.recorder = instrument.Recorder()
+        for seconds in [0.003] * 10 + [0.3] * 5 + [60.0]:
+            self.recorder.record('parse', seconds, nbytes=100)
+
+    def test_buckets(self):
+        lines = self.recorder.prometheus().splitlines()
+        self.assertIn('# TYPE pyweather_stage_seconds histogram', lines)
+        buckets = [_BUCKET.match(line).groups() for line in lines if _BUCKET.match(line)]
+        bounds = [bound for bound, count in buckets]
+        counts = [int(count) for bound, count in buckets]
+        self.assertEqual(bounds, ['%g' % bound for bound in instrument.PROMETHEUS_BUCKETS] + ['+Inf'])
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(dict(buckets)['0.005'], '10')
+        self.assertEqual(dict(buckets)['0.5'], '15')
+        self.assertEqual(counts[-2:], [15, 16])
+        self.assertIn('pyweather_stage_seconds_count{stage="parse"} 16', lines)
+        total = [line for line in lines if line.startswith('pyweather_stage_seconds_sum{stage="parse"} ')]
+        self.assertEqual(len(total), 1)
+        self.assertAlmostEqual(float(total[0].split()[-1]), 61.53)
+        self.assertIn('pyweather_stage_bytes_total{stage="parse"} 1600', lines)
+
+    def test_prefix(self):
+        text = self.recorder.prometheus('weather')
+        self.assertIn('weather_stage_seconds_bucket{stage="parse",le="+Inf"} 16\n', text)
+        self.assertNotIn('pyweather', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+"""Tests for raster, using a fake rasterizer in place of cairosvg."""
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+from _support import SERVER_DIR, TEMPLATE_PATH, load_forecast
+
+import raster
+import svgmanip
+
+WIDTH, HEIGHT = 16, 12
+
+def _pixel(red, green, blue, alpha=255):
+    """Packs one cairo ARGB32 pixel in native byte order."""
+    return struct.pack('=I', alpha << 24 | red << 16 | green << 8 | blue)
+
+class _FakeRasterizer(object):
+    """Draws a white page, and every icon as a 3x2 black block whose right
+    column is half transparent."""
+    def __init__(self):
+        self.calls = list()
+
+    def __call__(self, svg, width=None, height=None, background='white'):
+        self.calls.append(background)
+        if background is not None:
+            return width, height, _pixel(255, 255, 255) * (width * height)
+        pixels = [_pixel(0, 0, 0, 0)] * (width * height)
+        for y in (4, 5):
+            for x in (2, 3, 4):
+                pixels[y * width + x] = _pixel(0, 0, 0, 128 if x == 4 else 255)
+        return width, height, b''.join(pixels)
+
+def _decode_png(png):
+    """Decodes a grayscale PNG written by encode_png.
+
+    Returns:
+        (GrayImage of its samples, oFFs offset or None).
+    """
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    position = 8
+    chunks = dict()
+    while position < len(png):
+        length, = struct.unpack('>I', png[position:position + 4])
+        kind = png[position + 4:position + 8]
+        data = png[position + 8:position + 8 + length]
+        crc, = struct.unpack('>I', png[position + 8 + length:position + 12 + length])
+        assert crc == zlib.crc32(kind + data) & 0xFFFFFFFF
+        chunks[kind] = data
+        position += 12 + length
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', chunks[b'IHDR'][:10])
+    assert color_type == 0
+    stride = (width * bit_depth + 7) // 8
+    raw = zlib.decompress(chunks[b'IDAT'])
+    samples = bytearray()
+    for row in range(height):
+        line = bytearray(raw[row * (stride + 1):(row + 1) * (stride + 1)])
+        assert line[0] == 0
+        if bit_depth == 8:
+            samples += line[1:]
+        else:
+            for byte in line[1:]:
+                samples += bytearray((byte >> 4, byte & 0x0F))
+            del samples[len(samples) - (2 * stride - width):]
+    offset = struct.unpack('>iiB', chunks[b'oFFs'])[:2] if b'oFFs' in chunks else None
+    return raster.GrayImage(width, height, bytes(samples)), offset
+
+def _image(width, height, pixels):
+    return raster.GrayImage(width, height, bytes(bytearray(pixels)))
+
+class GrayTest(unittest.TestCase):
+    def test_luma(self):
+        bgra = b''.join(_pixel(*color) for color in
+                        ((255, 255, 255), (0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255), (128, 128, 128)))
+        self.assertEqual(list(bytearray(raster._gray(bgra))), [255, 0, 76, 149, 28, 128])
+
+class EncodePNGTest(unittest.TestCase):
+    def test_8_bit_round_trip(self):
+        image = _image(5, 3, range(0, 255, 17))
+        self.assertEqual(_decode_png(raster.encode_png(image)), (image, None))
+
+    def test_4_bit_keeps_the_high_nibble(self):
+        # an odd width pads each row to a whole byte
+        image = _image(5, 3, range(0, 255, 17))
+        decoded, offset = _decode_png(raster.encode_png(image, 4, offset=(8, 2)))
+        self.assertEqual(decoded, _image(5, 3, [value >> 4 for value in range(0, 255, 17)]))
+        self.assertEqual(offset, (8, 2))
+
+    def test_rejects_other_bit_depths(self):
+        with self.assertRaises(ValueError):
+            raster.encode_png(_image(1, 1, [0]), 2)
+
+class ChangedRectTest(unittest.TestCase):
+    def setUp(self):
+        self.old = _image(32, 4, [255] * 128)
+
+    def test_no_previous_image_or_new_size(self):
+        self.assertEqual(raster.changed_rect(None, self.old), (0, 0, 32, 4))
+        self.assertEqual(raster.changed_rect(_image(8, 4, [255] * 32), self.old), (0, 0, 32, 4))
+
+    def test_unchanged(self):
+        self.assertIsNone(raster.changed_rect(self.old, _image(32, 4, [255] * 128)))
+
+    def test_aligned_rect(self):
+        pixels = bytearray(self.old.pixels)
+        pixels[1 * 32 + 10] = 0
+        pixels[2 * 32 + 17] = 0
+        new = raster.GrayImage(32, 4, bytes(pixels))
+        self.assertEqual(raster.changed_rect(self.old, new), (8, 1, 16, 2))
+        self.assertEqual(raster.changed_rect(self.old, new, align=1), (10, 1, 8, 2))
+
+class RasterTemplateTest(unittest.TestCase):
+    def setUp(self):
+        with open(TEMPLATE_PATH) as template_file:
+            svg = template_file.read()
+        self.rasterizer = _FakeRasterizer()
+        self.template = raster.RasterTemplate(svg, WIDTH, HEIGHT, SERVER_DIR, rasterizer=self.rasterizer)
+        self.values = dict()
+        for day in load_forecast().ForecastDays:
+            self.values.update(svgmanip.forecastday_values(day, self.template.page.text_boxes))
+
+    def test_composites_cached_glyphs(self):
+        image = self.template.render(self.values)
+        expected = bytearray([255] * (WIDTH * HEIGHT))
+        for y in (4, 5):
+            expected[y * WIDTH + 2:y * WIDTH + 4] = b'\0\0'
+            # every icon is drawn at the same place, so the half transparent
+            # column is darkened once per icon
+            level = 255
+            for icon in self.template.icons:
+                level = (level * 127 + 127) // 255
+            expected[y * WIDTH + 4] = level
+        self.assertEqual(image, raster.GrayImage(WIDTH, HEIGHT, bytes(expected)))
+        icons = self.rasterizer.calls.count(None)
+        self.assertEqual(icons, len(set((slot, self.values[slot]) for slot in self.template.icons)))
+        self.template.render(self.values)
+        self.assertEqual(self.rasterizer.calls.count(None), icons)
+
+    def test_inlines_the_stylesheet(self):
+        self.assertNotIn('xml-stylesheet', self.template.page.render(self.values))
+        self.assertIn('<style type="text/css">', self.template.page.render(self.values))
+
+class WriteForecastPNGTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-raster-')
+        with open(TEMPLATE_PATH) as template_file:
+            svg = template_file.read()
+        raster._raster_templates[(TEMPLATE_PATH, WIDTH, HEIGHT)] = (
+            svgmanip.load_template(TEMPLATE_PATH).digest,
+            raster.RasterTemplate(svg, WIDTH, HEIGHT, SERVER_DIR, rasterizer=_FakeRasterizer()))
+        self.forecast = load_forecast()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        raster._raster_templates.clear()
+        raster._written.clear()
+
+    def _write(self, name, **kwargs):
+        return raster.write_forecast_png(self.forecast, os.path.join(self.directory, name), TEMPLATE_PATH,
+                                         WIDTH, HEIGHT, **kwargs)
+
+    def test_writes_only_changes(self):
+        diff_path = os.path.join(self.directory, 'diff.png')
+        self.assertEqual(self._write('forecast.png', bit_depth=4, diff_path=diff_path),
+                         (0, 0, WIDTH, HEIGHT))
+        self.assertIsNone(self._write('forecast.png', bit_depth=4, diff_path=diff_path))
+        with open(os.path.join(self.directory, 'forecast.png'), 'rb') as png:
+            image, offset = _decode_png(png.read())
+        self.assertEqual((image.width, image.height, image.pixels[0]), (WIDTH, HEIGHT, 15))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['diff.png', 'forecast.png'])
+
+    def test_remembers_a_bounded_number_of_images(self):
+        entries = raster._WRITTEN_ENTRIES
+        raster._WRITTEN_ENTRIES = 2
+        try:
+            for name in ('1.png', '2.png', '3.png'):
+                self._write(name, diff_path=os.path.join(self.directory, 'diff-' + name))
+            self.assertEqual(len(raster._written), 2)
+            # the evicted path is written in full again
+            self.assertEqual(self._write('1.png'), (0, 0, WIDTH, HEIGHT))
+            self.assertIsNone(self._write('1.png'))
+        finally:
+            raster._WRITTEN_ENTRIES = entries
+
+if __name__ == '__main__':
+    unittest.main()
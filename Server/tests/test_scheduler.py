@@ -0,0 +1,108 @@
+"""Tests for scheduler.RefreshScheduler against a local stub API."""
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from _support import SERVER_DIR, read_fixture
+
+import raster
+import scheduler
+import stubapi
+
+class _Scheduler(object):
+    """Stands in for a _CheckedScheduler after a run."""
+    def __init__(self, log, queue, now, failures=0):
+        self.log = log
+        self.stats = {'failures': failures, 'requests': sum(entry[2].cost for entry in log)}
+        self._queue = queue
+        self._clock = lambda: now
+
+class RefreshSchedulerTest(unittest.TestCase):
+    def test_imports_raster_and_spatial_lazily(self):
+        code = 'import sys, scheduler; print(sorted(set(sys.modules) & set(["raster", "spatial"])))'
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=SERVER_DIR)
+        self.assertEqual(output.decode().strip(), '[]')
+
+    def test_simulated_run_passes_its_checks(self):
+        self.assertEqual(scheduler.run_test(duration=1800, locations=10, requests_per_minute=10), [])
+        # locations first due after a short run ends are not counted as starved
+        self.assertEqual(scheduler.run_test(duration=600, locations=20, requests_per_minute=10), [])
+
+    def test_checks_catch_a_broken_run(self):
+        site = scheduler.Location('63122', 600, 'forecast.svg', 'radar.gif')
+        # three refreshes a second apart, the second early and out of order
+        starved = scheduler.Location('63105', 600, 'forecast.svg', 'radar.gif')
+        run = _Scheduler([(0.0, 0.0, site), (1.0, 5.0, site), (2.0, 2.0, site)],
+                         [(602.0, 0, site), (10.0, 1, starved)], 3600.0, failures=1)
+        problems = scheduler._check_run(run, requests_per_minute=2, connections=3, max_connections=1)
+        for expected in ('refreshes failed', 'exceeds the budget', 'early', 'out of order',
+                         'within its interval', 'waited', 'connections opened'):
+            self.assertTrue([problem for problem in problems if expected in problem], (expected, problems))
+
+    def test_checks_pass_a_paced_run(self):
+        site = scheduler.Location('63122', 600, 'forecast.svg', 'radar.gif')
+        run = _Scheduler([(600.0 * i, 600.0 * i, site) for i in range(5)], [(3000.0, 0, site)], 2990.0)
+        self.assertEqual(scheduler._check_run(run, 2, connections=1, max_connections=1), [])
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-refresh-')
+        self.stub = stubapi.StubAPIServer({'forecast': read_fixture('forecast.xml')}).start()
+        self.clock = scheduler.FakeClock(1000.0)
+        self.location = scheduler.Location('63122', 600, os.path.join(self.directory, 'forecast.svg'),
+                                           os.path.join(self.directory, 'radar.gif'),
+                                           png_path=os.path.join(self.directory, 'forecast.png'))
+        self.scheduler = scheduler.RefreshScheduler([self.location], clock=self.clock.time,
+                                                    sleep=self.clock.sleep)
+        self.pngs = list()
+        self.png_error = None
+        self._write_forecast_png = raster.write_forecast_png
+        raster.write_forecast_png = self._write_png
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        raster.write_forecast_png = self._write_forecast_png
+        self.stub.stop()
+        shutil.rmtree(self.directory)
+
+    def _write_png(self, forecast, output_path, diff_path=None):
+        """Stands in for raster.write_forecast_png, which needs cairosvg."""
+        if self.png_error is not None:
+            raise self.png_error
+        self.pngs.append(output_path)
+        with open(output_path, 'wb') as png:
+            png.write(b'png')
+
+    def test_radar_failure_does_not_fail_the_forecast(self):
+        # the stub has no radar image, so every radar download fails
+        self.scheduler.run_next()
+        self.assertTrue(os.path.exists(self.location.forecast_path))
+        self.assertEqual((self.scheduler.stats['refreshes'], self.scheduler.stats['failures'],
+                          self.scheduler.stats['radar_failures']), (1, 0, 1))
+
+    def test_png_is_retried_after_a_failure(self):
+        self.png_error = IOError('disk full')
+        self.scheduler.run_next()
+        self.assertEqual(self.scheduler.stats['failures'], 1)
+        self.png_error = None
+        self.scheduler.refresh(self.location)
+        # the SVG was already written, yet the PNG is written now
+        self.assertEqual(self.scheduler.stats['unchanged'], 1)
+        self.assertEqual(len(self.pngs), 1)
+        self.scheduler.refresh(self.location)
+        self.assertEqual(len(self.pngs), 1)
+
+    def test_missing_png_is_rewritten(self):
+        self.scheduler.refresh(self.location)
+        os.remove(self.location.png_path)
+        self.scheduler.refresh(self.location)
+        self.assertEqual(len(self.pngs), 2)
+        self.assertTrue(os.path.exists(self.location.png_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""Tests for the server.py command line against a local stub API."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from _support import TEMPLATE_PATH, read_fixture
+
+import server
+import stubapi
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-server-')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _main(self, stub, *args):
+        return server.main(['--api-root', stub.url, '--template', TEMPLATE_PATH,
+                            '--forecast', os.path.join(self.directory, 'forecast.svg'),
+                            '--radar', os.path.join(self.directory, 'radar.gif')] + list(args))
+
+    def test_writes_forecast_and_radar(self):
+        with stubapi.StubAPIServer({'forecast': read_fixture('forecast.xml'),
+                                    'animatedradar': read_fixture('radar.gif')}) as stub:
+            self.assertEqual(self._main(stub), 0)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['forecast.svg', 'radar.gif'])
+
+    def test_radar_finishes_when_the_forecast_fails(self):
+        # no forecast response, so the forecast request fails
+        with stubapi.StubAPIServer({'animatedradar': read_fixture('radar.gif')}) as stub:
+            with self.assertRaises(Exception):
+                self._main(stub)
+        self.assertEqual(os.listdir(self.directory), ['radar.gif'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Tests for the geohash functions and spatial.QueryCoalescer."""
+import unittest
+
+from _support import read_fixture
+
+import apirequest
+import forecastdata
+import spatial
+import stubapi
+
+class GeohashTest(unittest.TestCase):
+    def test_encode(self):
+        self.assertEqual(spatial.geohash_encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(spatial.geohash_encode(42.6, -5.6, 5), 'ezs42')
+
+    def test_bounds_contain_the_position(self):
+        (south, north), (west, east) = spatial.geohash_bounds('u4pruydqqvj')
+        self.assertTrue(south <= 57.64911 < north)
+        self.assertTrue(west <= 10.40744 < east)
+        self.assertEqual(spatial.geohash_encode(*spatial.geohash_center('ezs42'), precision=5), 'ezs42')
+
+    def test_neighbours(self):
+        (south, north), (west, east) = spatial.geohash_bounds('ezs42')
+        middle = ((south + north) / 2, (west + east) / 2)
+        step = 1e-9
+        neighbours = [spatial.geohash_encode(north + step, middle[1], 5),
+                      spatial.geohash_encode(middle[0], east + step, 5),
+                      spatial.geohash_encode(south - step, middle[1], 5),
+                      spatial.geohash_encode(middle[0], west - step, 5)]
+        self.assertEqual(neighbours, ['ezs48', 'ezs43', 'ezs40', 'ezefr'])
+        # each neighbour shares an edge with the cell
+        self.assertEqual(spatial.geohash_bounds('ezs48')[0][0], north)
+        self.assertEqual(spatial.geohash_bounds('ezs43')[1][0], east)
+        self.assertEqual(spatial.geohash_bounds('ezs40')[0][1], south)
+        self.assertEqual(spatial.geohash_bounds('ezefr')[1][1], west)
+
+class QueryCoalescerTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = stubapi.StubAPIServer({'forecast': read_fixture('forecast.xml')}).start()
+        self.coalescer = spatial.QueryCoalescer(precision=5)
+        apirequest.set_cache(apirequest.MemoryCache(ttl=3600))
+        apirequest.set_coalescer(self.coalescer)
+
+    def tearDown(self):
+        apirequest.set_cache(None)
+        apirequest.set_coalescer(None)
+        self.stub.stop()
+
+    def test_nearby_queries_share_one_fetch(self):
+        # about 100 m apart, in the same 4.9 km cell
+        forecastdata.Forecast('38.627000,-90.199000')
+        forecastdata.Forecast('38.627900,-90.199500')
+        self.assertEqual(self.stub.counters['requests'], 1)
+        self.assertEqual(len(self.coalescer.cells()), 1)
+        self.assertEqual(self.coalescer.fan_in, 2.0)
+
+    def test_distant_queries_are_fetched_separately(self):
+        forecastdata.Forecast('38.627000,-90.199000')
+        forecastdata.Forecast('39.099000,-94.578000')
+        forecastdata.Forecast('MO/St_Louis')
+        self.assertEqual(self.stub.counters['requests'], 3)
+        self.assertEqual([request[1] for request in self.stub.requested][2], 'MO/St_Louis')
+        self.assertEqual(len(self.coalescer.cells()), 2)
+
+    def test_remembers_a_bounded_number_of_queries(self):
+        coalescer = spatial.QueryCoalescer(precision=5, max_entries=3)
+        for index in range(10):
+            coalescer.canonical('forecast', '%d.0,%d.0' % (index, index))
+        self.assertEqual(len(coalescer), 3)
+        self.assertEqual(len(coalescer.cells()), 3)
+        self.assertEqual(coalescer.stats['evictions'], 7)
+
+if __name__ == '__main__':
+    unittest.main()
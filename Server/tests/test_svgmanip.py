@@ -0,0 +1,195 @@
+"""Tests for svgmanip."""
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from xml.etree import ElementTree
+
+from _support import DASHBOARD_PATH, TEMPLATE_PATH, load_forecast
+
+import svgmanip
+
+# A box wide enough that no text is wrapped or cut short.
+_WIDE = svgmanip.TextBox(10000, 16, 1)
+
+class CleanTextTest(unittest.TestCase):
+    def _clean(self, text):
+        return ' '.join(svgmanip._clean_text(text, _WIDE))
+
+    def test_drops_the_summary(self):
+        self.assertEqual(self._clean('Sunny skies. High 73F. Winds NNW at 5 to 10 mph.'), 'Sunny skies.')
+        self.assertEqual(self._clean('Partly cloudy. Low 52F. Winds light and variable.'), 'Partly cloudy.')
+        self.assertEqual(self._clean('Showers. Highs in the upper 60s and lows near 50F.'), 'Showers.')
+        self.assertEqual(self._clean('Bitter cold. Low -5F.'), 'Bitter cold.')
+        self.assertEqual(self._clean('Breezy. Winds W at 20 mph.'), 'Breezy.')
+
+    def test_keeps_texts_starting_with_summary_words(self):
+        self.assertEqual(self._clean('Low clouds and fog early, then sunny. High 60F. Winds W at 5 mph.'),
+                         'Low clouds and fog early, then sunny.')
+        self.assertEqual(self._clean('High clouds. Low 40F.'), 'High clouds.')
+        self.assertEqual(self._clean('Winds diminishing overnight.'), 'Winds diminishing overnight.')
+
+class WrapTextTest(unittest.TestCase):
+    _TEXT = 'A few clouds. A stray shower or thunderstorm is possible.'
+    _NARROW = svgmanip.TextBox(200, 14, 2)
+
+    def test_keeps_every_word_by_default(self):
+        lines = svgmanip._wrap_text(self._TEXT, self._NARROW)
+        self.assertEqual(lines, ('A few clouds. A stray', 'shower or thunderstorm is possible.'))
+        self.assertEqual(svgmanip._wrap_text('Sunny.', self._NARROW), ('Sunny.', ''))
+
+    def test_ellipsis(self):
+        lines = svgmanip._wrap_text(self._TEXT, self._NARROW, ellipsis=True)
+        self.assertEqual(lines, ('A few clouds. A stray', u'shower or thunderstorm is\u2026'))
+        max_width = self._NARROW.width * svgmanip._UNITS_PER_EM / self._NARROW.font_size
+        self.assertTrue(all(svgmanip._text_width(line) <= max_width for line in lines))
+
+    def test_clean_text_follows_the_setting(self):
+        self.assertFalse(svgmanip.ELLIPSIZE_TEXT)
+        svgmanip.ELLIPSIZE_TEXT = True
+        try:
+            self.assertTrue(svgmanip._clean_text(self._TEXT, self._NARROW)[1].endswith(u'\u2026'))
+        finally:
+            svgmanip.ELLIPSIZE_TEXT = False
+        self.assertTrue(svgmanip._clean_text(self._TEXT, self._NARROW)[1].endswith('possible.'))
+
+class LoadTemplateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-template-')
+        shutil.copy(TEMPLATE_PATH, self.directory)
+        shutil.copy(os.path.join(os.path.dirname(TEMPLATE_PATH), 'default-style.css'), self.directory)
+        self.path = os.path.join(self.directory, 'template.svg')
+        self.css_path = os.path.join(self.directory, 'default-style.css')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        svgmanip._template_cache.pop(self.path, None)
+
+    def test_reloads_when_the_stylesheet_changes(self):
+        template = svgmanip.load_template(self.path)
+        self.assertIs(svgmanip.load_template(self.path), template)
+        with open(self.css_path, 'a') as css:
+            css.write('\n.daytext { font-size: 40px; }\n')
+        os.utime(self.css_path, (template.mtime + 10, template.mtime + 10))
+        reloaded = svgmanip.load_template(self.path)
+        self.assertIsNot(reloaded, template)
+        self.assertNotEqual(reloaded.digest, template.digest)
+        self.assertEqual(reloaded.text_boxes['daytext'].font_size, 40)
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-rendercache-')
+        self.forecast = load_forecast()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit_links_without_touching_the_cached_file(self):
+        cache = svgmanip.RenderCache(os.path.join(self.directory, 'cache'))
+        first = os.path.join(self.directory, 'first.svg')
+        second = os.path.join(self.directory, 'second.svg')
+        self.assertFalse(cache.write(self.forecast, first, TEMPLATE_PATH))
+        os.utime(first, (1000, 1000))
+        self.assertTrue(cache.write(self.forecast, second, TEMPLATE_PATH))
+        self.assertEqual(os.stat(first).st_mtime, 1000)
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual((cache.stats['hits'], cache.stats['misses'], len(cache)), (1, 1, 1))
+
+    def test_key_covers_the_stylesheet(self):
+        with open(TEMPLATE_PATH) as template_file:
+            svg = template_file.read()
+        plain = svgmanip.CompiledTemplate(svg, css='')
+        styled = svgmanip.CompiledTemplate(svg, css='.daytext { font-size: 40px; }')
+        self.assertNotEqual(svgmanip.render_key(self.forecast, plain),
+                            svgmanip.render_key(self.forecast, styled))
+
+class IncrementalWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-svgmanip-')
+        self.forecast = load_forecast()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        svgmanip._render_states.clear()
+
+    def test_rewrites_only_on_change(self):
+        path = os.path.join(self.directory, 'forecast.svg')
+        self.assertEqual(svgmanip.write_forecast_incremental(self.forecast, path, TEMPLATE_PATH),
+                         set([1, 2, 3, 4]))
+        self.assertEqual(svgmanip.write_forecast_incremental(self.forecast, path, TEMPLATE_PATH), set())
+        with open(path) as written:
+            self.assertEqual(written.read(), svgmanip.render_forecast(self.forecast, TEMPLATE_PATH))
+
+    def test_render_states_are_bounded(self):
+        entries = svgmanip._RENDER_STATE_ENTRIES
+        svgmanip._RENDER_STATE_ENTRIES = 2
+        try:
+            paths = [os.path.join(self.directory, '%d.svg' % i) for i in range(3)]
+            for path in paths:
+                svgmanip.write_forecast_incremental(self.forecast, path, TEMPLATE_PATH)
+            self.assertEqual(list(svgmanip._render_states), paths[1:])
+            # the evicted file is rendered in full again
+            self.assertEqual(len(svgmanip.write_forecast_incremental(self.forecast, paths[0], TEMPLATE_PATH)), 4)
+        finally:
+            svgmanip._RENDER_STATE_ENTRIES = entries
+
+_SVG = '{http://www.w3.org/2000/svg}'
+
+# Matches the groups a dashboard wraps each repetition of a block in.
+_REPEAT_TRANSFORM = re.compile(r'^translate\([-\d.e]+,[-\d.e]+\)$')
+
+class RenderDashboardTest(unittest.TestCase):
+    def _repeated(self, element):
+        return [child for child in element.findall(_SVG + 'g')
+                if _REPEAT_TRANSFORM.match(child.get('transform', ''))]
+
+    def test_renders_10_and_4_day_forecasts(self):
+        forecasts = [load_forecast('forecast10day.xml'), load_forecast('forecast.xml')]
+        output = svgmanip.render_dashboard(forecasts, ['Ten & Co', 'Four'], DASHBOARD_PATH,
+                                           ['KS/Wichita', 'MO/St_Louis'])
+        root = ElementTree.fromstring(output.encode('utf-8'))
+        self.assertEqual((root.get('width'), root.get('height')), ('800', '360'))
+        locations = self._repeated(root)
+        self.assertEqual([location.get('transform') for location in locations],
+                         ['translate(0,0)', 'translate(0,180)'])
+        periods = [self._repeated(location.find(_SVG + 'g')) for location in locations]
+        self.assertEqual([len(location) for location in periods], [10, 4])
+        self.assertEqual(periods[1][3].get('transform'), 'translate(240,0)')
+        names = [text.text for text in root.iter(_SVG + 'text') if text.get('class') == 'dashlocation']
+        self.assertEqual(names, ['Ten & Co', 'Four'])
+        for marker in ('periodN', 'PNI', 'locationname', 'locationquery', 'dashboardwidth',
+                       'dashboardheight', '<!-- repeat', '<!-- end'):
+            self.assertNotIn(marker, output)
+
+    def test_no_locations(self):
+        root = ElementTree.fromstring(svgmanip.render_dashboard([], template_path=DASHBOARD_PATH).encode('utf-8'))
+        self.assertEqual(self._repeated(root), [])
+
+class WriteForecastsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='pyweather-pool-')
+        self.forecasts = [load_forecast('forecast.xml'), load_forecast('forecast10day.xml'),
+                          load_forecast('forecast.xml', 'stream')]
+        self.paths = [os.path.join(self.directory, '%d.svg' % i) for i in range(len(self.forecasts))]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_matches_render_forecast(self):
+        results = list(svgmanip.write_forecasts(zip(self.forecasts, self.paths), processes=2,
+                                                chunksize=1, template_path=TEMPLATE_PATH))
+        self.assertEqual(sorted(result.output_path for result in results), self.paths)
+        self.assertEqual([result.error for result in results], [None] * 3)
+        for forecast, path in zip(self.forecasts, self.paths):
+            with open(path) as written:
+                self.assertEqual(written.read(), svgmanip.render_forecast(forecast, TEMPLATE_PATH))
+
+    def test_stopping_early(self):
+        results = svgmanip.write_forecasts(zip(self.forecasts, self.paths), processes=2,
+                                           chunksize=1, template_path=TEMPLATE_PATH)
+        self.assertIsNone(next(results).error)
+        results.close()
+
+if __name__ == '__main__':
+    unittest.main()